@@ -21,9 +21,15 @@ if config.config_file_name is not None:
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from dotenv import load_dotenv
 from models import Base
 target_metadata = Base.metadata
 
+# Тот же DATABASE_URL, что и у приложения; sqlalchemy.url из alembic.ini — запасной
+load_dotenv()
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -0,0 +1,188 @@
+"""local store tables
+
+Таблицы и колонки, которые добавлялись в модели, пока схему еще создавал
+create_all: локальная копия вакансий и откликов, rollup-таблицы
+аналитики, очередь автооткликов и resume_id у ролей пользователя.
+
+create_all создавал только отсутствующие таблицы и никогда не добавлял
+колонки в существующие, поэтому база, переведенная на миграции через
+`alembic stamp 0001`, может содержать любую часть этих таблиц. Миграция
+создает недостающие таблицы, колонки и индексы и не трогает готовые.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-19 20:10:00.000000
+
+"""
+from typing import Dict, List, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _tables() -> Dict[str, list]:
+    return {
+        'salary_histogram': [
+            sa.Column('role_id', sa.String(length=50), nullable=False),
+            sa.Column('area_id', sa.String(length=50), nullable=False),
+            sa.Column('experience_id', sa.String(length=50), nullable=False),
+            sa.Column('week', sa.Date(), nullable=False),
+            sa.Column('bucket', sa.Integer(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('role_id', 'area_id', 'experience_id', 'week', 'bucket'),
+        ],
+        'vacancies': [
+            sa.Column('id', sa.String(length=50), nullable=False),
+            sa.Column('name', sa.String(length=512), nullable=False),
+            sa.Column('employer_id', sa.String(length=50), nullable=True),
+            sa.Column('employer_name', sa.String(length=512), nullable=True),
+            sa.Column('area_id', sa.String(length=50), nullable=True),
+            sa.Column('area_name', sa.String(length=255), nullable=True),
+            sa.Column('professional_role_id', sa.String(length=50), nullable=True),
+            sa.Column('experience_id', sa.String(length=50), nullable=True),
+            sa.Column('salary_from', sa.Integer(), nullable=True),
+            sa.Column('salary_to', sa.Integer(), nullable=True),
+            sa.Column('salary_currency', sa.String(length=10), nullable=True),
+            sa.Column('salary_gross', sa.Boolean(), nullable=True),
+            sa.Column('salary_net_rub_from', sa.Integer(), nullable=True),
+            sa.Column('salary_net_rub_to', sa.Integer(), nullable=True),
+            sa.Column('salary_net_rub', sa.Integer(), nullable=True),
+            sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('archived', sa.Boolean(), nullable=True),
+            sa.Column('raw', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        'vacancy_rollups': [
+            sa.Column('role_id', sa.String(length=50), nullable=False),
+            sa.Column('area_id', sa.String(length=50), nullable=False),
+            sa.Column('experience_id', sa.String(length=50), nullable=False),
+            sa.Column('week', sa.Date(), nullable=False),
+            sa.Column('vacancy_count', sa.Integer(), nullable=False),
+            sa.Column('salary_count', sa.Integer(), nullable=False),
+            sa.Column('salary_sum', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('role_id', 'area_id', 'experience_id', 'week'),
+        ],
+        'apply_queue': [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('resume_id', sa.String(length=50), nullable=False),
+            sa.Column('vacancy_id', sa.String(length=50), nullable=False),
+            sa.Column('message', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('negotiation_id', sa.String(length=50), nullable=True),
+            sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('applied_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('resume_id', 'vacancy_id', name='uq_apply_queue_resume_vacancy'),
+        ],
+        'negotiation_rollups': [
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('week', sa.Date(), nullable=False),
+            sa.Column('state', sa.String(length=50), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('user_id', 'week', 'state'),
+        ],
+        'negotiations': [
+            sa.Column('id', sa.String(length=50), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('vacancy_id', sa.String(length=50), nullable=True),
+            sa.Column('resume_id', sa.String(length=50), nullable=True),
+            sa.Column('state', sa.String(length=50), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        # Таблица есть в исходной схеме, колонка появилась позже
+        'user_professional_roles': [
+            sa.Column('resume_id', sa.String(length=50), nullable=True),
+        ],
+    }
+
+
+INDEXES: List[Tuple[str, str, List[str], bool]] = [
+    ('ix_vacancies_area_id', 'vacancies', ['area_id'], False),
+    ('ix_vacancies_employer_id', 'vacancies', ['employer_id'], False),
+    ('ix_vacancies_professional_role_id', 'vacancies', ['professional_role_id'], False),
+    ('ix_vacancies_published_at', 'vacancies', ['published_at'], False),
+    ('ix_vacancies_role_area_salary', 'vacancies', ['professional_role_id', 'area_id', 'salary_net_rub'], False),
+    ('ix_vacancies_salary_net_rub', 'vacancies', ['salary_net_rub'], False),
+    ('ix_vacancies_salary_net_rub_from', 'vacancies', ['salary_net_rub_from'], False),
+    ('ix_vacancies_salary_net_rub_to', 'vacancies', ['salary_net_rub_to'], False),
+    ('ix_apply_queue_id', 'apply_queue', ['id'], False),
+    ('ix_apply_queue_status_next_attempt', 'apply_queue', ['status', 'next_attempt_at'], False),
+    ('ix_apply_queue_user_id', 'apply_queue', ['user_id'], False),
+    ('ix_negotiations_user_id', 'negotiations', ['user_id'], False),
+    ('ix_negotiations_vacancy_id', 'negotiations', ['vacancy_id'], False),
+    ('ix_user_professional_roles_resume_id', 'user_professional_roles', ['resume_id'], False),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+    for name, elements in _tables().items():
+        if name not in existing:
+            op.create_table(name, *elements)
+            continue
+        present = {column['name'] for column in inspector.get_columns(name)}
+        missing = [
+            column for column in elements
+            if isinstance(column, sa.Column) and column.name not in present
+        ]
+        if not missing:
+            continue
+        # batch: SQLite не добавляет колонку с default now() через ALTER и пересоздает таблицу
+        with op.batch_alter_table(name) as batch:
+            for column in missing:
+                # В заполненную таблицу NOT NULL без значения по умолчанию не добавить
+                if not column.nullable and column.server_default is None:
+                    column.nullable = True
+                batch.add_column(column)
+
+    indexes = {
+        table: {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+        for table in {table for _, table, _, _ in INDEXES}
+    }
+    for index_name, table, columns, unique in INDEXES:
+        if index_name not in indexes[table]:
+            op.create_index(index_name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_professional_roles_resume_id', table_name='user_professional_roles')
+    op.drop_column('user_professional_roles', 'resume_id')
+    op.drop_index('ix_negotiations_vacancy_id', table_name='negotiations')
+    op.drop_index('ix_negotiations_user_id', table_name='negotiations')
+    op.drop_table('negotiations')
+    op.drop_table('negotiation_rollups')
+    op.drop_index('ix_apply_queue_user_id', table_name='apply_queue')
+    op.drop_index('ix_apply_queue_status_next_attempt', table_name='apply_queue')
+    op.drop_index('ix_apply_queue_id', table_name='apply_queue')
+    op.drop_table('apply_queue')
+    op.drop_table('vacancy_rollups')
+    op.drop_index('ix_vacancies_salary_net_rub_to', table_name='vacancies')
+    op.drop_index('ix_vacancies_salary_net_rub_from', table_name='vacancies')
+    op.drop_index('ix_vacancies_salary_net_rub', table_name='vacancies')
+    op.drop_index('ix_vacancies_role_area_salary', table_name='vacancies')
+    op.drop_index('ix_vacancies_published_at', table_name='vacancies')
+    op.drop_index('ix_vacancies_professional_role_id', table_name='vacancies')
+    op.drop_index('ix_vacancies_employer_id', table_name='vacancies')
+    op.drop_index('ix_vacancies_area_id', table_name='vacancies')
+    op.drop_table('vacancies')
+    op.drop_table('salary_histogram')
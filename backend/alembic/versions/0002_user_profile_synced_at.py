@@ -0,0 +1,29 @@
+"""user profile_synced_at
+
+Время последней сверки профиля с HH /me: /user/profile отдается из
+таблицы users, а сверка идет в фоне не чаще PROFILE_REVALIDATE_AFTER.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-19 19:05:12.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('profile_synced_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'profile_synced_at')
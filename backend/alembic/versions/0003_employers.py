@@ -0,0 +1,43 @@
+"""employers
+
+Детали работодателей из HH /employers/{id}: отрасли, тип, признак
+проверенного работодателя. Заполняется сервисом services/employers.py.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 19:40:27.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('employers',
+    sa.Column('id', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=512), nullable=True),
+    sa.Column('type', sa.String(length=50), nullable=True),
+    sa.Column('trusted', sa.Boolean(), nullable=True),
+    sa.Column('accredited_it', sa.Boolean(), nullable=True),
+    sa.Column('area_id', sa.String(length=50), nullable=True),
+    sa.Column('industries', sa.JSON(), nullable=True),
+    sa.Column('open_vacancies', sa.Integer(), nullable=True),
+    sa.Column('site_url', sa.String(length=512), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_employers_fetched_at'), 'employers', ['fetched_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_employers_fetched_at'), table_name='employers')
+    op.drop_table('employers')
@@ -0,0 +1,36 @@
+"""user exclusions
+
+Скрытые пользователем работодатели и вакансии. Вместе с откликами
+и очередью автооткликов загружаются в память services/exclusions.py.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 20:15:03.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_exclusions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('target_id', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'kind', 'target_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_exclusions')
@@ -0,0 +1,33 @@
+"""vacancy minhash
+
+MinHash-сигнатура текста вакансии и кластер почти-дубликатов
+(services/dedup.py). Старые строки получат их при следующем сохранении.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 21:02:41.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('vacancies', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+    op.add_column('vacancies', sa.Column('cluster_id', sa.String(length=50), nullable=True))
+    op.create_index(op.f('ix_vacancies_cluster_id'), 'vacancies', ['cluster_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_vacancies_cluster_id'), table_name='vacancies')
+    op.drop_column('vacancies', 'cluster_id')
+    op.drop_column('vacancies', 'minhash')
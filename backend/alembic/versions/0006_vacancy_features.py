@@ -0,0 +1,38 @@
+"""vacancy features
+
+Очищенный текст, леммы и навыки вакансии, посчитанные один раз на
+версию вакансии (services/text_features.py).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 21:48:19.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('vacancy_features',
+    sa.Column('vacancy_id', sa.String(length=50), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('source', sa.String(length=10), nullable=False),
+    sa.Column('text', sa.Text(), nullable=True),
+    sa.Column('tokens', sa.JSON(), nullable=True),
+    sa.Column('skills', sa.JSON(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('vacancy_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('vacancy_features')
@@ -0,0 +1,40 @@
+"""skill rollups
+
+Недельные счетчики навыков вакансий по (роль, регион): всего
+опубликованных и еще активных — для топа востребованных навыков и их
+динамики (services/skill_demand.py).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 23:05:41.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('skill_rollups',
+    sa.Column('role_id', sa.String(length=50), nullable=False),
+    sa.Column('area_id', sa.String(length=50), nullable=False),
+    sa.Column('week', sa.Date(), nullable=False),
+    sa.Column('skill', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('active', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('role_id', 'area_id', 'week', 'skill')
+    )
+    op.create_index('ix_skill_rollups_area_week', 'skill_rollups', ['area_id', 'week'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_skill_rollups_area_week', table_name='skill_rollups')
+    op.drop_table('skill_rollups')
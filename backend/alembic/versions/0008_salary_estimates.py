@@ -0,0 +1,41 @@
+"""salary estimates
+
+Оценки зарплаты вакансий без опубликованной вилки по ближайшим
+вакансиям с зарплатой (services/salary_estimate.py) и хешированный
+вектор текста в признаках вакансии, по которому ищутся соседи.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 23:58:12.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('vacancy_features', sa.Column('vector', sa.LargeBinary(), nullable=True))
+    op.create_table('salary_estimates',
+    sa.Column('vacancy_id', sa.String(length=50), nullable=False),
+    sa.Column('salary_from', sa.Integer(), nullable=False),
+    sa.Column('salary_to', sa.Integer(), nullable=False),
+    sa.Column('salary_value', sa.Integer(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('neighbors', sa.Integer(), nullable=False),
+    sa.Column('estimated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('vacancy_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('salary_estimates')
+    op.drop_column('vacancy_features', 'vector')
@@ -0,0 +1,68 @@
+"""Benchmark: MinHash signatures and LSH index inserts during bulk ingestion.
+
+Generates vacancy-like texts (name plus snippet, about 40 words) where
+every fifth one is a repost of an earlier text with a couple of words
+changed, then compares signing them one by one with signing the whole
+batch, and measures index inserts and how many reposts were clustered.
+
+    python benchmarks/bench_dedup.py [vacancies]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dedup import DuplicateIndex, minhash_many
+
+WORDS = [f"слово{i}" for i in range(5000)]
+
+
+def make_texts(count: int, rng: random.Random):
+    texts, originals = [], {}
+    for i in range(count):
+        if i and i % 5 == 0:
+            source = rng.randrange(i)
+            words = texts[source].split()
+            for _ in range(2):
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            texts.append(" ".join(words))
+            originals[i] = source
+        else:
+            texts.append(" ".join(rng.choices(WORDS, k=40)))
+    return texts, originals
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    texts, originals = make_texts(count, random.Random(1))
+
+    started = time.perf_counter()
+    for text in texts[:2000]:
+        minhash_many([text])
+    single = 2000 / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    signatures, valid = minhash_many(texts)
+    batched = count / (time.perf_counter() - started)
+
+    index = DuplicateIndex()
+    ids = [str(i) for i in range(count)]
+    started = time.perf_counter()
+    for start in range(0, count, 100):
+        index.add_many(ids[start:start + 100], signatures[start:start + 100], valid[start:start + 100])
+    inserts = count / (time.perf_counter() - started)
+
+    clustered = sum(1 for i, source in originals.items() if index._clusters[str(i)] == index._clusters[str(source)])
+    print(f"{count} vacancies, {len(originals)} reposts")
+    print(f"{'sign one by one':<22}{single:>10.0f} /s")
+    print(f"{'sign in one batch':<22}{batched:>10.0f} /s")
+    print(f"{'index inserts':<22}{inserts:>10.0f} /s")
+    print(f"{'reposts clustered':<22}{clustered / len(originals):>10.1%}")
+    print(index.get_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark: vacancy feature extraction inline vs in the process pool.
+
+Builds HTML descriptions of about 300 words and runs the same batch
+through FeatureExtractor with the pool disabled and with N processes.
+The first pool run includes spawning the workers and is reported
+separately. Lemmatization uses pymorphy3 when it is installed.
+
+    python benchmarks/bench_features.py [vacancies] [processes]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_features import FeatureExtractor, SKILL_ALIASES, pymorphy3
+
+WORDS = (
+    "разработка сервисов опыт работы знание требования обязанности команда продукт высоконагруженных систем "
+    "участие проектирование архитектуры тестирование поддержка документации клиентов задачи условия офис "
+    "удаленно график оформление дружный коллектив обучение развитие карьерный рост"
+).split() + list(SKILL_ALIASES)
+
+
+def make_items(count: int, rng: random.Random):
+    items = []
+    for i in range(count):
+        paragraphs = ["<p>" + " ".join(rng.choices(WORDS, k=60)) + "</p>" for _ in range(3)]
+        bullets = "<ul>" + "".join(f"<li>{' '.join(rng.choices(WORDS, k=12))}</li>" for _ in range(10)) + "</ul>"
+        items.append({"id": str(i), "name": "Разработчик", "description": "".join(paragraphs) + bullets})
+    return items
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else max(1, os.cpu_count() or 1)
+    items = make_items(count, random.Random(1))
+    print(f"{count} vacancies, lemmatizer: {'pymorphy3' if pymorphy3 else 'stemmer'}, {os.cpu_count()} CPUs")
+
+    started = time.perf_counter()
+    FeatureExtractor(processes=0).compute(items)
+    inline = time.perf_counter() - started
+    print(f"{'inline':<26}{count / inline:>10.0f} /s")
+
+    extractor = FeatureExtractor(processes=processes, min_batch=1)
+    try:
+        started = time.perf_counter()
+        extractor.compute(items)
+        print(f"{f'pool x{processes}, cold':<26}{count / (time.perf_counter() - started):>10.0f} /s")
+        started = time.perf_counter()
+        extractor.compute(items)
+        print(f"{f'pool x{processes}, warm':<26}{count / (time.perf_counter() - started):>10.0f} /s")
+    finally:
+        extractor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark: loguru sink throughput and event-loop lag, blocking vs queued.
+
+Logs a burst of auth-callback-like lines from a coroutine while a probe
+task measures how late asyncio.sleep(1 ms) wakes up. The "slow" stream
+adds 0.2 ms per write to model a congested stderr pipe or a busy disk.
+
+    python benchmarks/bench_logging.py [lines]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from services.logging_setup import QueueSink, _patch
+
+
+class SlowStream:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.written = 0
+
+    def write(self, text: str) -> None:
+        time.sleep(self.delay)
+        self.written += len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def burst(lines: int) -> float:
+    started = time.perf_counter()
+    for i in range(lines):
+        logger.info(f"Auth callback step {i}: user info received for user {i % 97}, redirect_uri=https://jhunterpro.ru/cb")
+        if i % 50 == 0:
+            await asyncio.sleep(0)
+    return time.perf_counter() - started
+
+
+async def run(lines: int, sink, **options):
+    logger.remove()
+    logger.configure(patcher=_patch)
+    logger.add(sink, **options)
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    elapsed = await burst(lines)
+    stop.set()
+    await probe_task
+    lags.sort()
+    return elapsed, lags[len(lags) // 2] * 1000, lags[int(len(lags) * 0.99)] * 1000
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"{'sink':<34}{'lines/s on loop':>18}{'lag p50, ms':>14}{'lag p99, ms':>14}")
+    for delay in (0.0, 0.0002):
+        label = "slow stream" if delay else "fast stream"
+        cases = [
+            (f"blocking, {label}", lambda: SlowStream(delay).write, {}),
+            (f"loguru enqueue=True, {label}", lambda: SlowStream(delay).write, {"enqueue": True}),
+            (f"QueueSink, {label}", lambda: QueueSink(SlowStream(delay)), {}),
+        ]
+        for name, make_sink, options in cases:
+            elapsed, p50, p99 = asyncio.run(run(lines, make_sink(), **options))
+            print(f"{name:<34}{lines / elapsed:>18,.0f}{p50:>14.2f}{p99:>14.2f}")
+    logger.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: ranking a result set against a cached resume profile.
+
+Builds a profile from two synthetic resumes and scores 10k vacancy-like
+search items (name, requirement and responsibility snippets, key skills)
+against it: cold, with an empty vacancy term cache, and warm, when every
+vacancy's tokens are already cached. Also reports the profile size.
+
+    python benchmarks/bench_ranking.py [vacancies]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ranking import VacancyRanker
+
+WORDS = [f"слово{i}" for i in range(5000)]
+SKILLS = ["Python", "Docker", "SQL", "Kafka", "Excel", "CRM", "Git", "React", "Linux", "FastAPI"]
+EXPERIENCE = ["noExperience", "between1And3", "between3And6", "moreThan6"]
+
+
+def make_vacancies(count: int, rng: random.Random):
+    return [
+        {
+            "id": str(i),
+            "name": " ".join(rng.choices(WORDS, k=4)),
+            "snippet": {
+                "requirement": " ".join(rng.choices(WORDS, k=25)),
+                "responsibility": " ".join(rng.choices(WORDS, k=25)),
+            },
+            "key_skills": [{"name": skill} for skill in rng.sample(SKILLS, 4)],
+            "salary": {"from": rng.randint(50, 300) * 1000, "to": None, "currency": "RUR", "gross": False},
+            "experience": {"id": rng.choice(EXPERIENCE)},
+            "employer": {"id": str(rng.randrange(1000))},
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(1)
+    vacancies = make_vacancies(count, rng)
+    resumes = [
+        {
+            "title": "Python backend " + " ".join(rng.choices(WORDS, k=3)),
+            "professional_roles": [{"name": "Программист, разработчик"}],
+            "skill_set": rng.sample(SKILLS, 6),
+            "salary": {"amount": 250000, "currency": "RUR"},
+            "total_experience": {"months": 50},
+        }
+        for _ in range(2)
+    ]
+
+    ranker = VacancyRanker()
+    profile = ranker.build_profile(1, resumes)
+    size = profile.term_ids.nbytes + profile.term_values.nbytes + profile.skill_hashes.nbytes
+    print(f"profile: {len(profile.term_ids)} terms, {size} bytes")
+
+    started = time.perf_counter()
+    ranker.rank(profile, vacancies)
+    print(f"{'rank cold':<22}{(time.perf_counter() - started) * 1000:>10.1f} ms")
+
+    runs = 10
+    started = time.perf_counter()
+    for _ in range(runs):
+        ranker.rank(profile, vacancies)
+    print(f"{'rank warm':<22}{(time.perf_counter() - started) / runs * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
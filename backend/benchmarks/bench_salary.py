@@ -0,0 +1,103 @@
+"""Benchmark: salary index inserts and estimating a page of vacancies.
+
+Fills SalaryIndex with synthetic salaried vacancies spread over a few
+professional roles (the largest one gets 40% of them) from stored
+float16 vectors, as on startup, then measures estimating a 20-vacancy
+page of the largest role with and without the per-role cap, and
+incremental inserts of new vacancies into the filled index.
+
+"page of 20 estimates" times SalaryIndex.estimate_many on ready
+vectors. "page as rendered" times attach_salary_estimates on HH search
+items, the path search requests take: features from the snippet text,
+then the estimates.
+
+    python benchmarks/bench_salary.py [vacancies]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.salary_estimate import SALARY_ROLE_SIZE, SalaryIndex, attach_salary_estimates
+from services.text_features import hashed_vectors
+
+WORDS = [f"слово{i}" for i in range(3000)]
+SKILLS = ["Python", "Docker", "SQL", "Kafka", "Excel", "CRM", "Git", "React"]
+ROLES = ["96", "96", "10", "40", "70"]
+
+
+def make_rows(count: int, rng: random.Random, start: int = 0):
+    rows = [
+        {
+            "vacancy_id": str(start + i),
+            "role_id": rng.choice(ROLES),
+            "area_id": rng.choice(["1", "2", "3"]),
+            "experience_id": rng.choice(["noExperience", "between1And3", "between3And6", "moreThan6"]),
+            "salary": rng.randint(40, 400) * 1000,
+            "content_hash": str(start + i),
+            "tokens": rng.choices(WORDS, k=150),
+            "skills": rng.sample(SKILLS, 3),
+        }
+        for i in range(count)
+    ]
+    vectors = hashed_vectors([(row["tokens"], row["skills"]) for row in rows]).astype(np.float16)
+    for row, vector in zip(rows, vectors):
+        row["vector"] = vector.tobytes()
+    return rows
+
+
+def make_items(count: int, rng: random.Random, start: int = 0):
+    """Search items without a salary, shaped like HH /vacancies results."""
+    return [
+        {
+            "id": str(start + i),
+            "name": " ".join(rng.choices(WORDS, k=4)),
+            "snippet": {
+                "requirement": " ".join(rng.choices(WORDS, k=30) + rng.sample(SKILLS, 2)),
+                "responsibility": " ".join(rng.choices(WORDS, k=30)),
+            },
+            "professional_roles": [{"id": "96"}],
+            "area": {"id": rng.choice(["1", "2", "3"])},
+            "experience": {"id": rng.choice(["noExperience", "between1And3", "between3And6", "moreThan6"])},
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(1)
+    rows = make_rows(count, rng)
+    page = [{**row, "role_id": "96"} for row in make_rows(20, rng, start=count)]
+    for role_capacity in (count, SALARY_ROLE_SIZE):
+        index = SalaryIndex(capacity=count, role_capacity=role_capacity)
+        started = time.perf_counter()
+        index.load(rows)
+        print(f"role cap {role_capacity}: loaded in {time.perf_counter() - started:.1f}s, {index.get_stats()}")
+        index.estimate_many(page)
+        runs = 50
+        started = time.perf_counter()
+        for _ in range(runs):
+            index.estimate_many(page)
+        print(f"{'  page of 20 estimates':<24}{(time.perf_counter() - started) / runs * 1000:>10.2f} ms")
+        items = make_items(20, rng, start=count)
+        attach_salary_estimates([dict(item) for item in items], index)
+        started = time.perf_counter()
+        for _ in range(runs):
+            attach_salary_estimates([dict(item) for item in items], index)
+        print(f"{'  page as rendered':<24}{(time.perf_counter() - started) / runs * 1000:>10.2f} ms")
+
+    extra = make_rows(2000, rng, start=count + 20)
+    started = time.perf_counter()
+    for offset in range(0, len(extra), 100):
+        index.add_many(extra[offset:offset + 100])
+    print(f"{'incremental inserts':<24}{len(extra) / (time.perf_counter() - started):>10.0f} /s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark: size and encode CPU of a /vacancies/search page.
+
+Compares FastAPI's default path (jsonable_encoder + json.dumps) against
+orjson, field projection and br/gzip compression on a synthetic HH page.
+Synthetic items repeat a lot, so compression ratios here are optimistic.
+
+    python benchmarks/bench_search_payload.py [per_page]
+"""
+
+import gzip
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from services.compression import brotli
+from services.serialization import parse_fields, project_search_response
+
+MOBILE_FIELDS = "id,name,salary,employer.name,employer.logo_urls.90,area.name,published_at,snippet.requirement"
+
+
+def make_vacancy(i: int) -> dict:
+    """Вакансия в формате выдачи HH /vacancies"""
+    return {
+        "id": str(90000000 + i),
+        "premium": False,
+        "name": f"Senior Python-разработчик (FastAPI) #{i}",
+        "department": None,
+        "has_test": False,
+        "response_letter_required": False,
+        "area": {"id": "1", "name": "Москва", "url": "https://api.hh.ru/areas/1"},
+        "salary": {"from": 250000 + i, "to": 350000, "currency": "RUR", "gross": False},
+        "type": {"id": "open", "name": "Открытая"},
+        "address": {
+            "city": "Москва", "street": "Льва Толстого", "building": "16",
+            "lat": 55.733, "lng": 37.587, "description": None, "raw": "Москва, Льва Толстого, 16",
+            "metro": {"station_name": "Парк культуры", "line_name": "Сокольническая", "station_id": "1.1", "line_id": "1"},
+            "metro_stations": [{"station_name": "Парк культуры", "line_name": "Сокольническая", "station_id": "1.1", "line_id": "1"}],
+        },
+        "response_url": None,
+        "sort_point_distance": None,
+        "published_at": "2024-05-20T10:15:30+0300",
+        "created_at": "2024-05-20T10:15:30+0300",
+        "archived": False,
+        "apply_alternate_url": f"https://hh.ru/applicant/vacancy_response?vacancyId={90000000 + i}",
+        "insider_interview": None,
+        "url": f"https://api.hh.ru/vacancies/{90000000 + i}?host=hh.ru",
+        "alternate_url": f"https://hh.ru/vacancy/{90000000 + i}",
+        "relations": [],
+        "employer": {
+            "id": str(1740 + i % 50),
+            "name": "Яндекс",
+            "url": "https://api.hh.ru/employers/1740",
+            "alternate_url": "https://hh.ru/employer/1740",
+            "logo_urls": {
+                "90": "https://hhcdn.ru/employer-logo/1.png",
+                "240": "https://hhcdn.ru/employer-logo/2.png",
+                "original": "https://hhcdn.ru/employer-logo-original/3.png",
+            },
+            "vacancies_url": "https://api.hh.ru/vacancies?employer_id=1740",
+            "accredited_it_employer": True,
+            "trusted": True,
+        },
+        "snippet": {
+            "requirement": "Опыт коммерческой разработки на <highlighttext>Python</highlighttext> от 5 лет. "
+                           "Уверенное знание asyncio, PostgreSQL, Redis.",
+            "responsibility": "Проектирование и разработка высоконагруженных сервисов, code review, "
+                              "участие в архитектурных решениях.",
+        },
+        "contacts": None,
+        "schedule": {"id": "remote", "name": "Удаленная работа"},
+        "working_days": [],
+        "working_time_intervals": [],
+        "working_time_modes": [],
+        "accept_temporary": False,
+        "professional_roles": [{"id": "96", "name": "Программист, разработчик"}],
+        "accept_incomplete_resumes": False,
+        "experience": {"id": "moreThan6", "name": "Более 6 лет"},
+        "employment": {"id": "full", "name": "Полная занятость"},
+        "adv_response_url": None,
+        "is_adv_vacancy": False,
+        "adv_context": None,
+    }
+
+
+def main():
+    per_page = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    page = {
+        "items": [make_vacancy(i) for i in range(per_page)],
+        "found": 12345, "pages": 20, "page": 0, "per_page": per_page,
+        "clusters": None, "arguments": None, "fixes": None, "suggests": None,
+        "alternate_url": "https://hh.ru/search/vacancy?enable_snippets=true",
+        "smart_search_applied": True, "ranking_applied": False, "fanout_applied": False,
+    }
+    tree = parse_fields(MOBILE_FIELDS)
+    number = 200
+
+    def default_encode(data):
+        return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode()
+
+    cases = [
+        ("default (jsonable_encoder + json)", lambda: default_encode(page)),
+        ("orjson", lambda: orjson.dumps(page)),
+        ("orjson + fields", lambda: orjson.dumps(project_search_response(page, tree))),
+    ]
+
+    print(f"per_page={per_page}, fields={MOBILE_FIELDS}\n")
+    print(f"{'variant':<40}{'encode, ms':>12}{'raw, KB':>10}{'gzip, KB':>10}{'br, KB':>10}")
+    baseline_time = baseline_size = None
+    for name, encode in cases:
+        seconds = min(timeit.repeat(encode, number=number, repeat=3)) / number
+        body = encode()
+        gz = len(gzip.compress(body, 6))
+        br = len(brotli.compress(body, quality=4)) if brotli is not None else float("nan")
+        print(f"{name:<40}{seconds * 1000:>12.3f}{len(body) / 1024:>10.1f}{gz / 1024:>10.1f}{br / 1024:>10.1f}")
+        if baseline_time is None:
+            baseline_time, baseline_size = seconds, len(body)
+        last_time, last_br = seconds, br
+
+    print(
+        f"\nencode CPU: {baseline_time / last_time:.1f}x less, "
+        f"payload: {baseline_size / last_br:.1f}x smaller on the wire (fields + br)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark: cold start of the API process until it can serve traffic.
+
+Starts uvicorn in a fresh process and polls until the liveness and
+readiness endpoints answer 200, then times the first real request.
+Each run uses a new interpreter, so import time is included.
+
+    python benchmarks/bench_startup.py [runs] [ready_path]
+
+DATABASE_URL and other settings are taken from the environment.
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client: httpx.Client, url: str, started: float, limit: float = 60.0) -> float:
+    while time.perf_counter() - started < limit:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} did not become ready in {limit:.0f}s")
+
+
+def run_once(ready_path: str):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=5, trust_env=False) as client:
+            live = wait_for(client, f"{base}/health/live", started) if ready_path != "/health" else None
+            ready = wait_for(client, f"{base}{ready_path}", started)
+            request_started = time.perf_counter()
+            client.get(f"{base}/")
+            first_request = time.perf_counter() - request_started
+        return live, ready, first_request
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    ready_path = sys.argv[2] if len(sys.argv) > 2 else "/health/ready"
+    results = [run_once(ready_path) for _ in range(runs)]
+
+    def report(label, values):
+        values = [v for v in values if v is not None]
+        if values:
+            print(f"{label:<28}{statistics.median(values) * 1000:>10.0f} ms (min {min(values) * 1000:.0f})")
+
+    print(f"{runs} cold starts, median:")
+    report("process -> live", [r[0] for r in results])
+    report(f"process -> {ready_path}", [r[1] for r in results])
+    report("first request after ready", [r[2] for r in results])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,141 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse, PlainTextResponse, RedirectResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import Optional, List
 import os
+import uuid
 from dotenv import load_dotenv
 from loguru import logger
+import asyncio
+import hmac
+import threading
 import httpx
+import orjson
 
-from database import get_db, engine
-from models import Base, User, UserToken, UserProfessionalRole
+from database import get_db, engine, SessionLocal, ping as ping_database, warm_pool
+from models import User, UserToken, UserProfessionalRole
+from sqlalchemy import text as sql_text
 from sqlalchemy.orm import Session
 from services.token_service import TokenService
+from services.apply_queue import ApplyQueueService, ApplyWorker
+from services.ranking import ranker
+from services.fanout_search import CursorExpired, FanoutSearch, InvalidCursor
+from services.vacancy_store import VacancyStore, NegotiationStore
+from services.analytics import AnalyticsService, rebuild_vacancy_rollups
+from services.currency import currency_rates
+from services.serialization import parse_fields, project_search_response
+from services.compression import CompressionMiddleware
+from services.cache import cache, cache_key, cached_response, mark_stale
+from services.hh_client import HHClient, breakers as hh_breakers, close_http_client, http_client, is_upstream_failure
+from services.snapshots import SearchSnapshots, SnapshotExpired
+from services.prefetch import Prefetcher
+from services.deadline import DeadlineExceeded, DeadlineMiddleware, clear_deadline
+from services.scheduler import BACKFILL, MONITORING, scheduler as hh_scheduler
+from services.profiling import ProfilerBusy, allocations, profiler
+from services.timing import ServerTimingMiddleware, mark, span
+from services.logging_setup import configure_logging, sampled
+from services.startup import startup
+from services.profile import ProfileStore, render_profile
+from services.resumes import ResumeDetails
+from services.employers import EmployerDirectory, attach_employers, employer_ids, filter_vacancies, unchecked_count
+from services.exclusions import ExclusionIndex, ExclusionStore, load_exclusions
+from services.dedup import DEDUP_INDEX_SIZE, duplicate_index
+from services.text_features import FeatureStore, feature_extractor
+from services.salary_estimate import SalaryEstimateStore, SalaryIndexRefresher, attach_salary_estimates, salary_index
+from services.skill_demand import SkillDemandMaintenance, SkillDemandService, expire_vacancies, rebuild_skill_rollups
+from services.export import (
+    export_slots, harvest_vacancies, iter_local_vacancies, hh_export_rows, encode_ndjson, encode_csv
+)
 load_dotenv()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Неблокирующий вывод логов с маскированием токенов
+configure_logging()
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
+REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL", "86400"))
+VACANCY_DETAIL_TTL = int(os.getenv("VACANCY_DETAIL_TTL", "600"))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+# Сколько соединений с HH открыть заранее при старте
+HH_POOL_WARM = int(os.getenv("HH_POOL_WARM", "4"))
+
+apply_worker = ApplyWorker(SessionLocal)
+search_snapshots = SearchSnapshots(cache)
+prefetcher = Prefetcher(cache)
+resume_details = ResumeDetails(cache)
+employer_directory = EmployerDirectory(cache, SessionLocal)
+exclusion_index = ExclusionIndex(SessionLocal)
+skill_demand_maintenance = SkillDemandMaintenance(SessionLocal)
+salary_index_refresher = SalaryIndexRefresher(SessionLocal, salary_index)
+# Пользователи, чей профиль сейчас сверяется с HH (не дублируем сверку)
+_profile_refreshing: set = set()
+
+async def _warm_http_pool() -> int:
+    """Открыть HH_POOL_WARM соединений с api.hh.ru (DNS + TCP + TLS) до первого запроса"""
+    client = http_client()
+    responses = await asyncio.gather(*(client.head(HHClient.BASE_URL) for _ in range(HH_POOL_WARM)))
+    return len(responses)
+
+def _load_duplicate_index() -> int:
+    """Индекс дубликатов из сигнатур последних сохраненных вакансий"""
+    db = SessionLocal()
+    try:
+        return duplicate_index.load(VacancyStore(db).recent_signatures(DEDUP_INDEX_SIZE))
+    finally:
+        db.close()
+
+async def _warm_references() -> List[str]:
+    """Справочники в общий кеш: первые /dictionaries, /areas не ждут HH"""
+    client = HHClient()
+    producers = {
+        "dictionaries": client.get_dictionaries,
+        "areas": client.get_areas,
+        "professional_roles": client.get_professional_roles,
+    }
+    loaded = await asyncio.gather(*(_load_reference(name, producer) for name, producer in producers.items()))
+    return [name for name, entry in zip(producers, loaded) if entry is not None]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Схему не трогаем: ее накатывает alembic upgrade head до запуска процесса
+    # Готовность ждет только БД и схему; HH и индексы в памяти догружаются в фоне,
+    # до их загрузки выдача идет без свертки по индексу и оценок зарплат
+    await startup.warm_up({
+        "db_pool": lambda: run_in_threadpool(warm_pool),
+        "schema": lambda: startup.verify_schema(engine),
+    }, background={
+        "http_pool": _warm_http_pool,
+        "references": _warm_references,
+        "duplicates": lambda: run_in_threadpool(_load_duplicate_index),
+        "salary_index": lambda: run_in_threadpool(salary_index_refresher.run_once),
+    })
+    currency_rates.start()
+    skill_demand_maintenance.start()
+    salary_index_refresher.start()
+    if os.getenv("APPLY_WORKER_ENABLED", "true").lower() == "true":
+        apply_worker.start()
+    yield
+    await startup.stop()
+    await apply_worker.stop()
+    await currency_rates.stop()
+    await skill_demand_maintenance.stop()
+    await salary_index_refresher.stop()
+    await prefetcher.stop()
+    feature_extractor.shutdown()
+    await close_http_client()
+    await cache.close()
+    await logger.complete()
 
 app = FastAPI(
     title="JobHunter Pro API",
     description="Автоматизированная система поиска работы",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -32,8 +147,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие ответов (br/gzip)
+app.add_middleware(CompressionMiddleware)
+
+# Бюджет времени на запрос: его остаток ограничивает обращения к БД и HH
+app.add_middleware(DeadlineMiddleware)
+
+# Server-Timing по фазам запроса (SERVER_TIMING=header|always|off)
+app.add_middleware(ServerTimingMiddleware)
+
 security = HTTPBearer()
 
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return ORJSONResponse(status_code=504, content={"detail": str(exc)})
+
+def store_vacancies(items: list):
+    """Сохранить вакансии из выдачи в локальное хранилище (фоновая задача)"""
+    clear_deadline()
+    db = SessionLocal()
+    try:
+        VacancyStore(db).upsert_many(items)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to store vacancies: {e}")
+    finally:
+        db.close()
+    store_features(items)
+
+def store_features(items: list):
+    """Очищенный текст, леммы и навыки для еще не обработанных версий вакансий (фоновая задача)"""
+    clear_deadline()
+    db = SessionLocal()
+    try:
+        FeatureStore(db).ingest(items, feature_extractor)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to store vacancy features: {e}")
+    finally:
+        db.close()
+    store_salary_estimates(items)
+
+def store_salary_estimates(items: list):
+    """Вакансии с зарплатой — в индекс оценки зарплат, остальным — сохраненная оценка (фоновая задача)"""
+    db = SessionLocal()
+    try:
+        SalaryEstimateStore(db).ingest([str(item["id"]) for item in items if item.get("id")], salary_index)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to store salary estimates: {e}")
+    finally:
+        db.close()
+
+def archive_vacancies(vacancy_ids: list):
+    """Вакансии, которые HH отдал архивными, перестают считаться в спросе на навыки (фоновая задача)"""
+    clear_deadline()
+    db = SessionLocal()
+    try:
+        expire_vacancies(db, vacancy_ids)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to archive vacancies: {e}")
+    finally:
+        db.close()
+
+def get_current_user(request: Request) -> dict:
+    """Текущий пользователь по заголовку Authorization (токен — это user_id)"""
+    token = request.headers.get("authorization", "").replace("Bearer ", "")
+    try:
+        return {"id": int(token)}
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+def require_admin(request: Request) -> None:
+    """Служебные эндпоинты: только с X-Admin-Token; без ADMIN_TOKEN их нет вовсе"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
 # Models
 class UserResponse(BaseModel):
     id: int
@@ -49,6 +242,16 @@ class VacancyFilter(BaseModel):
     experience: Optional[str] = None
     employment: Optional[str] = None
 
+class ApplyQueueRequest(BaseModel):
+    resume_id: str
+    vacancy_ids: List[str]
+    message: Optional[str] = ""
+    skip_near_duplicates: bool = True
+
+class ExclusionRequest(BaseModel):
+    employer_ids: List[str] = []
+    vacancy_ids: List[str] = []
+
 class Vacancy(BaseModel):
     id: str
     name: str
@@ -67,7 +270,19 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "circuits": hh_breakers.snapshot()}
+
+@app.get("/health/live")
+async def liveness():
+    """Процесс жив и event loop отвечает; зависимости не проверяются"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Готовность принимать трафик: прогрев завершен, БД доступна, схема на alembic head"""
+    ready, details = await startup.readiness(engine, ping_database)
+    details["phases"] = {name: {k: v for k, v in phase.items() if k != "result"} for name, phase in startup.phases.items()}
+    return ORJSONResponse(status_code=200 if ready else 503, content=details)
 
 @app.post("/auth/hh")
 async def hh_auth():
@@ -85,46 +300,35 @@ async def hh_auth():
 @app.get("/auth/callback")
 async def auth_callback(request: Request, code: str = None, db: Session = Depends(get_db)):
     """Callback для получения токена от HeadHunter и сохранения в БД"""
-    from services.hh_client import HHClient
-    from datetime import datetime, timedelta, timezone
-    import uuid
-    
-    logger.info(f"Auth callback received. URL: {request.url}")
-    logger.info(f"Query params: {request.query_params}")
+    verbose = sampled("auth")
+    verbose.info(f"Auth callback received. URL: {request.url}")
     
     # Проверка наличия кода авторизации
     if not code:
         logger.error("No code parameter received")
         error_url = "https://jhunterpro.ru/?error=no_code"
-        from fastapi.responses import RedirectResponse
         return RedirectResponse(url=error_url)
     
-    logger.info(f"Auth callback received with code: {code[:10]}...")
-    
     try:
         hh_client = HHClient()
         redirect_uri = os.getenv("HH_REDIRECT_URI")
         if not redirect_uri:
             raise HTTPException(status_code=500, detail="HH_REDIRECT_URI not configured")
-        logger.info(f"Using redirect_uri: {redirect_uri}")
+        verbose.info(f"Using redirect_uri: {redirect_uri}")
         
         # Обмениваем код на токен
-        logger.info("Exchanging code for token...")
         token_data = await hh_client.get_access_token(code, redirect_uri)
-        logger.info(f"Token received successfully: {token_data.get('token_type', 'unknown')} token")
+        verbose.info(f"Token received: {token_data.get('token_type', 'unknown')} token")
         
         # Получаем информацию о пользователе из HH API
-        logger.info("Getting user info from HH API...")
         hh_client.access_token = token_data['access_token']
         user_info = await hh_client.get_me()
-        logger.info(f"User info received: {user_info.get('email', 'unknown')}")
         
         # Проверяем существующего пользователя или создаем нового
         user = db.query(User).filter(User.hh_user_id == user_info['id']).first()
         
         if not user:
             # Создаем нового пользователя
-            logger.info(f"Creating new user for HH ID: {user_info['id']}")
             user = User(
                 public_id=str(uuid.uuid4()),
                 hh_user_id=user_info['id'],
@@ -132,25 +336,28 @@ async def auth_callback(request: Request, code: str = None, db: Session = Depend
                 first_name=user_info.get('first_name'),
                 last_name=user_info.get('last_name'),
                 middle_name=user_info.get('middle_name'),
+                profile_synced_at=datetime.now(timezone.utc),
                 created_at=datetime.now(timezone.utc),
                 updated_at=datetime.now(timezone.utc)
             )
             db.add(user)
             db.commit()
             db.refresh(user)
-            logger.info(f"New user created with public_id: {user.id}")
+            logger.info(f"New user {user.id} created for HH ID {user_info['id']}")
         else:
             # Обновляем информацию существующего пользователя
-            logger.info(f"Updating existing user with public_id: {user.id}")
+            verbose.info(f"Updating existing user {user.id}")
             user.email = user_info['email']
             user.first_name = user_info.get('first_name')
             user.last_name = user_info.get('last_name')
             user.middle_name = user_info.get('middle_name')
+            user.profile_synced_at = datetime.now(timezone.utc)
             user.updated_at = datetime.now(timezone.utc)
             db.commit()
+        # Профиль только что сверен с HH — обновляем и кеш /user/profile
+        await cache.set(f"profile:{user.id}", orjson.dumps(render_profile(ProfileStore(db).get(user.id))), PROFILE_CACHE_TTL)
         
         # Сохраняем токены через TokenService
-        logger.info("Saving tokens to database...")
         token_service = TokenService(db)
         await token_service.save_initial_tokens(
             user_id=user.id,
@@ -158,11 +365,10 @@ async def auth_callback(request: Request, code: str = None, db: Session = Depend
             refresh_token=token_data['refresh_token'],
             expires_in=token_data['expires_in']
         )
-        logger.info("Tokens saved successfully")
+        verbose.info("Tokens saved")
         
         # Получаем и сохраняем professional roles из резюме
         try:
-            logger.info("Fetching user resumes for professional roles...")
             resumes = await hh_client.get_resumes()
             
             # Удаляем старые роли
@@ -174,6 +380,7 @@ async def auth_callback(request: Request, code: str = None, db: Session = Depend
                     role = UserProfessionalRole(
                         public_id=str(uuid.uuid4()),
                         user_id=user.id,
+                        resume_id=resume.get('id'),
                         role_id=spec['id'],
                         role_name=spec['name'],
                         is_primary=(i == 0)  # Первая роль считается основной
@@ -181,24 +388,19 @@ async def auth_callback(request: Request, code: str = None, db: Session = Depend
                     db.add(role)
             
             db.commit()
-            logger.info(f"Professional roles saved for user {user.id}")
+            verbose.info(f"Professional roles saved for user {user.id}")
         except Exception as e:
             logger.warning(f"Failed to fetch professional roles: {e}")
             # Не прерываем процесс авторизации из-за ошибки с ролями
         
         # Перенаправляем на фронтенд с public_id пользователя
         frontend_url = f"https://jhunterpro.ru/?user_id={user.id}"
-        logger.info(f"Redirecting to frontend with user_id: {user.id}")
-        from fastapi.responses import RedirectResponse
+        logger.info(f"User {user.id} logged in")
         return RedirectResponse(url=frontend_url)
         
     except Exception as e:
-        logger.error(f"Auth callback error: {e}")
-        logger.error(f"Error type: {type(e).__name__}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.opt(exception=e).error(f"Auth callback error ({type(e).__name__}): {e}")
         error_url = "https://jhunterpro.ru/?error=auth_failed"
-        from fastapi.responses import RedirectResponse
         return RedirectResponse(url=error_url)
 
     
@@ -224,17 +426,15 @@ async def auth_callback(request: Request, code: str = None, db: Session = Depend
         # Временное решение - перенаправляем с токеном в URL
         frontend_url = f"https://jhunterpro.ru/?auth_token={token_data['access_token']}"
         logger.info(f"Redirecting to frontend: {frontend_url[:50]}...")
-        from fastapi.responses import RedirectResponse
         return RedirectResponse(url=frontend_url)
         
     except Exception as e:
         logger.error(f"Auth callback error: {e}")
         logger.error(f"Error type: {type(e).__name__}")
         error_url = "https://jhunterpro.ru/?error=auth_failed"
-        from fastapi.responses import RedirectResponse
         return RedirectResponse(url=error_url)
 
-@app.get("/vacancies/search")
+@app.get("/vacancies/search", response_class=ORJSONResponse)
 async def search_vacancies(
     text: Optional[str] = None,
     area: Optional[int] = None,
@@ -244,18 +444,51 @@ async def search_vacancies(
     page: int = 0,
     per_page: int = 20,
     smart_search: bool = True,
+    rank: bool = False,
+    fanout: bool = False,
+    snapshot: bool = False,
+    prefetch: bool = False,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    enrich_employers: bool = False,
+    trusted_only: bool = False,
+    industry: Optional[str] = None,
+    show_excluded: bool = False,
+    collapse_duplicates: bool = True,
+    estimate_salary: bool = True,
     request: Request = None,
+    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_db)
 ):
     """Умный поиск вакансий с автоподстановкой professional_roles"""
-    from services.hh_client import HHClient
-    from services.token_service import TokenService
-    from sqlalchemy import text
+    # Получаем токен если есть
+    token = request.headers.get("authorization", "").replace("Bearer ", "") if request else None
+    
+    # Скрытые работодатели и вакансии с откликом; отпечаток набора входит в ключ кеша
+    exclusions = None
+    if token and not show_excluded:
+        with span("exclusions"):
+            exclusions = await load_exclusions(exclusion_index, int(token) if token.isdigit() else None)
+    exclusions_tag = exclusions.fingerprint if exclusions is not None else None
+    
+    # Персональная выдача кешируется по пользователю, анонимная — общая и для CDN
+    def search_key_for(page_number: int) -> str:
+        return cache_key(
+            "search", token, text, area, salary, experience, employment, page_number, per_page,
+            smart_search, rank, fanout, snapshot, cursor, fields, enrich_employers, trusted_only, industry,
+            exclusions_tag, collapse_duplicates, estimate_salary
+        )
+    
+    search_key = search_key_for(page)
+    cache_control = "private, max-age=60" if token else "public, max-age=60, s-maxage=300"
+    with span("cache_read"):
+        entry = await cache.get(search_key)
+    mark("cache", "hit" if entry is not None else "miss")
+    if entry is not None:
+        prefetcher.record_hit(search_key)
+        return cached_response(request, entry, cache_control, vary="Authorization")
     
     try:
-        # Получаем токен если есть
-        token = request.headers.get("authorization", "").replace("Bearer ", "") if request else None
-        
         # Если включен умный поиск и есть токен пользователя
         professional_roles = None
         if smart_search and token:
@@ -264,14 +497,15 @@ async def search_vacancies(
                 user_id = int(token)
                 
                 # Получаем professional_roles пользователя из БД
-                roles_result = db.execute(
-                    text("SELECT role_id FROM user_professional_roles WHERE user_id = :user_id"),
-                    {"user_id": user_id}
-                ).fetchall()
+                with span("roles"):
+                    roles_result = db.execute(
+                        sql_text("SELECT DISTINCT role_id FROM user_professional_roles WHERE user_id = :user_id"),
+                        {"user_id": user_id}
+                    ).fetchall()
                 
                 if roles_result:
                     professional_roles = [str(row[0]) for row in roles_result]
-                    logger.info(f"Smart search: using {len(professional_roles)} professional roles for user {user_id}")
+                    sampled("search").info(f"Smart search: using {len(professional_roles)} professional roles for user {user_id}")
                 
             except (ValueError, Exception) as e:
                 logger.warning(f"Smart search failed, falling back to regular search: {e}")
@@ -283,87 +517,744 @@ async def search_vacancies(
                 user_id = int(token)
                 token_service = TokenService(db)
                 hh_token = await token_service.get_valid_token(user_id)
+            except DeadlineExceeded:
+                raise
             except:
                 pass
                 
-        hh_client = HHClient(access_token=hh_token)
-        
-        # Выполняем поиск с умными фильтрами
-        vacancies_data = await hh_client.search_vacancies(
-            text=text,
-            area=area,
-            salary=salary,
-            experience=experience,
-            employment=employment,
-            page=page,
-            per_page=per_page,
-            professional_roles=professional_roles  # Добавляем умные фильтры
+        hh_client = HHClient(access_token=hh_token, user_id=user_id if hh_token else None)
+        filters = {
+            "text": text,
+            "area": area,
+            "salary": salary,
+            "experience": experience,
+            "employment": employment
+        }
+        
+        # Отдельный запрос на каждое резюме вместо одного общего списка ролей
+        streams = []
+        if fanout and professional_roles:
+            roles_by_resume = {}
+            for resume_id, role_id in db.execute(
+                sql_text("""
+                SELECT resume_id, role_id FROM user_professional_roles
+                WHERE user_id = :user_id AND resume_id IS NOT NULL
+                ORDER BY resume_id, role_id
+                """),
+                {"user_id": user_id}
+            ).fetchall():
+                roles_by_resume.setdefault(resume_id, []).append(str(role_id))
+            streams = list(roles_by_resume.items())
+        
+        try:
+            if streams:
+                try:
+                    vacancies_data = await FanoutSearch(hh_client, cache).search(
+                        streams, filters, per_page=per_page, cursor=cursor, owner=user_id
+                    )
+                except CursorExpired as e:
+                    raise HTTPException(status_code=410, detail=str(e))
+                except InvalidCursor as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            elif snapshot:
+                # Стабильная выдача: порядок фиксируется первым запросом, дальше — по курсору
+                snapshot_filters = {**filters, "professional_roles": professional_roles}
+                owner = cache_key("snapshot", token, *sorted(snapshot_filters.items()))
+                try:
+                    vacancies_data = await search_snapshots.search(
+                        hh_client, owner, snapshot_filters, per_page=per_page, cursor=cursor
+                    )
+                except SnapshotExpired as e:
+                    raise HTTPException(status_code=410, detail=str(e))
+                except InvalidCursor as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            else:
+                # Выполняем поиск с умными фильтрами
+                vacancies_data = await hh_client.search_vacancies(
+                    **filters,
+                    page=page,
+                    per_page=per_page,
+                    professional_roles=professional_roles  # Добавляем умные фильтры
+                )
+        except Exception as e:
+            if not is_upstream_failure(e):
+                raise
+            # HH недоступен или не уложился в таймаут — отвечаем устаревшими данными
+            logger.warning(f"HH search unavailable, serving stale results: {e}")
+            stale_entry = await cache.get(search_key, allow_stale=True)
+            if stale_entry is not None:
+                return cached_response(request, mark_stale(stale_entry), "no-cache", vary="Authorization")
+            if streams or snapshot:
+                raise HTTPException(status_code=503, detail="HeadHunter API is unavailable")
+            vacancies_data = await run_in_threadpool(
+                VacancyStore(db).search, filters, professional_roles, page, per_page
+            )
+            vacancies_data["fanout_applied"] = False
+            vacancies_data["stale"] = True
+            body = await _render_search_page(
+                vacancies_data, hh_client, professional_roles, False, None, fields,
+                {"collapse_duplicates": collapse_duplicates, "estimate_salary": estimate_salary}, exclusions
+            )
+            return Response(body, media_type="application/json", headers={"Cache-Control": "no-store"})
+        
+        vacancies_data["fanout_applied"] = bool(streams)
+        if background_tasks is not None and vacancies_data.get("items"):
+            background_tasks.add_task(store_vacancies, list(vacancies_data["items"]))
+        
+        # Ранжирование требует резюме, то есть валидного HH токена
+        rank_user_id = user_id if hh_token else None
+        page_options = {
+            "enrich": enrich_employers, "trusted_only": trusted_only, "industry": industry,
+            "collapse_duplicates": collapse_duplicates, "estimate_salary": estimate_salary
+        }
+        # Отфильтрованное на странице добирается из следующей страницы HH (курсорные режимы — без добора)
+        next_page = None
+        if not streams and not snapshot:
+            next_page = _next_page_loader(hh_client, filters, professional_roles, page, per_page, vacancies_data.get("pages", 0))
+        body = await _render_search_page(
+            vacancies_data, hh_client, professional_roles, rank, rank_user_id, fields, page_options,
+            exclusions, next_page
         )
+        with span("cache_write"):
+            entry = await cache.set(search_key, body, SEARCH_CACHE_TTL)
         
-        # Добавляем информацию об умном поиске в ответ
-        vacancies_data["smart_search_applied"] = professional_roles is not None
-        if professional_roles:
-            vacancies_data["professional_roles_used"] = professional_roles
-            
-        return vacancies_data
+        # Упреждающе загружаем следующую страницу и детали вакансий текущей
+        if prefetch and not streams and not snapshot:
+            _schedule_search_prefetch(
+                vacancies_data, hh_client, filters, professional_roles, rank,
+                rank_user_id, fields, page, per_page, search_key_for, page_options, exclusions
+            )
+        return cached_response(request, entry, cache_control, vary="Authorization")
         
+    except (HTTPException, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Error searching vacancies: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-        return vacancies_data
-    except Exception as e:
-        logger.error(f"Error searching vacancies: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+def _next_page_loader(hh_client, filters: dict, professional_roles, page: int, per_page: int, pages: int):
+    """Загрузчик вакансий следующей страницы HH для добора отфильтрованной; None — страница последняя"""
+    next_page = page + 1
+    if next_page >= pages or next_page * per_page >= 2000:
+        return None
+    
+    async def load() -> list:
+        data = await hh_client.search_vacancies(
+            **filters, page=next_page, per_page=per_page, professional_roles=professional_roles
+        )
+        return data.get("items", [])
+    return load
 
-@app.get("/user/profile")
-async def get_user_profile(request: Request):
-    """Получение профиля пользователя из HeadHunter API"""
-    token = request.headers.get("authorization", "").replace("Bearer ", "")
-    if not token:
-        raise HTTPException(status_code=401, detail="Unauthorized")
+async def _filter_page(items: list, hh_client, page_options: dict, exclusions, with_employers: bool):
+    """Исключения пользователя, свертка дубликатов, фильтры по работодателю; (оставшиеся вакансии, детали работодателей)"""
+    if exclusions is not None:
+        items = exclusions.filter(items)
+    if page_options.get("collapse_duplicates"):
+        # Minhash и свертка под блокировкой индекса — не на event loop
+        with span("dedup"):
+            items = await run_in_threadpool(duplicate_index.collapse, items)
+    employers = None
+    if with_employers:
+        # Детали работодателей — одной пачкой на страницу, общей для фильтров и ранжирования
+        with span("employers"):
+            employers = await employer_directory.get_many(hh_client, employer_ids(items))
+        items = filter_vacancies(items, employers, page_options.get("trusted_only", False), page_options.get("industry"))
+    return items, employers
+
+async def _render_search_page(
+    vacancies_data: dict, hh_client, professional_roles, rank: bool, user_id, fields,
+    page_options: Optional[dict] = None, exclusions=None, next_page=None
+) -> bytes:
+    """Фильтры, работодатели, ранжирование, служебные поля, проекция и сериализация страницы поиска"""
+    page_options = page_options or {}
+    ranking = bool(rank and user_id)
+    with_employers = bool(
+        ranking or page_options.get("enrich") or page_options.get("trusted_only") or page_options.get("industry")
+    )
+    employers = None
+    if exclusions or with_employers or page_options.get("collapse_duplicates"):
+        items = vacancies_data.get("items", [])
+        kept, employers = await _filter_page(items, hh_client, page_options, exclusions, with_employers)
+        shortfall = len(items) - len(kept)
+        if shortfall:
+            vacancies_data["filtered_out"] = shortfall
+            # Страница не должна усыхать от фильтров: добираем из следующей страницы HH
+            if next_page is not None:
+                try:
+                    with span("backfill"):
+                        extra, extra_employers = await _filter_page(
+                            await next_page(), hh_client, page_options, exclusions, with_employers
+                        )
+                except Exception as e:
+                    logger.warning(f"Search page backfill failed: {type(e).__name__}: {e}")
+                else:
+                    combined = kept + extra
+                    if page_options.get("collapse_duplicates"):
+                        # Добранные вакансии могут оказаться перепостами уже выданных
+                        combined = await run_in_threadpool(duplicate_index.collapse, combined)
+                    vacancies_data["backfilled"] = min(len(combined), len(items)) - len(kept)
+                    kept = combined[:len(items)]
+                    if extra_employers:
+                        employers = {**employers, **extra_employers}
+            vacancies_data["items"] = kept
+        if page_options.get("enrich"):
+            attach_employers(kept, employers)
+        if page_options.get("trusted_only") or page_options.get("industry"):
+            # Детали части работодателей не загрузились: их вакансии оставлены без проверки фильтром
+            unchecked = unchecked_count(kept, employers)
+            if unchecked:
+                vacancies_data["employer_filter_unchecked"] = unchecked
+    
+    # Оценка зарплаты вакансиям без вилки — до ранжирования, которое ее учитывает.
+    # Признаки и поиск соседей под блокировкой индекса — в пуле потоков, не на event loop
+    if page_options.get("estimate_salary"):
+        with span("salary_estimate"):
+            vacancies_data["salary_estimated"] = await run_in_threadpool(
+                attach_salary_estimates, vacancies_data.get("items", []), salary_index
+            )
+    
+    # Ранжируем страницу по релевантности резюме пользователя
+    vacancies_data["ranking_applied"] = False
+    if ranking:
+        profile = ranker.get_profile(user_id)
+        if profile is None:
+            profile = ranker.build_profile(user_id, await hh_client.get_resumes())
+        with span("rank"):
+            vacancies_data["items"] = ranker.rank(profile, vacancies_data.get("items", []), employers)
+        vacancies_data["ranking_applied"] = True
+    
+    # Добавляем информацию об умном поиске в ответ
+    vacancies_data["smart_search_applied"] = professional_roles is not None
+    if professional_roles:
+        vacancies_data["professional_roles_used"] = professional_roles
     
+    # Проекция полей и сериализация через orjson без jsonable_encoder;
+    # ETag считается один раз при записи в кеш
+    with span("serialize"):
+        return orjson.dumps(project_search_response(vacancies_data, parse_fields(fields)))
+
+def _schedule_search_prefetch(
+    vacancies_data: dict, hh_client, filters: dict, professional_roles, rank: bool,
+    user_id, fields, page: int, per_page: int, search_key_for, page_options: Optional[dict] = None,
+    exclusions=None
+):
+    """Следующая страница выдачи и детали вакансий текущей — в кеш, в фоне"""
+    # Упреждающие вызовы расходуют только свободную квоту HH
+    background_client = hh_client.in_lane(BACKFILL)
+    next_page = page + 1
+    if next_page < vacancies_data.get("pages", 0) and next_page * per_page < 2000:
+        fetched = {}
+        
+        async def produce_page():
+            data = await background_client.search_vacancies(
+                **filters, page=next_page, per_page=per_page, professional_roles=professional_roles
+            )
+            data["fanout_applied"] = False
+            if data.get("items"):
+                await run_in_threadpool(store_vacancies, list(data["items"]))
+            fetched["data"] = data
+            loader = _next_page_loader(background_client, filters, professional_roles, next_page, per_page, data.get("pages", 0))
+            return await _render_search_page(
+                data, background_client, professional_roles, rank, user_id, fields, page_options,
+                exclusions, loader
+            )
+        
+        def follow_up():
+            # Пользователь открыл загруженную заранее страницу — готовим следующую
+            if "data" in fetched:
+                _schedule_search_prefetch(
+                    fetched["data"], hh_client, filters, professional_roles, rank,
+                    user_id, fields, next_page, per_page, search_key_for, page_options, exclusions
+                )
+        
+        prefetcher.schedule("page", search_key_for(next_page), produce_page, SEARCH_CACHE_TTL, on_hit=follow_up)
+    
+    async def produce_detail(key: str):
+        vacancy = await background_client.get_vacancy(key.rsplit(":", 1)[1])
+        # Полное описание заменяет признаки, посчитанные по сниппету
+        await run_in_threadpool(store_features, [vacancy])
+        return orjson.dumps(vacancy)
+    
+    prefetcher.schedule_many(
+        "detail",
+        [f"vacancy_detail:{item['id']}" for item in vacancies_data.get("items", [])],
+        produce_detail,
+        VACANCY_DETAIL_TTL
+    )
+
+async def _load_reference(name: str, producer):
+    """Справочник из общего кеша; при промахе — загрузить из HH и положить в кеш"""
+    entry = await cache.get(f"reference:{name}")
+    if entry is None:
+        entry = await cache.set(f"reference:{name}", orjson.dumps(await producer()), REFERENCE_CACHE_TTL)
+    return entry
+
+async def _reference_response(request: Request, name: str, producer):
+    """Справочные данные: общий кеш на сутки, публичные для CDN"""
     try:
-        from services.hh_client import HHClient
-        hh_client = HHClient(access_token=token)
-        user_data = await hh_client.get_me()
-        
-        # Формируем полное имя
-        first_name = user_data.get("first_name", "")
-        last_name = user_data.get("last_name", "") 
-        middle_name = user_data.get("middle_name", "")
-        
-        full_name = f"{last_name} {first_name}".strip()
-        if middle_name:
-            full_name = f"{last_name} {first_name} {middle_name}".strip()
-        
-        return {
-            "id": user_data.get("id"),
-            "email": user_data.get("email"),
-            "name": f"{first_name} {last_name}".strip(),
-            "full_name": full_name,
-            "first_name": first_name,
-            "last_name": last_name,
-            "middle_name": middle_name,
-            "hh_id": user_data.get("id"),
-            "hh_token": "token_exists"
+        entry = await _load_reference(name, producer)
+    except Exception as e:
+        stale_entry = await cache.get(f"reference:{name}", allow_stale=True)
+        if stale_entry is None or not is_upstream_failure(e):
+            raise
+        logger.warning(f"HH {name} unavailable, serving stale copy: {e}")
+        return cached_response(request, mark_stale(stale_entry), "no-cache", headers={"X-Stale": "true"})
+    return cached_response(request, entry, "public, max-age=3600, s-maxage=86400")
+
+@app.get("/dictionaries")
+async def get_dictionaries(request: Request):
+    """Справочники HH (валюты, опыт, занятость, график)"""
+    return await _reference_response(request, "dictionaries", HHClient().get_dictionaries)
+
+@app.get("/areas")
+async def get_areas(request: Request):
+    """Справочник регионов HH"""
+    return await _reference_response(request, "areas", HHClient().get_areas)
+
+@app.get("/professional_roles")
+async def get_professional_roles(request: Request):
+    """Справочник профессиональных ролей HH"""
+    return await _reference_response(request, "professional_roles", HHClient().get_professional_roles)
+
+@app.get("/vacancies/export")
+async def export_vacancies(
+    request: Request,
+    format: str = "ndjson",
+    source: str = "hh",
+    text: Optional[str] = None,
+    area: Optional[int] = None,
+    salary: Optional[int] = None,
+    salary_to: Optional[int] = None,
+    experience: Optional[str] = None,
+    employment: Optional[str] = None,
+    professional_role: Optional[str] = None,
+    max_rows: int = 10000,
+    show_excluded: bool = False,
+    collapse_duplicates: bool = True,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Потоковая выгрузка вакансий в NDJSON или CSV.
+
+    source=hh — постраничный обход выдачи HH (не больше 2000 вакансий),
+    source=local — локальное хранилище с фильтрами по нормализованной зарплате.
+    Только для авторизованных: вызовы HH идут в суточную квоту пользователя,
+    одновременных выгрузок у пользователя не больше EXPORT_USER_CONCURRENCY.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    if source not in ("hh", "local"):
+        raise HTTPException(status_code=400, detail="source must be hh or local")
+    max_rows = max(1, min(max_rows, 100000))
+    
+    user_id = current_user["id"]
+    exclusions = None
+    if source == "hh":
+        hh_token = await TokenService(db).get_valid_token(user_id)
+        if not show_excluded:
+            exclusions = await load_exclusions(exclusion_index, user_id)
+        filters = {"text": text, "area": area, "salary": salary, "experience": experience, "employment": employment}
+        if professional_role:
+            filters["professional_roles"] = [professional_role]
+        # Массовая выгрузка идет в полосе monitoring и не мешает интерактивным запросам
+        chunks = harvest_vacancies(HHClient(access_token=hh_token, lane=MONITORING, user_id=user_id), filters, max_items=max_rows)
+    else:
+        filters = {
+            "area": area, "experience": experience, "professional_role": professional_role,
+            "salary_from": salary, "salary_to": salary_to
         }
+        chunks = iter_local_vacancies(SessionLocal, filters, max_items=max_rows)
+    
+    # Кластеры дубликатов, уже попавшие в выгрузку: перепост из следующей части не повторяется
+    seen_clusters = set() if source == "hh" and collapse_duplicates else None
+    
+    if not export_slots.acquire(user_id):
+        raise HTTPException(status_code=429, detail="Another export is already running", headers={"Retry-After": "30"})
+    released = False
+    
+    def release_slot():
+        # Вызывается из генератора и из фоновой задачи ответа: генератор может так и не стартовать
+        nonlocal released
+        if not released:
+            released = True
+            export_slots.release(user_id)
+    
+    async def stream():
+        exported = 0
+        try:
+            if format == "csv":
+                yield encode_csv([], header=True)
+            async for chunk in chunks:
+                # Клиент ушел — прекращаем обход HH и чтение из БД
+                if await request.is_disconnected():
+                    logger.info(f"Export cancelled by client after {exported} rows")
+                    break
+                if exclusions is not None:
+                    chunk = exclusions.filter(chunk)
+                if seen_clusters is not None:
+                    chunk = await run_in_threadpool(duplicate_index.collapse, chunk, seen_clusters)
+                rows = hh_export_rows(chunk) if source == "hh" else chunk
+                exported += len(rows)
+                yield encode_ndjson(rows) if format == "ndjson" else encode_csv(rows)
+        finally:
+            release_slot()
+            await chunks.aclose()
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=vacancies.{format}"},
+        background=BackgroundTask(release_slot)
+    )
+
+@app.get("/hh/scheduler/stats", dependencies=[Depends(require_admin)])
+async def get_hh_scheduler_stats():
+    """Очереди вызовов HH по полосам и расход квоты пользователями за сутки"""
+    return hh_scheduler.get_stats()
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_window(seconds: float = 10.0, interval_ms: float = 5.0, format: str = "speedscope"):
+    """Профиль event loop за окно в seconds секунд: speedscope JSON или свернутые стеки"""
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be speedscope or collapsed")
+    seconds = max(0.1, min(seconds, 60.0))
+    try:
+        profiler.start(interval=max(1.0, interval_ms) / 1000, thread_id=threading.get_ident())
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await run_in_threadpool(profiler.stop)
+    if format == "collapsed":
+        return PlainTextResponse(profiler.to_collapsed())
+    return ORJSONResponse(profiler.to_speedscope(f"event loop, {seconds:.0f}s window"))
+
+@app.post("/admin/analytics/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_analytics(db: Session = Depends(get_db)):
+    """Пересчитать vacancy_rollups и salary_histogram с нуля по таблице vacancies"""
+    return {"vacancies": await run_in_threadpool(rebuild_vacancy_rollups, db)}
+
+@app.post("/admin/skills/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_skills(db: Session = Depends(get_db)):
+    """Пересчитать skill_rollups с нуля по активным вакансиям и их признакам"""
+    return {"vacancies": await run_in_threadpool(rebuild_skill_rollups, db)}
+
+@app.post("/admin/tracemalloc/start", dependencies=[Depends(require_admin)])
+async def tracemalloc_start(frames: int = 10):
+    allocations.start(max(1, min(frames, 50)))
+    return {"tracing": allocations.running}
+
+@app.post("/admin/tracemalloc/stop", dependencies=[Depends(require_admin)])
+async def tracemalloc_stop():
+    allocations.stop()
+    return {"tracing": allocations.running}
+
+@app.post("/admin/tracemalloc/snapshot", dependencies=[Depends(require_admin)])
+async def tracemalloc_snapshot(limit: int = 25, group_by: str = "lineno"):
+    """Снимок аллокаций; он же становится базой для /admin/tracemalloc/diff"""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    try:
+        return await run_in_threadpool(allocations.snapshot, limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/tracemalloc/diff", dependencies=[Depends(require_admin)])
+async def tracemalloc_diff(limit: int = 25, group_by: str = "lineno"):
+    """Рост памяти с последнего снимка"""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    try:
+        return await run_in_threadpool(allocations.diff, limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/vacancies/prefetch/stats")
+async def get_prefetch_stats():
+    """Эффективность упреждающей загрузки: сколько загружено и сколько из этого пригодилось"""
+    return prefetcher.get_stats()
+
+@app.get("/vacancies/duplicates/stats")
+async def get_duplicate_stats():
+    """Индекс почти-дубликатов процесса: сколько вакансий и во сколько кластеров они сворачиваются"""
+    return await run_in_threadpool(duplicate_index.get_stats)
+
+@app.get("/vacancies/salary-index/stats")
+async def get_salary_index_stats():
+    """Индекс оценки зарплат процесса: сколько вакансий с зарплатой, по скольким ролям, объем"""
+    return await run_in_threadpool(salary_index.get_stats)
+
+@app.get("/vacancies/{vacancy_id}")
+async def get_vacancy(
+    vacancy_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Детали вакансии (кеш заполняется в том числе упреждающей загрузкой из поиска)"""
+    key = f"vacancy_detail:{vacancy_id}"
+    entry = await cache.get(key)
+    if entry is not None:
+        prefetcher.record_hit(key)
+        return cached_response(request, entry, "public, max-age=300")
+    try:
+        vacancy = await HHClient().get_vacancy(vacancy_id)
     except Exception as e:
-        logger.error(f"Error getting user profile: {e}")
+        if not is_upstream_failure(e):
+            if isinstance(e, httpx.HTTPStatusError):
+                raise HTTPException(status_code=e.response.status_code, detail="Vacancy not available")
+            raise
+        # Устаревшая копия из кеша, иначе элемент выдачи из локального хранилища
+        stale_entry = await cache.get(key, allow_stale=True)
+        if stale_entry is not None:
+            return cached_response(request, mark_stale(stale_entry), "no-cache")
+        vacancy = await run_in_threadpool(VacancyStore(db).get_raw, vacancy_id)
+        if vacancy is None:
+            raise HTTPException(status_code=503, detail="HeadHunter API is unavailable")
+        return Response(orjson.dumps({**vacancy, "stale": True}), media_type="application/json", headers={"Cache-Control": "no-store"})
+    entry = await cache.set(key, orjson.dumps(vacancy), VACANCY_DETAIL_TTL)
+    background_tasks.add_task(store_features, [vacancy])
+    if vacancy.get("archived"):
+        background_tasks.add_task(archive_vacancies, [vacancy_id])
+    return cached_response(request, entry, "public, max-age=300")
+
+@app.get("/vacancies/{vacancy_id}/salary-estimate")
+async def get_salary_estimate(vacancy_id: str, db: Session = Depends(get_db)):
+    """Сохраненная оценка зарплаты вакансии без опубликованной вилки (месячный net в рублях)"""
+    estimate = SalaryEstimateStore(db).get(vacancy_id)
+    if estimate is None:
+        raise HTTPException(status_code=404, detail="Salary estimate not found")
+    return estimate
+
+@app.get("/vacancies/{vacancy_id}/features")
+async def get_vacancy_features(vacancy_id: str, db: Session = Depends(get_db)):
+    """Признаки вакансии, посчитанные при сохранении: текст без HTML, леммы, навыки"""
+    features = FeatureStore(db).get_many([vacancy_id]).get(vacancy_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail="Vacancy features not computed yet")
+    return features
+
+@app.post("/apply/queue")
+async def enqueue_applications(
+    payload: ApplyQueueRequest,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Поставить пачку откликов в очередь автооткликов"""
+    if not payload.vacancy_ids:
+        raise HTTPException(status_code=400, detail="vacancy_ids must not be empty")
+    if len(payload.vacancy_ids) > 1000:
+        raise HTTPException(status_code=400, detail="Too many vacancies in one request (max 1000)")
+    
+    result = ApplyQueueService(db).enqueue(
+        user_id=current_user["id"],
+        resume_id=payload.resume_id,
+        vacancy_ids=payload.vacancy_ids,
+        message=payload.message or "",
+        skip_near_duplicates=payload.skip_near_duplicates
+    )
+    # Только вставленные: пропущенные почти-дубликаты не исключаются и при загрузке из БД
+    exclusion_index.note(current_user["id"], vacancies=result["queued_ids"])
+    logger.info(
+        f"User {current_user['id']} queued {result['queued']} applications "
+        f"({result['duplicates']} duplicates, {result['near_duplicates']} near-duplicates)"
+    )
+    return result
+
+@app.get("/apply/queue/stats")
+async def get_apply_queue_stats(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Статистика очереди автооткликов пользователя и пропускная способность воркера"""
+    stats = ApplyQueueService(db).get_stats(current_user["id"])
+    stats["worker"] = apply_worker.stats
+    return stats
+
+@app.get("/negotiations")
+async def get_negotiations(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Список откликов пользователя; состояния сохраняются для аналитики"""
+    token_service = TokenService(db)
+    valid_token = await token_service.get_valid_token(current_user["id"])
+    if not valid_token:
+        raise HTTPException(status_code=401, detail="HH token expired, please re-authenticate")
+    
+    try:
+        negotiations = await HHClient(access_token=valid_token, user_id=current_user["id"]).get_negotiations(per_page=100)
+        NegotiationStore(db).upsert_many(current_user["id"], negotiations)
+        exclusion_index.note(current_user["id"], vacancies=[(item.get("vacancy") or {}).get("id") for item in negotiations])
+        return {"items": negotiations, "found": len(negotiations)}
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error getting negotiations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/exclusions")
+async def get_exclusions(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Скрытые работодатели и вакансии; excluded — размер набора вместе с откликами"""
+    hidden = ExclusionStore(db).list(current_user["id"])
+    exclusions = await exclusion_index.get(current_user["id"])
+    return {"employers": hidden["employer"], "vacancies": hidden["vacancy"], "excluded": exclusions.get_stats()}
+
+@app.post("/exclusions")
+async def add_exclusions(
+    payload: ExclusionRequest,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Скрыть работодателей и вакансии из поиска и выгрузки"""
+    if not payload.employer_ids and not payload.vacancy_ids:
+        raise HTTPException(status_code=400, detail="employer_ids or vacancy_ids must not be empty")
+    if len(payload.employer_ids) + len(payload.vacancy_ids) > 1000:
+        raise HTTPException(status_code=400, detail="Too many exclusions in one request (max 1000)")
+    
+    store = ExclusionStore(db)
+    if payload.employer_ids:
+        store.add(current_user["id"], "employer", payload.employer_ids)
+    if payload.vacancy_ids:
+        store.add(current_user["id"], "vacancy", payload.vacancy_ids)
+    exclusion_index.note(current_user["id"], employers=payload.employer_ids, vacancies=payload.vacancy_ids)
+    return {"hidden": len(payload.employer_ids) + len(payload.vacancy_ids)}
+
+@app.delete("/exclusions/{kind}/{target_id}")
+async def remove_exclusion(
+    kind: str,
+    target_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Вернуть скрытого работодателя (kind=employer) или вакансию (kind=vacancy) в выдачу"""
+    if kind not in ("employer", "vacancy"):
+        raise HTTPException(status_code=400, detail="kind must be employer or vacancy")
+    removed = ExclusionStore(db).remove(current_user["id"], kind, [target_id])
+    if not removed:
+        raise HTTPException(status_code=404, detail="Exclusion not found")
+    # Из отсортированного массива не вычитаем: вакансия может остаться исключенной из-за отклика
+    exclusion_index.invalidate(current_user["id"])
+    return {"removed": removed}
+
+@app.get("/analytics")
+async def get_analytics(
+    role_id: Optional[str] = None,
+    area: Optional[int] = None,
+    weeks: int = 12,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Аналитика рынка из предагрегированных rollup-таблиц"""
+    return AnalyticsService(db).get_dashboard(
+        user_id=current_user["id"],
+        role_ids=_analytics_roles(db, current_user["id"], role_id),
+        area_id=str(area) if area else None,
+        weeks=max(1, min(weeks, 104))
+    )
+
+@app.get("/analytics/skills")
+async def get_skill_demand(
+    role_id: Optional[str] = None,
+    area: Optional[int] = None,
+    weeks: int = 12,
+    limit: int = 20,
+    sort: str = "demand",
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Топ навыков открытых вакансий и их динамика (sort=demand|trend) из skill_rollups"""
+    if sort not in ("demand", "trend"):
+        raise HTTPException(status_code=400, detail="sort must be demand or trend")
+    return SkillDemandService(db).get_top_skills(
+        role_ids=_analytics_roles(db, current_user["id"], role_id),
+        area_id=str(area) if area else None,
+        weeks=max(1, min(weeks, 52)),
+        limit=max(1, min(limit, 100)),
+        sort=sort
+    )
+
+def _analytics_roles(db: Session, user_id: int, role_id: Optional[str]) -> Optional[List[str]]:
+    if role_id:
+        return [role_id]
+    # По умолчанию — роли из резюме пользователя
+    role_ids = [
+        str(row[0]) for row in db.execute(
+            sql_text("SELECT DISTINCT role_id FROM user_professional_roles WHERE user_id = :user_id"),
+            {"user_id": user_id}
+        ).fetchall()
+    ]
+    return role_ids or None
+
+async def refresh_profile(user_id: int):
+    """Сверить профиль с HH /me и обновить строку users, если он изменился (фоновая задача)"""
+    clear_deadline()
+    if user_id in _profile_refreshing:
+        return
+    _profile_refreshing.add(user_id)
+    db = SessionLocal()
+    try:
+        token = await TokenService(db).get_valid_token(user_id)
+        if not token:
+            return
+        me = await HHClient(access_token=token, lane=MONITORING, user_id=user_id).get_me()
+        changed, row = ProfileStore(db).apply_me(user_id, me)
+        if changed:
+            await cache.set(f"profile:{user_id}", orjson.dumps(render_profile(row)), PROFILE_CACHE_TTL)
+            logger.info(f"Profile of user {user_id} updated from HH")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Profile refresh failed for user {user_id}: {e}")
+    finally:
+        db.close()
+        _profile_refreshing.discard(user_id)
+
+@app.get("/user/profile")
+async def get_user_profile(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Профиль пользователя из таблицы users; сверка с HH /me идет в фоне по TTL"""
+    key = f"profile:{current_user['id']}"
+    with span("cache_read"):
+        entry = await cache.get(key)
+    mark("cache", "hit" if entry is not None else "miss")
+    if entry is None:
+        row = ProfileStore(db).get(current_user["id"])
+        if row is None:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        entry = await cache.set(key, orjson.dumps(render_profile(row)), PROFILE_CACHE_TTL)
+        if ProfileStore.is_stale(row):
+            background_tasks.add_task(refresh_profile, current_user["id"])
+    return cached_response(request, entry, "private, max-age=60")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
 # Резюме endpoints
 
 # Resume endpoints with database integration
+def _rebuild_profile_from_details(user_id: int, resumes: list, full: dict):
+    """Полные резюме дают ранжированию опыт по отраслям; профиль пересобирается, если загружены все"""
+    if resumes and all(str(resume.get("id")) in full for resume in resumes):
+        ranker.build_profile(user_id, [full[str(resume["id"])] for resume in resumes])
+
+async def prefetch_resume_details(access_token: str, user_id: int, resumes: list):
+    """Догрузить изменившиеся резюме в кеш после ответа /resumes/mine (фоновая задача)"""
+    clear_deadline()
+    try:
+        full = await resume_details.sync(HHClient(access_token=access_token, lane=BACKFILL, user_id=user_id), user_id, resumes)
+        _rebuild_profile_from_details(user_id, resumes, full)
+    except Exception as e:
+        logger.warning(f"Resume prefetch failed for user {user_id}: {e}")
+
 @app.get("/resumes/mine")
-async def get_my_resumes(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Получить список резюме пользователя с использованием БД токенов"""
-    from services.token_service import TokenService
-    from services.hh_client import HHClient
-    
+async def get_my_resumes(
+    background_tasks: BackgroundTasks,
+    details: bool = False,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Список резюме пользователя; details=true — сразу с полными резюме по id"""
     try:
         # Получаем валидный токен из БД
         token_service = TokenService(db)
@@ -373,24 +1264,42 @@ async def get_my_resumes(current_user: dict = Depends(get_current_user), db: Ses
             raise HTTPException(status_code=401, detail="HH token expired, please re-authenticate")
         
         # Получаем резюме от HH API
-        hh_client = HHClient(access_token=valid_token)
+        hh_client = HHClient(access_token=valid_token, user_id=current_user["id"])
         resumes = await hh_client.get_resumes()
         
         # Сохраняем professional_roles в БД для умного поиска
         await _save_professional_roles(db, current_user["id"], resumes)
+        # Резюме могли измениться — пересобираем профиль для ранжирования
+        ranker.build_profile(current_user["id"], resumes)
         
-        return {"items": resumes, "found": len(resumes)}
+        if not details:
+            # Полные резюме понадобятся на следующем экране — грузим изменившиеся заранее
+            background_tasks.add_task(prefetch_resume_details, valid_token, current_user["id"], resumes)
+            return {"items": resumes, "found": len(resumes)}
         
+        full = await resume_details.sync(hh_client, current_user["id"], resumes)
+        _rebuild_profile_from_details(current_user["id"], resumes, full)
+        return {"items": resumes, "found": len(resumes), "details": full}
+        
+    except (HTTPException, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Error getting resumes: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/resumes/{resume_id}")
-async def get_resume_details(resume_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Получить детали конкретного резюме"""
-    from services.token_service import TokenService
-    from services.hh_client import HHClient
-    import httpx
+async def get_resume_details(
+    resume_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Получить детали конкретного резюме (кеш обновляется по updated_at из /resumes/mine)"""
+    with span("cache_read"):
+        entry = await resume_details.get(current_user["id"], resume_id)
+    mark("cache", "hit" if entry is not None else "miss")
+    if entry is not None:
+        return cached_response(request, entry, "private, no-cache")
     
     try:
         # Получаем валидный токен из БД
@@ -401,49 +1310,46 @@ async def get_resume_details(resume_id: str, current_user: dict = Depends(get_cu
             raise HTTPException(status_code=401, detail="HH token expired, please re-authenticate")
         
         # Получаем детали резюме от HH API
-        hh_client = HHClient(access_token=valid_token)
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.hh.ru/resumes/{resume_id}",
-                headers=hh_client._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
+        detail = await HHClient(access_token=valid_token, user_id=current_user["id"]).get_resume(resume_id)
+        entry = await resume_details.put(current_user["id"], detail)
+        return cached_response(request, entry, "private, no-cache")
             
+    except (HTTPException, DeadlineExceeded):
+        raise
     except Exception as e:
         logger.error(f"Error getting resume details: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def _save_professional_roles(db: Session, user_id: int, resumes: list):
     """Сохранить professional_roles из резюме в БД для умного поиска"""
-    from sqlalchemy import text
-    
     try:
         # Удаляем старые роли пользователя
         db.execute(
-            text("DELETE FROM user_professional_roles WHERE user_id = :user_id"),
+            sql_text("DELETE FROM user_professional_roles WHERE user_id = :user_id"),
             {"user_id": user_id}
         )
         
-        # Собираем все роли из всех резюме
+        # Собираем роли по каждому резюме (нужно для поиска по резюме)
         all_roles = set()
         for resume in resumes:
             professional_roles = resume.get("professional_roles", [])
             for role in professional_roles:
-                all_roles.add((role["id"], role["name"]))
+                all_roles.add((resume.get("id"), role["id"], role["name"]))
         
         # Сохраняем уникальные роли
-        for role_id, role_name in all_roles:
+        distinct_roles = {role_id for _, role_id, _ in all_roles}
+        for resume_id, role_id, role_name in all_roles:
             db.execute(
-                text("""
-                INSERT INTO user_professional_roles (user_id, role_id, role_name, is_primary)
-                VALUES (:user_id, :role_id, :role_name, :is_primary)
+                sql_text("""
+                INSERT INTO user_professional_roles (user_id, resume_id, role_id, role_name, is_primary)
+                VALUES (:user_id, :resume_id, :role_id, :role_name, :is_primary)
                 """),
                 {
                     "user_id": user_id,
+                    "resume_id": resume_id,
                     "role_id": role_id,
                     "role_name": role_name,
-                    "is_primary": len(all_roles) == 1  # Если роль одна - делаем её основной
+                    "is_primary": len(distinct_roles) == 1  # Если роль одна - делаем её основной
                 }
             )
         
@@ -1,7 +1,7 @@
 """Database models for JobHunter Pro."""
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Date, ForeignKey, Boolean, UniqueConstraint, Index, JSON, LargeBinary, Float
 import uuid
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -23,6 +23,7 @@ class User(Base):
     middle_name = Column(String(100))
     phone = Column(String(20))
     is_active = Column(Boolean, default=True)
+    profile_synced_at = Column(DateTime(timezone=True))  # Last check of the profile against HH /me
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -57,6 +58,7 @@ class UserProfessionalRole(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    resume_id = Column(String(50), index=True)  # Resume the role was taken from
     role_id = Column(String(50), nullable=False)  # HH professional role ID
     role_name = Column(String(255), nullable=False)  # Role name
     is_primary = Column(Boolean, default=False)  # Primary role for smart search
@@ -64,3 +66,185 @@ class UserProfessionalRole(Base):
     
     # Relationships
     user = relationship("User", back_populates="professional_roles")
+
+
+class ApplyQueueItem(Base):
+    """Apply queue entry: one row per (resume, vacancy) pair, the idempotency key."""
+    
+    __tablename__ = "apply_queue"
+    __table_args__ = (
+        UniqueConstraint("resume_id", "vacancy_id", name="uq_apply_queue_resume_vacancy"),
+        Index("ix_apply_queue_status_next_attempt", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    resume_id = Column(String(50), nullable=False)
+    vacancy_id = Column(String(50), nullable=False)
+    message = Column(Text, default="")
+    status = Column(String(20), nullable=False, default="pending")  # pending, in_progress, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    negotiation_id = Column(String(50))  # ID отклика в HH после успешной отправки
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    locked_at = Column(DateTime(timezone=True))  # Когда воркер взял запись в работу
+    applied_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Vacancy(Base):
+    """Local store of vacancies seen in HH search results."""
+    
+    __tablename__ = "vacancies"
+    __table_args__ = (
+        Index("ix_vacancies_role_area_salary", "professional_role_id", "area_id", "salary_net_rub"),
+    )
+    
+    id = Column(String(50), primary_key=True)  # HH vacancy ID
+    name = Column(String(512), nullable=False)
+    employer_id = Column(String(50), index=True)
+    employer_name = Column(String(512))
+    area_id = Column(String(50), index=True)
+    area_name = Column(String(255))
+    professional_role_id = Column(String(50), index=True)  # First professional role of the vacancy
+    experience_id = Column(String(50))
+    salary_from = Column(Integer)
+    salary_to = Column(Integer)
+    salary_currency = Column(String(10))
+    salary_gross = Column(Boolean)
+    # Salary normalized at ingest to monthly net RUB, comparable across currencies
+    salary_net_rub_from = Column(Integer, index=True)
+    salary_net_rub_to = Column(Integer, index=True)
+    salary_net_rub = Column(Integer, index=True)  # Midpoint, or the only bound of an open range
+    published_at = Column(DateTime(timezone=True), index=True)
+    archived = Column(Boolean, default=False)
+    raw = Column(JSON)  # Full HH payload as returned by search
+    minhash = Column(LargeBinary)  # MinHash signature of name and snippet, 64 x uint32
+    cluster_id = Column(String(50), index=True)  # Near-duplicate cluster: ID of its first vacancy
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class Employer(Base):
+    """Employer details from HH /employers/{id}, used for ranking, filters and analytics."""
+    
+    __tablename__ = "employers"
+    
+    id = Column(String(50), primary_key=True)  # HH employer ID
+    name = Column(String(512))
+    type = Column(String(50))  # company, agency, private_recruiter, project_director
+    trusted = Column(Boolean)
+    accredited_it = Column(Boolean)
+    area_id = Column(String(50))
+    industries = Column(JSON)  # [{"id": "7.540", "name": "..."}]
+    open_vacancies = Column(Integer)
+    site_url = Column(String(512))
+    fetched_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class VacancyFeatures(Base):
+    """Text features of a vacancy computed once per version: plain text, lemmas, skills."""
+    
+    __tablename__ = "vacancy_features"
+    
+    vacancy_id = Column(String(50), primary_key=True)  # HH vacancy ID
+    content_hash = Column(String(64), nullable=False)  # sha256 of the source fields and FEATURES_VERSION
+    source = Column(String(10), nullable=False)  # search (snippet) or detail (full description)
+    text = Column(Text)  # Description converted from HTML to plain text
+    tokens = Column(JSON)  # Lemmatized tokens without stop words
+    skills = Column(JSON)  # key_skills plus known skills found in the text
+    vector = Column(LargeBinary)  # Signed feature-hashed token vector, float16
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class SalaryEstimate(Base):
+    """Salary estimated from the nearest salaried vacancies, for vacancies without a published one."""
+    
+    __tablename__ = "salary_estimates"
+    
+    vacancy_id = Column(String(50), primary_key=True)  # HH vacancy ID
+    salary_from = Column(Integer, nullable=False)  # Monthly net RUB, 25th percentile of the neighbours
+    salary_to = Column(Integer, nullable=False)  # 75th percentile
+    salary_value = Column(Integer, nullable=False)  # Weighted median
+    confidence = Column(Float, nullable=False)  # 0..1: neighbour similarity, agreement and count
+    neighbors = Column(Integer, nullable=False)
+    estimated_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class UserExclusion(Base):
+    """Employer or vacancy hidden by the user from search and export results."""
+    
+    __tablename__ = "user_exclusions"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    kind = Column(String(20), primary_key=True)  # employer, vacancy
+    target_id = Column(String(50), primary_key=True)  # HH employer or vacancy ID
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Negotiation(Base):
+    """Local copy of the user's HH negotiations (applications and their state)."""
+    
+    __tablename__ = "negotiations"
+    
+    id = Column(String(50), primary_key=True)  # HH negotiation ID
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    vacancy_id = Column(String(50), index=True)
+    resume_id = Column(String(50))
+    state = Column(String(50), nullable=False)  # response, invitation, discard, ...
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class VacancyRollup(Base):
+    """Weekly vacancy counts and salary sums per (role, area, experience)."""
+    
+    __tablename__ = "vacancy_rollups"
+    
+    role_id = Column(String(50), primary_key=True)  # '' when unknown
+    area_id = Column(String(50), primary_key=True)
+    experience_id = Column(String(50), primary_key=True)
+    week = Column(Date, primary_key=True)  # Monday of the publication week
+    vacancy_count = Column(Integer, nullable=False, default=0)
+    salary_count = Column(Integer, nullable=False, default=0)
+    salary_sum = Column(BigInteger, nullable=False, default=0)
+
+
+class SalaryHistogram(Base):
+    """Log-scale salary histogram per rollup key, used for percentiles."""
+    
+    __tablename__ = "salary_histogram"
+    
+    role_id = Column(String(50), primary_key=True)
+    area_id = Column(String(50), primary_key=True)
+    experience_id = Column(String(50), primary_key=True)
+    week = Column(Date, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class SkillRollup(Base):
+    """Weekly count of vacancies mentioning a skill per (role, area), total and still active."""
+    
+    __tablename__ = "skill_rollups"
+    __table_args__ = (
+        Index("ix_skill_rollups_area_week", "area_id", "week"),
+    )
+    
+    role_id = Column(String(50), primary_key=True)  # '' when unknown
+    area_id = Column(String(50), primary_key=True)
+    week = Column(Date, primary_key=True)  # Monday of the publication week
+    skill = Column(String(100), primary_key=True)  # '*' counts vacancies with extracted skills
+    count = Column(Integer, nullable=False, default=0)  # Published that week, kept as history
+    active = Column(Integer, nullable=False, default=0)  # Of them not archived or expired yet
+
+
+class NegotiationRollup(Base):
+    """Weekly negotiation counts per user and state."""
+    
+    __tablename__ = "negotiation_rollups"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    week = Column(Date, primary_key=True)
+    state = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,305 @@
+"""Incrementally maintained analytics rollups and the dashboard read path."""
+
+import math
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+# Шаг логарифмической гистограммы зарплат: 5% на корзину
+SALARY_BUCKET_BASE = 1.05
+PERCENTILES = (10, 25, 50, 75, 90)
+# Состояния, которые не означают ответа работодателя
+NO_RESPONSE_STATES = {"response"}
+# Строка skill_rollups с числом вакансий, у которых есть навыки, — знаменатель доли навыка
+ALL_SKILLS = "*"
+# Пространства advisory-блокировок (первый ключ pg_advisory_xact_lock)
+VACANCY_LOCKS = 1
+NEGOTIATION_LOCKS = 2
+
+
+def week_start(moment: Optional[datetime]) -> date:
+    """Понедельник недели (по UTC), к которой относится момент времени"""
+    moment = moment or datetime.now(timezone.utc)
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc)
+    day = moment.date()
+    return day - timedelta(days=day.weekday())
+
+
+def salary_bucket(value: float) -> int:
+    return int(math.floor(math.log(value, SALARY_BUCKET_BASE)))
+
+
+def bucket_value(bucket: int) -> float:
+    return SALARY_BUCKET_BASE ** (bucket + 0.5)
+
+
+def lock_sources(db: Session, namespace: int, ids: Iterable[str]) -> None:
+    """Взять advisory-блокировки транзакции на ID до чтения старого состояния.
+
+    Дельты rollup-таблиц считаются как разность старой и новой строки;
+    без блокировки два одновременных сохранения одной вакансии видят одно
+    и то же старое состояние и оба применяют дельту. Блокировка на ID, а
+    не SELECT ... FOR UPDATE, потому что новой строки еще нет. Ключи
+    берутся в порядке возрастания — без взаимных блокировок.
+    """
+    keys = sorted({zlib.crc32(str(i).encode()) - (1 << 31) for i in ids})
+    if not keys or db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, key) FROM unnest(CAST(:keys AS integer[])) AS key"),
+        {"namespace": namespace, "keys": keys}
+    )
+
+
+class RollupDeltas:
+    """Накопитель изменений rollup-таблиц, применяемый одной пачкой."""
+
+    def __init__(self):
+        self.vacancies: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+        self.histogram: Dict[Tuple, int] = defaultdict(int)
+        self.negotiations: Dict[Tuple, int] = defaultdict(int)
+        self.skills: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0])
+
+    def add_vacancy(self, key: Tuple[str, str, str, date], salary: Optional[float], sign: int = 1) -> None:
+        counters = self.vacancies[key]
+        counters[0] += sign
+        if salary:
+            counters[1] += sign
+            counters[2] += sign * int(salary)
+            self.histogram[key + (salary_bucket(salary),)] += sign
+
+    def add_negotiation(self, user_id: int, week: date, state: str, sign: int = 1) -> None:
+        self.negotiations[(user_id, week, state)] += sign
+
+    def add_skills(self, key: Tuple[str, str, date], skills: Iterable[str], active: bool, sign: int = 1) -> None:
+        for skill in (ALL_SKILLS, *skills):
+            counters = self.skills[key + (skill,)]
+            counters[0] += sign
+            if active:
+                counters[1] += sign
+
+    def apply(self, db: Session) -> None:
+        """Записать накопленные дельты через INSERT ... ON CONFLICT с прибавлением.
+
+        Строки идут в порядке ключей, чтобы параллельные транзакции
+        блокировали строки rollup-таблиц в одном порядке.
+        """
+        vacancy_rows = [
+            {"role_id": k[0], "area_id": k[1], "experience_id": k[2], "week": k[3],
+             "vacancy_count": v[0], "salary_count": v[1], "salary_sum": v[2]}
+            for k, v in sorted(self.vacancies.items()) if any(v)
+        ]
+        if vacancy_rows:
+            db.execute(
+                text("""
+                INSERT INTO vacancy_rollups (role_id, area_id, experience_id, week, vacancy_count, salary_count, salary_sum)
+                VALUES (:role_id, :area_id, :experience_id, :week, :vacancy_count, :salary_count, :salary_sum)
+                ON CONFLICT (role_id, area_id, experience_id, week) DO UPDATE SET
+                    vacancy_count = vacancy_rollups.vacancy_count + EXCLUDED.vacancy_count,
+                    salary_count = vacancy_rollups.salary_count + EXCLUDED.salary_count,
+                    salary_sum = vacancy_rollups.salary_sum + EXCLUDED.salary_sum
+                """),
+                vacancy_rows
+            )
+
+        histogram_rows = [
+            {"role_id": k[0], "area_id": k[1], "experience_id": k[2], "week": k[3], "bucket": k[4], "count": v}
+            for k, v in sorted(self.histogram.items()) if v
+        ]
+        if histogram_rows:
+            db.execute(
+                text("""
+                INSERT INTO salary_histogram (role_id, area_id, experience_id, week, bucket, count)
+                VALUES (:role_id, :area_id, :experience_id, :week, :bucket, :count)
+                ON CONFLICT (role_id, area_id, experience_id, week, bucket) DO UPDATE SET
+                    count = salary_histogram.count + EXCLUDED.count
+                """),
+                histogram_rows
+            )
+
+        negotiation_rows = [
+            {"user_id": k[0], "week": k[1], "state": k[2], "count": v}
+            for k, v in sorted(self.negotiations.items()) if v
+        ]
+        if negotiation_rows:
+            db.execute(
+                text("""
+                INSERT INTO negotiation_rollups (user_id, week, state, count)
+                VALUES (:user_id, :week, :state, :count)
+                ON CONFLICT (user_id, week, state) DO UPDATE SET
+                    count = negotiation_rollups.count + EXCLUDED.count
+                """),
+                negotiation_rows
+            )
+
+        skill_rows = [
+            {"role_id": k[0], "area_id": k[1], "week": k[2], "skill": k[3], "count": v[0], "active": v[1]}
+            for k, v in sorted(self.skills.items()) if any(v)
+        ]
+        if skill_rows:
+            db.execute(
+                text("""
+                INSERT INTO skill_rollups (role_id, area_id, week, skill, count, active)
+                VALUES (:role_id, :area_id, :week, :skill, :count, :active)
+                ON CONFLICT (role_id, area_id, week, skill) DO UPDATE SET
+                    count = skill_rollups.count + EXCLUDED.count,
+                    active = skill_rollups.active + EXCLUDED.active
+                """),
+                skill_rows
+            )
+
+
+def rebuild_vacancy_rollups(db: Session) -> int:
+    """Пересчитать rollup-таблицы вакансий с нуля (после смены формулы нормализации). Возвращает число вакансий.
+
+    Вакансии без даты публикации не учитываются, как и в инкрементальном
+    пути. Запись в vacancies на время пересчета блокируется, чтобы
+    параллельные дельты не потерялись и не учлись дважды.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE vacancies IN SHARE MODE"))
+    db.execute(text("DELETE FROM vacancy_rollups"))
+    db.execute(text("DELETE FROM salary_histogram"))
+    week = "CAST(date_trunc('week', published_at AT TIME ZONE 'UTC') AS date)"
+    db.execute(text(f"""
+        INSERT INTO vacancy_rollups (role_id, area_id, experience_id, week, vacancy_count, salary_count, salary_sum)
+        SELECT COALESCE(professional_role_id, ''), COALESCE(area_id, ''), COALESCE(experience_id, ''), {week},
+               COUNT(*), COUNT(salary_net_rub), COALESCE(SUM(salary_net_rub), 0)
+        FROM vacancies
+        WHERE published_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """))
+    db.execute(text(f"""
+        INSERT INTO salary_histogram (role_id, area_id, experience_id, week, bucket, count)
+        SELECT COALESCE(professional_role_id, ''), COALESCE(area_id, ''), COALESCE(experience_id, ''), {week},
+               CAST(floor(ln(salary_net_rub) / ln(:base)) AS integer), COUNT(*)
+        FROM vacancies
+        WHERE salary_net_rub > 0 AND published_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+    """), {"base": SALARY_BUCKET_BASE})
+    counted = db.execute(text("SELECT COALESCE(SUM(vacancy_count), 0) FROM vacancy_rollups")).scalar()
+    db.commit()
+    return int(counted)
+
+
+def percentiles_from_histogram(buckets: List[Tuple[int, int]]) -> Dict[str, Optional[int]]:
+    """Перцентили по гистограмме [(bucket, count)], отсортированной по bucket"""
+    total = sum(count for _, count in buckets)
+    result: Dict[str, Optional[int]] = {f"p{p}": None for p in PERCENTILES}
+    if not total:
+        return result
+    cumulative = 0
+    targets = iter(PERCENTILES)
+    target = next(targets)
+    for bucket, count in buckets:
+        cumulative += count
+        while target is not None and cumulative >= total * target / 100:
+            result[f"p{target}"] = int(round(bucket_value(bucket), -3))
+            target = next(targets, None)
+    return result
+
+
+class AnalyticsService:
+    """Чтение дашборда только из rollup-таблиц: объем не зависит от числа вакансий."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_dashboard(
+        self,
+        user_id: int,
+        role_ids: Optional[List[str]] = None,
+        area_id: Optional[str] = None,
+        weeks: int = 12
+    ) -> Dict[str, Any]:
+        since = week_start(None) - timedelta(weeks=weeks - 1)
+        conditions = ["week >= :since"]
+        params: Dict[str, Any] = {"since": since}
+        if role_ids:
+            conditions.append("role_id IN :role_ids")
+            params["role_ids"] = list(role_ids)
+        if area_id:
+            conditions.append("area_id = :area_id")
+            params["area_id"] = str(area_id)
+        where = " AND ".join(conditions)
+
+        def query(sql: str):
+            statement = text(sql)
+            if role_ids:
+                statement = statement.bindparams(bindparam("role_ids", expanding=True))
+            return self.db.execute(statement, params).fetchall()
+
+        weekly = query(f"""
+            SELECT week, SUM(vacancy_count), SUM(salary_count), SUM(salary_sum)
+            FROM vacancy_rollups WHERE {where}
+            GROUP BY week ORDER BY week
+        """)
+        by_experience = query(f"""
+            SELECT experience_id, SUM(vacancy_count), SUM(salary_count), SUM(salary_sum)
+            FROM vacancy_rollups WHERE {where}
+            GROUP BY experience_id
+        """)
+        by_area = query(f"""
+            SELECT area_id, SUM(vacancy_count)
+            FROM vacancy_rollups WHERE {where}
+            GROUP BY area_id ORDER BY SUM(vacancy_count) DESC LIMIT 10
+        """)
+        histogram = query(f"""
+            SELECT experience_id, bucket, SUM(count)
+            FROM salary_histogram WHERE {where}
+            GROUP BY experience_id, bucket ORDER BY bucket
+        """)
+
+        overall: Dict[int, int] = defaultdict(int)
+        per_experience: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for experience_id, bucket, count in histogram:
+            overall[bucket] += count
+            per_experience[experience_id].append((bucket, count))
+
+        return {
+            "total_vacancies": sum(row[1] or 0 for row in weekly),
+            "salary_percentiles": percentiles_from_histogram(sorted(overall.items())),
+            "weekly": [
+                {
+                    "week": str(week),
+                    "vacancies": count or 0,
+                    "average_salary": int(salary_sum / salary_count) if salary_count else None,
+                }
+                for week, count, salary_count, salary_sum in weekly
+            ],
+            "by_experience": {
+                experience_id or "unknown": {
+                    "vacancies": count or 0,
+                    "average_salary": int(salary_sum / salary_count) if salary_count else None,
+                    **percentiles_from_histogram(per_experience.get(experience_id, [])),
+                }
+                for experience_id, count, salary_count, salary_sum in by_experience
+            },
+            "top_areas": [{"area_id": area or None, "vacancies": count} for area, count in by_area],
+            "responses": self.get_response_rates(user_id, since),
+        }
+
+    def get_response_rates(self, user_id: int, since: date) -> Dict[str, Any]:
+        rows = self.db.execute(
+            text("""
+            SELECT state, SUM(count) FROM negotiation_rollups
+            WHERE user_id = :user_id AND week >= :since
+            GROUP BY state
+            """),
+            {"user_id": user_id, "since": since}
+        ).fetchall()
+        by_state = {state: count for state, count in rows if count}
+        applied = sum(by_state.values())
+        responded = sum(count for state, count in by_state.items() if state not in NO_RESPONSE_STATES)
+        return {
+            "applied": applied,
+            "responded": responded,
+            "invited": by_state.get("invitation", 0),
+            "response_rate": round(responded / applied, 3) if applied else None,
+            "by_state": by_state,
+        }
@@ -0,0 +1,459 @@
+"""Persistent auto-apply queue drained under HH rate limits."""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from loguru import logger
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from services.hh_client import HHClient, HHUnavailable
+from services.rate_limiter import RateLimiter
+from services.scheduler import APPLY
+from services.token_service import TokenService
+from services.vacancy_store import NegotiationStore, parse_hh_datetime
+
+# Ошибки HH, после которых повтор бессмысленен
+PERMANENT_ERRORS = {
+    "test_required", "letter_required", "archived", "resume_not_found",
+    "vacancy_not_found", "resume_not_published", "invalid_vacancy",
+}
+# Сбои до отправки запроса: POST не дошел до HH, его можно просто повторить.
+# После остальных (таймаут чтения, обрыв ответа, 5xx) отклик мог быть создан
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _hh_error_values(response: httpx.Response) -> List[str]:
+    """Достать коды ошибок из ответа HH ({"errors": [{"type": ..., "value": ...}]})"""
+    try:
+        return [e.get("value") or e.get("type") for e in response.json().get("errors", [])]
+    except ValueError:
+        return []
+
+
+class ApplyQueueService:
+    """Операции над таблицей apply_queue."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _applied_clusters(self, user_id: int, vacancy_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Кластеры дубликатов вакансий и признак, что в кластер уже откликались (значение None)"""
+        clusters = {
+            row[0]: row[1] for row in self.db.execute(
+                text("SELECT id, cluster_id FROM vacancies WHERE id IN :ids AND cluster_id IS NOT NULL")
+                .bindparams(bindparam("ids", expanding=True)),
+                {"ids": vacancy_ids}
+            ).fetchall()
+        }
+        if not clusters:
+            return {}
+        applied: Dict[str, set] = {}
+        for cluster_id, vacancy_id in self.db.execute(
+            text("""
+            SELECT v.cluster_id, v.id FROM vacancies v JOIN apply_queue q ON q.vacancy_id = v.id
+            WHERE q.user_id = :user_id AND q.status <> 'failed' AND v.cluster_id IN :clusters
+            UNION
+            SELECT v.cluster_id, v.id FROM vacancies v JOIN negotiations n ON n.vacancy_id = v.id
+            WHERE n.user_id = :user_id AND v.cluster_id IN :clusters
+            """).bindparams(bindparam("clusters", expanding=True)),
+            {"user_id": user_id, "clusters": list(set(clusters.values()))}
+        ).fetchall():
+            applied.setdefault(cluster_id, set()).add(vacancy_id)
+        # Сама вакансия уже в очереди — это обычный дубликат, его отсеет уникальный ключ
+        return {
+            vacancy_id: (None if cluster_id in applied and vacancy_id not in applied[cluster_id] else cluster_id)
+            for vacancy_id, cluster_id in clusters.items()
+        }
+
+    def enqueue(
+        self, user_id: int, resume_id: str, vacancy_ids: List[str], message: str = "", skip_near_duplicates: bool = True
+    ) -> Dict[str, Any]:
+        """Поставить отклики в очередь. Пары (резюме, вакансия) уже в очереди пропускаются.
+
+        С skip_near_duplicates пропускаются и почти-дубликаты: перепосты
+        вакансии, на которую пользователь уже откликался или которая
+        стоит в очереди, а также повторы внутри пачки.
+        queued_ids — вакансии, которые действительно встали в очередь.
+        """
+        unique_ids = list(dict.fromkeys(str(vacancy_id) for vacancy_id in vacancy_ids))
+        clusters = self._applied_clusters(user_id, unique_ids) if skip_near_duplicates else {}
+        taken = set()
+        queued_ids: List[str] = []
+        near_duplicates = 0
+        for vacancy_id in unique_ids:
+            if vacancy_id in clusters:
+                cluster_id = clusters[vacancy_id]
+                if cluster_id is None or cluster_id in taken:
+                    near_duplicates += 1
+                    continue
+                taken.add(cluster_id)
+            result = self.db.execute(
+                text("""
+                INSERT INTO apply_queue (user_id, resume_id, vacancy_id, message, status, attempts)
+                VALUES (:user_id, :resume_id, :vacancy_id, :message, 'pending', 0)
+                ON CONFLICT (resume_id, vacancy_id) DO NOTHING
+                RETURNING id
+                """),
+                {"user_id": user_id, "resume_id": resume_id, "vacancy_id": vacancy_id, "message": message}
+            )
+            if result.fetchone():
+                queued_ids.append(vacancy_id)
+        self.db.commit()
+        return {
+            "queued": len(queued_ids),
+            "duplicates": len(vacancy_ids) - len(queued_ids) - near_duplicates,
+            "near_duplicates": near_duplicates,
+            "queued_ids": queued_ids,
+        }
+
+    def claim_batch(self, limit: int, daily_limit: int) -> List[Dict[str, Any]]:
+        """Атомарно забрать пачку pending-записей в работу.
+
+        SKIP LOCKED позволяет нескольким воркерам работать параллельно, а
+        пользователи, исчерпавшие дневной лимит HH, в выборку не попадают.
+        """
+        rows = self.db.execute(
+            text("""
+            UPDATE apply_queue
+            SET status = 'in_progress', locked_at = NOW(), attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM apply_queue
+                WHERE status = 'pending'
+                  AND next_attempt_at <= NOW()
+                  AND user_id NOT IN (
+                      SELECT user_id FROM apply_queue
+                      WHERE status = 'done' AND applied_at >= date_trunc('day', NOW())
+                      GROUP BY user_id
+                      HAVING COUNT(*) >= :daily_limit
+                  )
+                ORDER BY next_attempt_at, id
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, user_id, resume_id, vacancy_id, message, attempts
+            """),
+            {"limit": limit, "daily_limit": daily_limit}
+        ).mappings().fetchall()
+        self.db.commit()
+        return [dict(row) for row in rows]
+
+    def mark_done(self, item_id: int, negotiation_id: Optional[str] = None) -> None:
+        self.db.execute(
+            text("""
+            UPDATE apply_queue
+            SET status = 'done', negotiation_id = :negotiation_id, applied_at = NOW(), locked_at = NULL, last_error = NULL
+            WHERE id = :id
+            """),
+            {"id": item_id, "negotiation_id": negotiation_id}
+        )
+        self.db.commit()
+
+    def mark_failed(self, item_id: int, error: str) -> None:
+        self.db.execute(
+            text("UPDATE apply_queue SET status = 'failed', last_error = :error, locked_at = NULL WHERE id = :id"),
+            {"id": item_id, "error": error[:1000]}
+        )
+        self.db.commit()
+
+    def mark_verify(self, item_id: int, error: str) -> None:
+        """Исход отправки неизвестен: перед повтором запись сверяется со списком откликов."""
+        self.db.execute(
+            text("UPDATE apply_queue SET status = 'verify', last_error = :error WHERE id = :id"),
+            {"id": item_id, "error": error[:1000]}
+        )
+        self.db.commit()
+
+    def release(self, item_id: int, delay_seconds: float, error: Optional[str] = None, count_attempt: bool = True) -> None:
+        """Вернуть запись в pending с отложенной следующей попыткой."""
+        self.db.execute(
+            text("""
+            UPDATE apply_queue
+            SET status = 'pending', locked_at = NULL, last_error = COALESCE(:error, last_error),
+                attempts = attempts - :refund, next_attempt_at = :next_attempt_at
+            WHERE id = :id
+            """),
+            {
+                "id": item_id,
+                "error": error[:1000] if error else None,
+                "refund": 0 if count_attempt else 1,
+                "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+            }
+        )
+        self.db.commit()
+
+    def take_stale(self, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Записи, зависшие в in_progress (воркер упал посреди отправки), и записи в verify.
+
+        Их нельзя просто повторить: POST мог дойти до HH. Статус 'verify'
+        означает, что перед повтором нужно сверить их со списком откликов.
+        """
+        rows = self.db.execute(
+            text("""
+            UPDATE apply_queue SET status = 'verify'
+            WHERE status = 'verify'
+               OR (status = 'in_progress' AND locked_at < NOW() - make_interval(secs => :lease))
+            RETURNING id, user_id, resume_id, vacancy_id, attempts, last_error, locked_at
+            """),
+            {"lease": lease_seconds}
+        ).mappings().fetchall()
+        self.db.commit()
+        return [dict(row) for row in rows]
+
+    def get_stats(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Счётчики по статусам и пропускная способность за последний час."""
+        params = {"user_id": user_id}
+        user_filter = "WHERE user_id = :user_id" if user_id is not None else ""
+
+        by_status = {
+            status: count for status, count in self.db.execute(
+                text(f"SELECT status, COUNT(*) FROM apply_queue {user_filter} GROUP BY status"),
+                params
+            ).fetchall()
+        }
+
+        user_and = "AND user_id = :user_id" if user_id is not None else ""
+        applied_last_hour, applied_last_10m = self.db.execute(
+            text(f"""
+            SELECT
+                COUNT(*) FILTER (WHERE applied_at >= NOW() - INTERVAL '1 hour'),
+                COUNT(*) FILTER (WHERE applied_at >= NOW() - INTERVAL '10 minutes')
+            FROM apply_queue
+            WHERE status = 'done' {user_and}
+            """),
+            params
+        ).fetchone()
+
+        per_minute = applied_last_10m / 10
+        pending = by_status.get("pending", 0) + by_status.get("in_progress", 0) + by_status.get("verify", 0)
+        return {
+            "by_status": by_status,
+            "pending": pending,
+            "applied_last_hour": applied_last_hour,
+            "applied_per_minute": round(per_minute, 2),
+            "eta_minutes": round(pending / per_minute, 1) if per_minute else None
+        }
+
+
+class ApplyWorker:
+    """Фоновый воркер, разбирающий apply_queue так быстро, как позволяют лимиты HH."""
+
+    def __init__(self, session_factory, limiter: Optional[RateLimiter] = None):
+        self.session_factory = session_factory
+        self.batch_size = int(os.getenv("APPLY_BATCH_SIZE", "20"))
+        self.poll_interval = float(os.getenv("APPLY_POLL_INTERVAL", "2"))
+        self.lease_seconds = int(os.getenv("APPLY_LEASE_SECONDS", "120"))
+        self.max_attempts = int(os.getenv("APPLY_MAX_ATTEMPTS", "5"))
+        # Пауза перед повтором, пока HH недоступен (цепь разомкнута, исчерпана квота)
+        self.unavailable_delay = float(os.getenv("APPLY_UNAVAILABLE_DELAY", "60"))
+        # Сколько страниц откликов просматривать при сверке зависших записей
+        self.verify_max_pages = int(os.getenv("APPLY_VERIFY_MAX_PAGES", "20"))
+        # HH разрешает соискателю не более 200 откликов в сутки
+        self.daily_limit = int(os.getenv("APPLY_DAILY_LIMIT", "200"))
+        self.limiter = limiter or RateLimiter(
+            global_rate=float(os.getenv("APPLY_GLOBAL_RPS", "5")),
+            global_burst=float(os.getenv("APPLY_GLOBAL_BURST", "10")),
+            user_rate=float(os.getenv("APPLY_USER_RPS", "0.5")),
+            user_burst=float(os.getenv("APPLY_USER_BURST", "3")),
+        )
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "batches": 0,
+            "processed": 0,
+            "applied": 0,
+            "failed": 0,
+            "deferred": 0,
+            "last_batch_size": 0,
+            "last_batch_seconds": 0.0,
+            "last_batch_per_second": 0.0,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        logger.info("Apply worker started")
+        while True:
+            try:
+                processed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Apply worker iteration failed: {e}")
+                processed = 0
+            if not processed:
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self) -> int:
+        """Один проход: восстановить зависшие записи и обработать одну пачку."""
+        db = self.session_factory()
+        try:
+            queue = ApplyQueueService(db)
+            stale = queue.take_stale(self.lease_seconds)
+            if stale:
+                await self._verify_stale(queue, db, stale)
+
+            items = queue.claim_batch(self.batch_size, self.daily_limit)
+            if not items:
+                return 0
+
+            started = time.monotonic()
+            tokens: Dict[int, Optional[str]] = {}
+            for item in items:
+                if item["user_id"] not in tokens:
+                    tokens[item["user_id"]] = await TokenService(db).get_valid_token(item["user_id"])
+
+            results = await asyncio.gather(
+                *(self._apply(item, tokens[item["user_id"]]) for item in items)
+            )
+            for item, (outcome, payload) in zip(items, results):
+                self._record(queue, item, outcome, payload)
+
+            elapsed = time.monotonic() - started
+            self.stats["batches"] += 1
+            self.stats["processed"] += len(items)
+            self.stats["last_batch_size"] = len(items)
+            self.stats["last_batch_seconds"] = round(elapsed, 3)
+            self.stats["last_batch_per_second"] = round(len(items) / elapsed, 2) if elapsed else 0.0
+            logger.info(f"Apply batch: {len(items)} items in {elapsed:.2f}s")
+            return len(items)
+        finally:
+            db.close()
+
+    async def _apply(self, item: Dict[str, Any], token: Optional[str]):
+        """Отправить один отклик. Возвращает (исход, данные)."""
+        if not token:
+            return "failed", "HH token expired, please re-authenticate"
+
+        wait = self.limiter.try_acquire(item["user_id"])
+        if wait:
+            return "deferred", wait
+
+        try:
+            result = await HHClient(access_token=token, lane=APPLY, user_id=item["user_id"]).apply_to_vacancy(
+                item["vacancy_id"], item["resume_id"], item["message"] or ""
+            )
+            return "done", result.get("id")
+        except HHUnavailable as e:
+            # Отказ без обращения к HH не говорит ничего о самом отклике
+            return "unavailable", str(e)
+        except httpx.HTTPStatusError as e:
+            errors = _hh_error_values(e.response)
+            if "already_applied" in errors:
+                return "done", None
+            if "limit_exceeded" in errors:
+                return "limit", None
+            if e.response.status_code >= 500:
+                return "verify", f"HTTP {e.response.status_code}"
+            if e.response.status_code == 429:
+                return "retry", f"HTTP {e.response.status_code}"
+            if PERMANENT_ERRORS.intersection(errors) or e.response.status_code in (400, 403, 404):
+                return "failed", f"HTTP {e.response.status_code}: {', '.join(filter(None, errors))}"
+            return "retry", f"HTTP {e.response.status_code}"
+        except UNSENT_ERRORS as e:
+            return "retry", f"{type(e).__name__}: {e}"
+        except httpx.HTTPError as e:
+            return "verify", f"{type(e).__name__}: {e}"
+
+    def _record(self, queue: ApplyQueueService, item: Dict[str, Any], outcome: str, payload) -> None:
+        if outcome == "done":
+            queue.mark_done(item["id"], payload)
+            self.stats["applied"] += 1
+            if payload:
+                # Новый отклик сразу попадает в статистику ответов
+                NegotiationStore(queue.db).upsert_many(item["user_id"], [{
+                    "id": payload,
+                    "state": "response",
+                    "vacancy": {"id": item["vacancy_id"]},
+                    "resume": {"id": item["resume_id"]},
+                }])
+        elif outcome == "deferred":
+            queue.release(item["id"], payload, count_attempt=False)
+            self.stats["deferred"] += 1
+        elif outcome == "unavailable":
+            # Попытка не засчитывается: иначе долгий сбой HH провалил бы всю очередь
+            queue.release(item["id"], self.unavailable_delay, payload, count_attempt=False)
+            self.stats["deferred"] += 1
+        elif outcome == "limit":
+            # Дневной лимит HH исчерпан — до начала следующих суток
+            now = datetime.now(timezone.utc)
+            tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            queue.release(item["id"], (tomorrow - now).total_seconds(), "limit_exceeded", count_attempt=False)
+            self.stats["deferred"] += 1
+        elif outcome == "verify":
+            # Повтор — только после сверки со списком откликов на следующем проходе
+            queue.mark_verify(item["id"], payload)
+            self.stats["deferred"] += 1
+        elif outcome == "retry" and item["attempts"] < self.max_attempts:
+            queue.release(item["id"], min(3600, 30 * 2 ** item["attempts"]), payload)
+        else:
+            queue.mark_failed(item["id"], payload or "max attempts exceeded")
+            self.stats["failed"] += 1
+
+    async def _verify_stale(self, queue: ApplyQueueService, db: Session, stale: List[Dict[str, Any]]) -> None:
+        """Сверить зависшие записи со списком откликов в HH, чтобы не откликнуться дважды."""
+        by_user: Dict[int, List[Dict[str, Any]]] = {}
+        for item in stale:
+            by_user.setdefault(item["user_id"], []).append(item)
+
+        for user_id, items in by_user.items():
+            token = await TokenService(db).get_valid_token(user_id)
+            if not token:
+                # Иначе запись сверялась бы на каждом проходе, пока пользователь не войдет снова
+                for item in items:
+                    self._record(queue, item, "failed", "HH token expired, please re-authenticate")
+                continue
+            try:
+                applied = await self._find_negotiations(token, user_id, items)
+            except httpx.HTTPError as e:
+                logger.warning(f"Cannot verify stale applies for user {user_id}: {e}")
+                continue
+
+            for item in items:
+                negotiation_id = applied.get(str(item["vacancy_id"]))
+                if negotiation_id:
+                    queue.mark_done(item["id"], negotiation_id)
+                else:
+                    # Отклик не дошел: обычный повтор с отсрочкой и лимитом попыток
+                    self._record(queue, item, "retry", item["last_error"] or "not found in HH negotiations")
+            logger.info(f"Verified {len(items)} stale apply items for user {user_id}")
+
+    async def _find_negotiations(self, token: str, user_id: int, items: List[Dict[str, Any]]) -> Dict[str, str]:
+        """ID откликов HH на вакансии зависших записей: vacancy_id -> negotiation_id.
+
+        Отклики идут от новых к старым, поэтому страницы листаются, пока
+        не найдены все вакансии или пока отклики не стали старше захвата
+        самой ранней записи: более старый отклик не может быть ее отправкой.
+        """
+        wanted = {str(item["vacancy_id"]) for item in items}
+        locked = [item["locked_at"] for item in items if item.get("locked_at")]
+        since = min(locked) - timedelta(seconds=self.lease_seconds) if locked else None
+        client = HHClient(access_token=token, lane=APPLY, user_id=user_id)
+        applied: Dict[str, str] = {}
+        per_page = 100
+        for page in range(self.verify_max_pages):
+            negotiations = await client.get_negotiations(page=page, per_page=per_page)
+            for negotiation in negotiations:
+                vacancy_id = str((negotiation.get("vacancy") or {}).get("id"))
+                if vacancy_id in wanted:
+                    applied[vacancy_id] = str(negotiation.get("id"))
+            if len(negotiations) < per_page or wanted <= applied.keys():
+                break
+            oldest = parse_hh_datetime(negotiations[-1].get("updated_at") or negotiations[-1].get("created_at"))
+            if since is not None and oldest is not None and oldest < since:
+                break
+        return applied
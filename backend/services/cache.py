@@ -0,0 +1,193 @@
+"""Response cache (Redis or in-process) with precomputed strong ETags."""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi import Request, Response
+from loguru import logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # без redis работает кеш в памяти процесса
+    aioredis = None
+
+# Суффиксы, которые CompressionMiddleware добавляет к ETag сжатых ответов
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнить If-None-Match с ETag, игнорируя суффикс кодировки"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for suffix in ENCODING_SUFFIXES:
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[:-len(suffix) - 1] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+    stored_at: float
+    expires_at: float
+
+    def encode(self) -> bytes:
+        return f"{self.etag}|{self.stored_at}|{self.expires_at}\n".encode() + self.body
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "CacheEntry":
+        header, _, body = raw.partition(b"\n")
+        etag, stored_at, expires_at = header.decode().split("|")
+        return cls(body=body, etag=etag, stored_at=float(stored_at), expires_at=float(expires_at))
+
+
+class Cache:
+    """Кеш сериализованных ответов.
+
+    ETag считается один раз при записи и хранится вместе с телом, поэтому
+    ответ 304 не требует ни повторного запроса к HH, ни сериализации.
+    Истекшие записи хранятся еще stale_grace секунд: ими отвечают, пока HH
+    недоступен (get(..., allow_stale=True)).
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        max_entries: int = 10000,
+        prefix: str = "jhp:",
+        stale_grace: int = int(os.getenv("CACHE_STALE_GRACE", "86400"))
+    ):
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.stale_grace = stale_grace
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.redis = aioredis.from_url(url) if url and aioredis is not None else None
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    async def get(self, key: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+        entry = None
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.prefix + key)
+                entry = CacheEntry.decode(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Redis get failed, treating as miss: {e}")
+        else:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+
+        deadline = entry.expires_at + (self.stale_grace if allow_stale else 0) if entry else 0
+        if entry is None or deadline <= time.time():
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry
+
+    async def get_many(self, keys: List[str]) -> List[Optional[CacheEntry]]:
+        """Пакетное чтение (MGET в Redis) — одна сетевая операция на страницу"""
+        if not keys:
+            return []
+        if self.redis is None:
+            return [await self.get(key) for key in keys]
+        try:
+            raws = await self.redis.mget([self.prefix + key for key in keys])
+        except Exception as e:
+            logger.warning(f"Redis mget failed, treating as miss: {e}")
+            raws = [None] * len(keys)
+        now = time.time()
+        entries = []
+        for raw in raws:
+            entry = CacheEntry.decode(raw) if raw else None
+            if entry is None or entry.expires_at <= now:
+                self.stats["misses"] += 1
+                entries.append(None)
+            else:
+                self.stats["hits"] += 1
+                entries.append(entry)
+        return entries
+
+    async def set(self, key: str, body: bytes, ttl: int) -> CacheEntry:
+        now = time.time()
+        entry = CacheEntry(body=body, etag=make_etag(body), stored_at=now, expires_at=now + ttl)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + key, entry.encode(), ex=max(1, int(ttl + self.stale_grace)))
+            except Exception as e:
+                logger.warning(f"Redis set failed: {e}")
+        else:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return entry
+
+    async def set_many(self, items: Dict[str, bytes], ttl: int) -> None:
+        """Пакетная запись одним pipeline в Redis"""
+        if self.redis is None:
+            for key, body in items.items():
+                await self.set(key, body, ttl)
+            return
+        now = time.time()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, body in items.items():
+                    entry = CacheEntry(body=body, etag=make_etag(body), stored_at=now, expires_at=now + ttl)
+                    pipe.set(self.prefix + key, entry.encode(), ex=max(1, int(ttl + self.stale_grace)))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis pipeline set failed: {e}")
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.close()
+
+
+def cache_key(*parts) -> str:
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def mark_stale(entry: CacheEntry) -> CacheEntry:
+    """Копия записи с пометкой stale: true в теле JSON-объекта"""
+    body = entry.body
+    if body.startswith(b"{"):
+        body = orjson.dumps({**orjson.loads(body), "stale": True})
+    return CacheEntry(body=body, etag=make_etag(body), stored_at=entry.stored_at, expires_at=entry.expires_at)
+
+
+def cached_response(
+    request: Request,
+    entry: CacheEntry,
+    cache_control: str,
+    vary: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Ответ из записи кеша: 304 при совпадении If-None-Match, иначе тело как есть"""
+    response_headers = {"ETag": entry.etag, "Cache-Control": cache_control, **(headers or {})}
+    if vary:
+        response_headers["Vary"] = vary
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=response_headers)
+    return Response(entry.body, media_type="application/json", headers=response_headers)
+
+
+cache = Cache(os.getenv("REDIS_URL"))
@@ -0,0 +1,109 @@
+"""Circuit breakers for upstream endpoint groups."""
+
+import time
+from typing import Any, Dict
+
+
+class CircuitOpenError(Exception):
+    """Цепь разомкнута: вызов отклонен без обращения к upstream."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Классический автомат closed → open → half_open.
+
+    После failure_threshold ошибок подряд цепь размыкается на
+    recovery_timeout секунд: вызовы отклоняются сразу, не занимая
+    воркер ожиданием таймаута. Затем в состоянии half_open пропускается
+    не больше half_open_max_calls пробных вызовов: успех замыкает цепь,
+    ошибка снова размыкает ее.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_started_at = 0.0
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self) -> None:
+        """Разрешить вызов или выбросить CircuitOpenError"""
+        if self.state == self.OPEN:
+            retry_after = self.opened_at + self.recovery_timeout - time.monotonic()
+            if retry_after > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, retry_after)
+            self.state = self.HALF_OPEN
+            self.probes = 0
+        if self.state == self.HALF_OPEN:
+            # Пробный вызов, не вернувший результат (например, отмененный),
+            # не должен блокировать цепь навсегда
+            now = time.monotonic()
+            if self.probes >= self.half_open_max_calls and now - self.probe_started_at < self.recovery_timeout:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout)
+            if self.probes >= self.half_open_max_calls:
+                self.probes = 0
+            self.probes += 1
+            self.probe_started_at = now
+        self.stats["calls"] += 1
+
+    def cancel_call(self) -> None:
+        """Разрешенный вызов так и не ушел в upstream (очередь, бюджет): вернуть пробный слот"""
+        if self.state == self.HALF_OPEN and self.probes:
+            self.probes -= 1
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probes = 0
+
+    def record_failure(self) -> None:
+        self.stats["failures"] += 1
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats["opened"] += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
+
+
+class BreakerRegistry:
+    """Один автомат на группу эндпоинтов, создаются по первому обращению."""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **self.defaults)
+            self.breakers[name] = breaker
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
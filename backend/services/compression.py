@@ -0,0 +1,130 @@
+"""ASGI middleware negotiating brotli or gzip compression for JSON responses."""
+
+import gzip
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него остается gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/x-ndjson")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Выбрать br или gzip по Accept-Encoding с учетом q-значений"""
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda name: offered.get(name, offered.get("*", 0.0)))
+    return best if offered.get(best, offered.get("*", 0.0)) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # Уровень 4 — быстрее gzip-6 и сжимает JSON лучше
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _suffix_etag(headers: List[Tuple[bytes, bytes]], encoding: str) -> List[Tuple[bytes, bytes]]:
+    """Сильный ETag различается для разных кодировок: "abc" становится "abc-br" """
+    result = []
+    for key, value in headers:
+        if key.lower() == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+            value = value[:-1] + b"-" + encoding.encode() + b'"'
+        result.append((key, value))
+    return result
+
+
+def _vary_accept_encoding(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Vary ответа с добавленным Accept-Encoding (одним заголовком)"""
+    vary = [v for k, v in headers if k.lower() == b"vary"]
+    return [(k, v) for k, v in headers if k.lower() != b"vary"] + [(b"vary", b", ".join(vary + [b"Accept-Encoding"]))]
+
+
+class CompressionMiddleware:
+    """Сжатие ответов целиком (br/gzip).
+
+    Потоковые ответы (несколько body-сообщений) пропускаются без сжатия,
+    чтобы не буферизовать выгрузки в памяти воркера.
+    """
+
+    def __init__(self, app, minimum_size: int = 512):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict((k.lower(), v) for k, v in scope.get("headers", []))
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[dict] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if start_message["status"] == 304:
+                # 304 несет тот же ETag и Vary, что и сжатый ответ 200: иначе общий кеш
+                # может обновить по нему запись с другой кодировкой
+                headers_304 = _vary_accept_encoding(_suffix_etag(start_message.get("headers", []), encoding))
+                await send({**start_message, "headers": headers_304})
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Потоковый ответ — отдаем как есть
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers: List[Tuple[bytes, bytes]] = list(start_message.get("headers", []))
+            content_type = next((v for k, v in response_headers if k.lower() == b"content-type"), b"").decode("latin-1")
+            already_encoded = any(k.lower() == b"content-encoding" for k, _ in response_headers)
+            if (
+                len(body) < self.minimum_size
+                or already_encoded
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            response_headers = [
+                (k, v) for k, v in _vary_accept_encoding(_suffix_etag(response_headers, encoding))
+                if k.lower() != b"content-length"
+            ]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,122 @@
+"""Currency rates from HH dictionaries and batch salary normalization."""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from services.hh_client import HHClient
+from services.scheduler import MONITORING
+
+# Запасные курсы (единиц валюты за 1 рубль), пока справочник HH не загружен
+DEFAULT_RATES = {
+    "RUR": 1.0,
+    "USD": 0.011,
+    "EUR": 0.0102,
+    "KZT": 5.3,
+    "UAH": 0.45,
+    "BYR": 0.035,
+    "UZS": 140.0,
+    "AZN": 0.019,
+    "GEL": 0.03,
+    "KGS": 0.97,
+}
+
+# НДФЛ для перевода gross в net
+NDFL_RATE = float(os.getenv("SALARY_NDFL_RATE", "0.13"))
+
+# Перевод в месячную сумму по salary_range.mode
+MODE_MULTIPLIERS = {"MONTH": 1.0, "HOUR": 164.0, "SHIFT": 21.0, "FLY": 1.0}
+
+
+class CurrencyRates:
+    """Курсы валют из /dictionaries HH с фоновым обновлением."""
+
+    def __init__(self, refresh_interval: int = 6 * 3600):
+        self.refresh_interval = refresh_interval
+        self.rates: Dict[str, float] = dict(DEFAULT_RATES)
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        dictionaries = await HHClient(lane=MONITORING).get_dictionaries()
+        rates = {
+            currency["code"]: float(currency["rate"])
+            for currency in dictionaries.get("currency", [])
+            if currency.get("code") and currency.get("rate")
+        }
+        if rates:
+            self.rates = {**DEFAULT_RATES, **rates}
+            self.loaded_at = time.time()
+            logger.info(f"Loaded {len(rates)} currency rates from HH dictionaries")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+                delay = self.refresh_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Currency rates refresh failed, keeping previous rates: {e}")
+                delay = 300
+            await asyncio.sleep(delay)
+
+    def to_rub(self, amount: Optional[float], currency: Optional[str]) -> Optional[float]:
+        rate = self.rates.get(currency or "RUR")
+        if not amount or not rate:
+            return None
+        return amount / rate
+
+    def normalize(self, salaries: List[Optional[Dict[str, Any]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Привести пачку зарплат HH к месячному net в рублях.
+
+        Принимает объекты salary или salary_range. Возвращает массивы
+        (from, to, value), где value — середина вилки или единственная
+        граница открытого диапазона; NaN там, где зарплата не указана или
+        валюта неизвестна.
+        """
+        present = [salary or {} for salary in salaries]
+        rates = self.rates
+        # None превращается в NaN при приведении к float
+        lower = np.array([salary.get("from") or None for salary in present], dtype=np.float64)
+        upper = np.array([salary.get("to") or None for salary in present], dtype=np.float64)
+        rate = np.array([
+            rates.get(salary.get("currency") or "RUR") if salary else None for salary in present
+        ], dtype=np.float64)
+        gross = np.array([bool(salary.get("gross")) for salary in present], dtype=bool)
+        multiplier = np.array([
+            MODE_MULTIPLIERS.get((salary.get("mode") or {}).get("id"), 1.0) for salary in present
+        ], dtype=np.float64)
+
+        factor = np.where(gross, 1.0 - NDFL_RATE, 1.0) * multiplier / rate
+        lower *= factor
+        upper *= factor
+        value = np.where(
+            np.isnan(lower), upper,
+            np.where(np.isnan(upper), lower, (lower + upper) / 2)
+        )
+        return lower, upper, value
+
+
+def as_int(value: float) -> Optional[int]:
+    return None if np.isnan(value) else int(round(value))
+
+
+currency_rates = CurrencyRates()
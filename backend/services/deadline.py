@@ -0,0 +1,101 @@
+"""Per-request latency budgets propagated through context variables."""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+DEFAULT_BUDGET = float(os.getenv("REQUEST_BUDGET", "5"))
+
+# Бюджеты по префиксу пути; None — без ограничения (потоковые выгрузки)
+ROUTE_BUDGETS: Dict[str, Optional[float]] = {
+    "/vacancies/search": float(os.getenv("SEARCH_BUDGET", "3")),
+    "/vacancies/export": None,
+    "/resumes/mine": 8.0,
+    "/auth/": 10.0,
+    "/admin/": None,
+}
+
+# Клиент может сообщить, сколько он готов ждать
+CLIENT_TIMEOUT_HEADER = b"x-request-timeout"
+
+
+class DeadlineExceeded(Exception):
+    """Бюджет запроса исчерпан — дальнейшая работа клиенту уже не нужна."""
+
+
+class Deadline:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, what: str = "operation") -> float:
+        """Оставшийся бюджет; DeadlineExceeded, если он исчерпан"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.budget:.1f}s exceeded before {what}")
+        return remaining
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def remaining_budget(default: float) -> float:
+    """Сколько осталось от бюджета запроса; default вне запроса"""
+    deadline = _current.get()
+    return default if deadline is None else min(default, deadline.remaining())
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def clear_deadline() -> None:
+    """Фоновые задачи не наследуют бюджет запроса, который их запустил"""
+    _current.set(None)
+
+
+def route_budget(path: str) -> Optional[float]:
+    for prefix, budget in ROUTE_BUDGETS.items():
+        if path.startswith(prefix):
+            return budget
+    return DEFAULT_BUDGET
+
+
+class DeadlineMiddleware:
+    """Выставляет бюджет на входе: по маршруту, но не больше X-Request-Timeout клиента."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = route_budget(scope["path"])
+        for key, value in scope.get("headers", []):
+            if key.lower() == CLIENT_TIMEOUT_HEADER:
+                try:
+                    client_budget = float(value)
+                except ValueError:
+                    break
+                if client_budget > 0:
+                    budget = client_budget if budget is None else min(budget, client_budget)
+                break
+
+        with deadline_scope(Deadline(budget) if budget is not None else None):
+            await self.app(scope, receive, send)
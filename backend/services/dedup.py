@@ -0,0 +1,241 @@
+"""Near-duplicate vacancy detection: MinHash signatures over text shingles and an LSH index."""
+
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Сигнатуры хранятся в БД: число перестановок и seed менять только вместе с пересчетом
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+
+# Оценка сходства Жаккара, начиная с которой вакансии считаются одной
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))
+# Короткий текст (одно название) не говорит о дубликате: одинаковые названия у разных вакансий — норма
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "8"))
+# Сколько последних вакансий держать в индексе процесса
+DEDUP_INDEX_SIZE = int(os.getenv("DEDUP_INDEX_SIZE", "200000"))
+# Сигнатуры считаются пачками: промежуточная матрица — batch * shingles * NUM_PERM * 8 байт
+DEDUP_BATCH_SIZE = int(os.getenv("DEDUP_BATCH_SIZE", "500"))
+
+_rng = np.random.RandomState(20240115)
+# Множители перестановок (multiply-shift) и слов внутри шингла
+_A = _rng.randint(1, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_K = _rng.randint(1, 1 << 63, size=SHINGLE_SIZE, dtype=np.uint64) | np.uint64(1)
+_SHIFT = np.uint64(32)
+
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"\w+")
+
+
+def vacancy_text(item: Dict[str, Any]) -> str:
+    """Текст вакансии для сравнения: название, сниппет и описание, если оно есть"""
+    snippet = item.get("snippet") or {}
+    parts = [item.get("name"), snippet.get("requirement"), snippet.get("responsibility"), item.get("description")]
+    return _TAG.sub(" ", " ".join(part for part in parts if part))
+
+
+def _word_hashes(text: str) -> List[int]:
+    return [zlib.crc32(word.encode()) for word in _WORD.findall(text.lower())]
+
+
+def _shingles(lengths: np.ndarray, words: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Хеши словесных шинглов пачки текстов и номер текста каждого шингла.
+
+    Шингл — SHINGLE_SIZE слов подряд внутри одного текста; у текста
+    короче SHINGLE_SIZE слов единственный шингл из всех его слов.
+    """
+    total = len(words)
+    doc = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(total) - (np.cumsum(lengths) - lengths)[doc]
+    remaining = lengths[doc] - position
+    padded = np.concatenate([words, np.zeros(SHINGLE_SIZE - 1, dtype=np.uint64)])
+    hashes = np.zeros(total, dtype=np.uint64)
+    for k in range(SHINGLE_SIZE):
+        hashes ^= np.where(remaining > k, padded[k:k + total] * _K[k], np.uint64(0))
+    starts = (remaining >= SHINGLE_SIZE) | ((position == 0) & (remaining < SHINGLE_SIZE))
+    return hashes[starts], doc[starts]
+
+
+def minhash_many(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Сигнатуры (len(texts), NUM_PERM) uint32 и маска текстов не короче DEDUP_MIN_WORDS слов.
+
+    Слова хешируются в Python, все остальное — векторно на пачку текстов:
+    шинглы, NUM_PERM перестановок multiply-shift и минимум по шинглам
+    каждого текста одним minimum.reduceat.
+    """
+    signatures = np.full((len(texts), NUM_PERM), 0xFFFFFFFF, dtype=np.uint32)
+    valid = np.zeros(len(texts), dtype=bool)
+    for start in range(0, len(texts), DEDUP_BATCH_SIZE):
+        batch = [_word_hashes(text) for text in texts[start:start + DEDUP_BATCH_SIZE]]
+        lengths = np.fromiter((len(words) for words in batch), dtype=np.int64, count=len(batch))
+        if not (lengths >= DEDUP_MIN_WORDS).any():
+            continue
+        hashes, doc = _shingles(lengths, np.fromiter(chain.from_iterable(batch), dtype=np.uint64, count=int(lengths.sum())))
+        counts = np.bincount(doc, minlength=len(batch))
+        present = np.flatnonzero(counts)
+        offsets = (np.cumsum(counts) - counts)[present]
+        permuted = (hashes[:, None] * _A + _B) >> _SHIFT
+        signatures[present + start] = np.minimum.reduceat(permuted, offsets, axis=0).astype(np.uint32)
+        valid[present + start] = lengths[present] >= DEDUP_MIN_WORDS
+    return signatures, valid
+
+
+def _band_keys(signature: np.ndarray) -> List[bytes]:
+    return [signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes() for band in range(LSH_BANDS)]
+
+
+class DuplicateIndex:
+    """LSH-индекс MinHash-сигнатур последних вакансий процесса.
+
+    Сигнатура делится на LSH_BANDS полос по LSH_ROWS значений; вакансии
+    с хотя бы одной совпавшей полосой — кандидаты, дубликатом считается
+    кандидат с оценкой сходства не ниже threshold. Кластер дубликатов
+    называется по первой попавшей в индекс вакансии: этот cluster_id
+    пишется в таблицу vacancies и переживает перезапуск. Индекс
+    пополняется при сохранении вакансий, самые старые вытесняются
+    после capacity.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, capacity: int = DEDUP_INDEX_SIZE):
+        self.threshold = threshold
+        self.capacity = capacity
+        self._signatures: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._clusters: Dict[str, str] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(LSH_BANDS)]
+        # Вакансии сохраняются из пула потоков
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _match(self, signature: np.ndarray, exclude: Optional[str] = None) -> Optional[str]:
+        candidates: Set[str] = set()
+        for bucket, key in zip(self._buckets, _band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        candidates.discard(exclude)
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return self._clusters[best] if best is not None else None
+
+    def _insert(self, vacancy_id: str, signature: np.ndarray, cluster_id: str) -> None:
+        for bucket, key in zip(self._buckets, _band_keys(signature)):
+            bucket.setdefault(key, []).append(vacancy_id)
+        self._signatures[vacancy_id] = signature
+        self._clusters[vacancy_id] = cluster_id
+        while len(self._signatures) > self.capacity:
+            self._remove(next(iter(self._signatures)))
+
+    def _remove(self, vacancy_id: str) -> None:
+        signature = self._signatures.pop(vacancy_id)
+        self._clusters.pop(vacancy_id, None)
+        for bucket, key in zip(self._buckets, _band_keys(signature)):
+            members = bucket.get(key)
+            if members is not None:
+                members.remove(vacancy_id)
+                if not members:
+                    del bucket[key]
+
+    def add_many(self, ids: List[str], signatures: np.ndarray, valid: np.ndarray) -> Dict[str, str]:
+        """Добавить вакансии в индекс; cluster_id каждой (без сигнатуры — None)"""
+        clusters: Dict[str, Optional[str]] = {}
+        with self._lock:
+            for vacancy_id, signature, ok in zip(ids, signatures, valid):
+                if not ok:
+                    clusters[vacancy_id] = None
+                    continue
+                known = self._signatures.get(vacancy_id)
+                if known is not None:
+                    if np.array_equal(known, signature):
+                        clusters[vacancy_id] = self._clusters[vacancy_id]
+                        continue
+                    # Текст изменился — вакансия заново ищет свой кластер
+                    self._remove(vacancy_id)
+                cluster_id = self._match(signature, exclude=vacancy_id) or vacancy_id
+                self._insert(vacancy_id, signature, cluster_id)
+                clusters[vacancy_id] = cluster_id
+        return clusters
+
+    def load(self, rows: Iterable[Tuple[str, bytes, Optional[str]]]) -> int:
+        """Восстановить индекс из таблицы: (id, minhash, cluster_id), от старых к новым"""
+        loaded = 0
+        with self._lock:
+            for vacancy_id, packed, cluster_id in rows:
+                signature = np.frombuffer(packed, dtype=np.uint32)
+                if len(signature) != NUM_PERM:
+                    continue
+                if vacancy_id in self._signatures:
+                    self._remove(vacancy_id)
+                self._insert(vacancy_id, signature, cluster_id or vacancy_id)
+                loaded += 1
+        return loaded
+
+    def assign(self, ids: List[str], signatures: np.ndarray, valid: np.ndarray) -> List[Optional[str]]:
+        """Кластеры для вакансий без добавления в индекс"""
+        clusters: List[Optional[str]] = []
+        with self._lock:
+            for vacancy_id, signature, ok in zip(ids, signatures, valid):
+                known = self._clusters.get(vacancy_id)
+                if known is not None:
+                    clusters.append(known)
+                elif ok:
+                    clusters.append(self._match(signature) or vacancy_id)
+                else:
+                    clusters.append(vacancy_id)
+        return clusters
+
+    def collapse(self, vacancies: List[Dict[str, Any]], seen: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """Оставить по одной вакансии из каждого кластера, в порядке выдачи.
+
+        Оставшаяся получает список duplicates с ID свернутых. Вакансии,
+        которых еще нет в индексе, сравниваются между собой попарно.
+        seen — кластеры, уже выданные раньше (для выгрузки по частям).
+        """
+        if not vacancies:
+            return vacancies
+        ids = [str(vacancy.get("id")) for vacancy in vacancies]
+        signatures, valid = minhash_many([vacancy_text(vacancy) for vacancy in vacancies])
+        clusters = self.assign(ids, signatures, valid)
+        similar = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2) >= self.threshold
+        similar &= valid[:, None] & valid[None, :]
+
+        seen = seen if seen is not None else set()
+        representatives: List[int] = []
+        duplicates: Dict[int, List[str]] = {}
+        for i, vacancy in enumerate(vacancies):
+            if clusters[i] in seen:
+                continue
+            original = next((j for j in representatives if clusters[j] == clusters[i] or similar[i, j]), None)
+            if original is not None:
+                duplicates.setdefault(original, []).extend([ids[i], *vacancy.get("duplicates", ())])
+                continue
+            representatives.append(i)
+
+        kept = []
+        for i in representatives:
+            seen.add(clusters[i])
+            vacancy = vacancies[i]
+            # Копия: те же словари уходят в хранилище вакансий
+            if i in duplicates:
+                vacancy = {**vacancy, "duplicates": [*vacancy.get("duplicates", ()), *duplicates[i]]}
+            kept.append(vacancy)
+        return kept
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            clusters = len(set(self._clusters.values()))
+            return {"vacancies": len(self._signatures), "clusters": clusters, "duplicates": len(self._signatures) - clusters}
+
+
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,261 @@
+"""Employer details fetched from HH in bulk and kept in a long-TTL cache and table."""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import orjson
+from loguru import logger
+from sqlalchemy import JSON, DateTime, bindparam, text
+from starlette.concurrency import run_in_threadpool
+
+from services.cache import Cache
+from services.deadline import clear_deadline
+from services.hh_client import HHClient
+
+# Данные работодателя меняются редко: неделя в кеше и в таблице
+EMPLOYER_TTL = int(os.getenv("EMPLOYER_TTL", str(7 * 86400)))
+EMPLOYER_FETCH_CONCURRENCY = int(os.getenv("EMPLOYER_FETCH_CONCURRENCY", "8"))
+# Неудачная загрузка (404, сбой HH, разомкнутая цепь) помнится недолго, чтобы не повторять ее на каждой странице
+EMPLOYER_MISS_TTL = int(os.getenv("EMPLOYER_MISS_TTL", "120"))
+# Метка неудачной загрузки в кеше
+_MISS = b"null"
+
+
+def employer_ids(vacancies: Iterable[Dict[str, Any]]) -> List[str]:
+    """Уникальные ID работодателей выдачи в порядке появления"""
+    seen: Dict[str, None] = {}
+    for vacancy in vacancies:
+        employer_id = (vacancy.get("employer") or {}).get("id")
+        if employer_id:
+            seen.setdefault(str(employer_id), None)
+    return list(seen)
+
+
+def employer_row(detail: Dict[str, Any]) -> Dict[str, Any]:
+    """Компактная запись о работодателе из ответа HH /employers/{id}"""
+    return {
+        "id": str(detail["id"]),
+        "name": (detail.get("name") or "")[:512] or None,
+        "type": detail.get("type"),
+        "trusted": detail.get("trusted"),
+        "accredited_it": detail.get("accredited_it_employer"),
+        "area_id": str((detail.get("area") or {}).get("id") or "") or None,
+        "industries": [{"id": str(i["id"]), "name": i.get("name")} for i in detail.get("industries") or [] if i.get("id")],
+        "open_vacancies": detail.get("open_vacancies"),
+        "site_url": (detail.get("site_url") or "")[:512] or None,
+    }
+
+
+def _industry_matches(employer: Dict[str, Any], industry: str) -> bool:
+    """Отрасль работодателя совпадает с industry или вложена в нее ("7" включает "7.540")"""
+    return any(
+        item["id"] == industry or item["id"].startswith(industry + ".")
+        for item in employer.get("industries") or []
+    )
+
+
+def filter_vacancies(
+    vacancies: List[Dict[str, Any]],
+    employers: Dict[str, Dict[str, Any]],
+    trusted_only: bool = False,
+    industry: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Фильтр по деталям работодателя.
+
+    Вакансия без работодателя (анонимная) фильтр не проходит. Вакансия,
+    чьего работодателя не удалось загрузить, остается непроверенной (см.
+    unchecked_count): иначе сбой HH молча опустошал бы выдачу.
+    """
+    if not trusted_only and not industry:
+        return vacancies
+    kept = []
+    for vacancy in vacancies:
+        employer_id = (vacancy.get("employer") or {}).get("id")
+        if not employer_id:
+            continue
+        employer = employers.get(str(employer_id))
+        if employer is None:
+            kept.append(vacancy)
+            continue
+        if trusted_only and not employer.get("trusted"):
+            continue
+        if industry and not _industry_matches(employer, industry):
+            continue
+        kept.append(vacancy)
+    return kept
+
+
+def unchecked_count(vacancies: List[Dict[str, Any]], employers: Dict[str, Dict[str, Any]]) -> int:
+    """Сколько вакансий с работодателем осталось без его деталей"""
+    return sum(
+        1 for employer_id in ((vacancy.get("employer") or {}).get("id") for vacancy in vacancies)
+        if employer_id and str(employer_id) not in employers
+    )
+
+
+def attach_employers(vacancies: List[Dict[str, Any]], employers: Dict[str, Dict[str, Any]]) -> None:
+    """Дополнить заглушку employer в выдаче отраслями, типом и числом вакансий"""
+    for vacancy in vacancies:
+        stub = vacancy.get("employer")
+        details = employers.get(str(stub.get("id"))) if stub else None
+        if details is not None:
+            stub["type"] = details.get("type")
+            stub["industries"] = details.get("industries") or []
+            stub["open_vacancies"] = details.get("open_vacancies")
+
+
+class EmployerDirectory:
+    """Справочник работодателей для ранжирования, фильтров и аналитики.
+
+    get_many принимает все ID страницы (или выгрузки) сразу: один MGET в
+    кеш, затем один SELECT по промахам, и только оставшиеся ID идут в HH
+    параллельно, не больше concurrency одновременно. Один и тот же
+    работодатель, запрошенный несколькими запросами сразу, загружается
+    один раз. Свежие записи пишутся в кеш и в таблицу employers, неудачные
+    загрузки — в кеш на EMPLOYER_MISS_TTL.
+    """
+
+    def __init__(
+        self, cache: Cache, session_factory, ttl: int = EMPLOYER_TTL,
+        concurrency: int = EMPLOYER_FETCH_CONCURRENCY, miss_ttl: int = EMPLOYER_MISS_TTL
+    ):
+        self.cache = cache
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.concurrency = concurrency
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes: Set[asyncio.Task] = set()
+        self.stats: Dict[str, int] = {"cache": 0, "table": 0, "hh": 0, "failed": 0, "cached_misses": 0}
+
+    async def get_many(self, hh_client: HHClient, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Детали работодателей по ID; кого не удалось загрузить, в ответе нет"""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        employers: Dict[str, Dict[str, Any]] = {}
+        failed: Set[str] = set()
+        entries = await self.cache.get_many([f"employer:{employer_id}" for employer_id in ids])
+        for employer_id, entry in zip(ids, entries):
+            if entry is None:
+                continue
+            if entry.body == _MISS:
+                failed.add(employer_id)
+            else:
+                employers[employer_id] = orjson.loads(entry.body)
+        self.stats["cache"] += len(employers)
+        self.stats["cached_misses"] += len(failed)
+
+        missing = [employer_id for employer_id in ids if employer_id not in employers and employer_id not in failed]
+        if missing:
+            stored = await run_in_threadpool(self._load, missing)
+            if stored:
+                self.stats["table"] += len(stored)
+                employers.update(stored)
+                await self.cache.set_many({f"employer:{k}": orjson.dumps(v) for k, v in stored.items()}, self.ttl)
+                missing = [employer_id for employer_id in missing if employer_id not in stored]
+        if missing:
+            employers.update(await self._fetch(hh_client, missing))
+        return employers
+
+    async def _fetch(self, hh_client: HHClient, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        owned: Dict[str, asyncio.Future] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        for employer_id in ids:
+            if employer_id in self._inflight:
+                waiting[employer_id] = self._inflight[employer_id]
+            else:
+                owned[employer_id] = self._inflight[employer_id] = loop.create_future()
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(employer_id: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return employer_row(await hh_client.get_employer(employer_id))
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.debug(f"Employer {employer_id} not loaded: {type(e).__name__}: {e}")
+                    return None
+
+        fetched: Dict[str, Dict[str, Any]] = {}
+        try:
+            rows = await asyncio.gather(*(fetch_one(employer_id) for employer_id in owned))
+            for employer_id, row in zip(owned, rows):
+                owned[employer_id].set_result(row)
+                if row is not None:
+                    fetched[employer_id] = row
+        finally:
+            for employer_id, future in owned.items():
+                if not future.done():
+                    future.set_result(None)
+                self._inflight.pop(employer_id, None)
+
+        failed = [employer_id for employer_id in owned if employer_id not in fetched]
+        if failed:
+            await self.cache.set_many({f"employer:{employer_id}": _MISS for employer_id in failed}, self.miss_ttl)
+        if fetched:
+            self.stats["hh"] += len(fetched)
+            await self.cache.set_many({f"employer:{k}": orjson.dumps(v) for k, v in fetched.items()}, self.ttl)
+            # Запись в таблицу не задерживает ответ
+            task = asyncio.create_task(run_in_threadpool(self._store, list(fetched.values())))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+        for employer_id, future in waiting.items():
+            row = await future
+            if row is not None:
+                fetched[employer_id] = row
+        return fetched
+
+    def _load(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                text("""
+                SELECT id, name, type, trusted, accredited_it, area_id, industries, open_vacancies, site_url
+                FROM employers WHERE id IN :ids AND fetched_at > :fresh_after
+                """).bindparams(bindparam("ids", expanding=True)).columns(industries=JSON),
+                {"ids": ids, "fresh_after": datetime.now(timezone.utc) - timedelta(seconds=self.ttl)}
+            ).mappings().fetchall()
+            return {row["id"]: dict(row) for row in rows}
+        finally:
+            db.close()
+
+    def _store(self, rows: List[Dict[str, Any]]) -> None:
+        clear_deadline()
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            db.execute(
+                text("""
+                INSERT INTO employers (
+                    id, name, type, trusted, accredited_it, area_id, industries, open_vacancies, site_url, fetched_at
+                ) VALUES (
+                    :id, :name, :type, :trusted, :accredited_it, :area_id, :industries, :open_vacancies, :site_url, :fetched_at
+                )
+                ON CONFLICT (id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    type = EXCLUDED.type,
+                    trusted = EXCLUDED.trusted,
+                    accredited_it = EXCLUDED.accredited_it,
+                    area_id = EXCLUDED.area_id,
+                    industries = EXCLUDED.industries,
+                    open_vacancies = EXCLUDED.open_vacancies,
+                    site_url = EXCLUDED.site_url,
+                    fetched_at = EXCLUDED.fetched_at
+                """).bindparams(bindparam("industries", type_=JSON), bindparam("fetched_at", type_=DateTime(timezone=True))),
+                [{**row, "fetched_at": now} for row in rows]
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Failed to store employers: {e}")
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "inflight": len(self._inflight)}
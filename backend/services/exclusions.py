@@ -0,0 +1,239 @@
+"""Per-user exclusion sets: hidden employers and vacancies the user already applied to."""
+
+import asyncio
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from services.deadline import clear_deadline
+
+# Как долго набор в памяти верен без перечитывания из БД (отклики из других процессов)
+EXCLUSIONS_TTL = int(os.getenv("EXCLUSIONS_TTL", "600"))
+EXCLUSIONS_MAX_USERS = int(os.getenv("EXCLUSIONS_MAX_USERS", "10000"))
+
+KINDS = ("employer", "vacancy")
+# ID HH — положительные целые; 0 значит "нет ID" и ни с чем не совпадает
+_MAX_ID = 0xFFFFFFFF
+
+
+def as_id(value: Any) -> int:
+    value = str(value or "")
+    if not value.isdigit():
+        return 0
+    number = int(value)
+    return number if number <= _MAX_ID else 0
+
+
+class IdSet:
+    """Отсортированный массив uint32: 4 байта на ID, проверка пачки ID — один searchsorted."""
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.ids = np.unique(np.fromiter((i for i in ids if i), dtype=np.uint32))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: Iterable[int]) -> bool:
+        size = len(self.ids)
+        self.ids = np.union1d(self.ids, np.fromiter((i for i in ids if i), dtype=np.uint32))
+        return len(self.ids) != size
+
+    def contains_many(self, ids: np.ndarray) -> np.ndarray:
+        if not len(self.ids):
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return self.ids[positions] == ids
+
+
+class ExclusionSet:
+    """Что скрыть из выдачи одного пользователя.
+
+    employers — скрытые работодатели; vacancies — скрытые вакансии,
+    вакансии с откликом (negotiations) и стоящие в очереди автооткликов.
+    fingerprint меняется вместе с содержимым и входит в ключ кеша поиска,
+    так что скрытая вакансия не всплывет из закешированной страницы.
+    """
+
+    __slots__ = ("employers", "vacancies", "loaded_at", "fingerprint")
+
+    def __init__(self, employers: Iterable[int] = (), vacancies: Iterable[int] = ()):
+        self.employers = IdSet(employers)
+        self.vacancies = IdSet(vacancies)
+        self.loaded_at = time.monotonic()
+        self._refresh_fingerprint()
+
+    def _refresh_fingerprint(self) -> None:
+        checksum = zlib.crc32(self.vacancies.ids.tobytes(), zlib.crc32(self.employers.ids.tobytes()))
+        self.fingerprint = f"{len(self.employers)}.{len(self.vacancies)}.{checksum:08x}"
+
+    def add(self, employers: Iterable[int] = (), vacancies: Iterable[int] = ()) -> None:
+        changed = self.employers.add(employers)
+        changed = self.vacancies.add(vacancies) or changed
+        if changed:
+            self._refresh_fingerprint()
+
+    def __bool__(self) -> bool:
+        return bool(len(self.employers) or len(self.vacancies))
+
+    def excluded_mask(self, vacancies: List[Dict[str, Any]]) -> np.ndarray:
+        """Маска вакансий, которые нужно скрыть, — для всей пачки сразу"""
+        count = len(vacancies)
+        vacancy_ids = np.fromiter((as_id(v.get("id")) for v in vacancies), dtype=np.uint32, count=count)
+        employer_ids = np.fromiter((as_id((v.get("employer") or {}).get("id")) for v in vacancies), dtype=np.uint32, count=count)
+        return self.vacancies.contains_many(vacancy_ids) | self.employers.contains_many(employer_ids)
+
+    def filter(self, vacancies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self or not vacancies:
+            return vacancies
+        mask = self.excluded_mask(vacancies)
+        if not mask.any():
+            return vacancies
+        return [vacancy for vacancy, excluded in zip(vacancies, mask.tolist()) if not excluded]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"employers": len(self.employers), "vacancies": len(self.vacancies), "bytes": self.employers.ids.nbytes + self.vacancies.ids.nbytes}
+
+
+class ExclusionStore:
+    """Скрытые пользователем работодатели и вакансии в таблице user_exclusions."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add(self, user_id: int, kind: str, target_ids: List[str]) -> None:
+        self.db.execute(
+            text("""
+            INSERT INTO user_exclusions (user_id, kind, target_id)
+            VALUES (:user_id, :kind, :target_id)
+            ON CONFLICT (user_id, kind, target_id) DO NOTHING
+            """),
+            [{"user_id": user_id, "kind": kind, "target_id": str(target_id)} for target_id in dict.fromkeys(target_ids)]
+        )
+        self.db.commit()
+
+    def remove(self, user_id: int, kind: str, target_ids: List[str]) -> int:
+        result = self.db.execute(
+            text("DELETE FROM user_exclusions WHERE user_id = :user_id AND kind = :kind AND target_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"user_id": user_id, "kind": kind, "ids": [str(target_id) for target_id in target_ids]}
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def list(self, user_id: int) -> Dict[str, List[str]]:
+        hidden: Dict[str, List[str]] = {kind: [] for kind in KINDS}
+        for kind, target_id in self.db.execute(
+            text("SELECT kind, target_id FROM user_exclusions WHERE user_id = :user_id ORDER BY created_at DESC"),
+            {"user_id": user_id}
+        ).fetchall():
+            hidden.setdefault(kind, []).append(target_id)
+        return hidden
+
+    def load(self, user_id: int) -> ExclusionSet:
+        """Все исключения пользователя одним запросом: скрытые, отклики, очередь откликов"""
+        employers, vacancies = [], []
+        for kind, target_id in self.db.execute(
+            text("""
+            SELECT kind, target_id FROM user_exclusions WHERE user_id = :user_id
+            UNION ALL
+            SELECT 'vacancy', vacancy_id FROM negotiations WHERE user_id = :user_id AND vacancy_id IS NOT NULL
+            UNION ALL
+            SELECT 'vacancy', vacancy_id FROM apply_queue WHERE user_id = :user_id AND status <> 'failed'
+            """),
+            {"user_id": user_id}
+        ):
+            (employers if kind == "employer" else vacancies).append(as_id(target_id))
+        return ExclusionSet(employers, vacancies)
+
+
+class ExclusionIndex:
+    """Наборы исключений в памяти процесса, по пользователю.
+
+    Набор загружается из БД при первом обращении пользователя (один запрос,
+    параллельные обращения ждут одну загрузку) и дальше дополняется на
+    месте: откликами из /negotiations, очередью автооткликов и скрытием
+    через /exclusions. Раз в ttl набор перечитывается целиком — так в него
+    попадают отклики, сделанные другими процессами. Хранится не больше
+    max_users наборов, давно не использованные вытесняются.
+    """
+
+    def __init__(self, session_factory, ttl: int = EXCLUSIONS_TTL, max_users: int = EXCLUSIONS_MAX_USERS):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.max_users = max_users
+        self._sets: "OrderedDict[int, ExclusionSet]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "loads": 0, "failed": 0}
+
+    async def get(self, user_id: int) -> ExclusionSet:
+        exclusions = self._sets.get(user_id)
+        if exclusions is not None and time.monotonic() - exclusions.loaded_at < self.ttl:
+            self._sets.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return exclusions
+        if user_id in self._loading:
+            return await asyncio.shield(self._loading[user_id])
+
+        future = self._loading[user_id] = asyncio.get_running_loop().create_future()
+        try:
+            exclusions = await run_in_threadpool(self._load, user_id)
+        except Exception as e:
+            self.stats["failed"] += 1
+            future.set_exception(e)
+            # Ожидающих может не быть — помечаем исключение полученным, чтобы не шуметь в лог
+            future.exception()
+            raise
+        else:
+            self.stats["loads"] += 1
+            self._sets[user_id] = exclusions
+            self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+            future.set_result(exclusions)
+            return exclusions
+        finally:
+            self._loading.pop(user_id, None)
+            if not future.done():
+                future.cancel()
+
+    def _load(self, user_id: int) -> ExclusionSet:
+        clear_deadline()
+        db = self.session_factory()
+        try:
+            return ExclusionStore(db).load(user_id)
+        finally:
+            db.close()
+
+    def note(self, user_id: int, employers: Iterable[Any] = (), vacancies: Iterable[Any] = ()) -> None:
+        """Дополнить загруженный набор; незагруженный и так прочитается из БД целиком"""
+        exclusions = self._sets.get(user_id)
+        if exclusions is not None:
+            exclusions.add([as_id(i) for i in employers], [as_id(i) for i in vacancies])
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбросить набор (после удаления исключений: вакансия может остаться исключенной из-за отклика)"""
+        self._sets.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "users": len(self._sets), "bytes": sum(s.get_stats()["bytes"] for s in self._sets.values())}
+
+
+async def load_exclusions(index: ExclusionIndex, user_id: Optional[int]) -> Optional[ExclusionSet]:
+    """Набор для выдачи; если БД недоступна, выдача не фильтруется, а не падает"""
+    if user_id is None:
+        return None
+    try:
+        return await index.get(user_id)
+    except Exception as e:
+        logger.warning(f"Exclusions for user {user_id} not loaded: {type(e).__name__}: {e}")
+        return None
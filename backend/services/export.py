@@ -0,0 +1,178 @@
+"""Streaming vacancy export: HH multi-page harvester and local store reader."""
+
+import asyncio
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from services.currency import as_int, currency_rates
+from services.hh_client import HHClient
+from services.vacancy_store import vacancy_row
+
+# HH отдает не больше 2000 вакансий на один поисковый запрос
+HH_MAX_DEPTH = 2000
+HH_PAGE_SIZE = 100
+
+# Сколько выгрузок один пользователь может вести одновременно
+EXPORT_USER_CONCURRENCY = int(os.getenv("EXPORT_USER_CONCURRENCY", "1"))
+
+EXPORT_COLUMNS = [
+    "id", "name", "employer_id", "employer_name", "area_id", "area_name",
+    "professional_role_id", "experience_id", "salary_from", "salary_to",
+    "salary_currency", "salary_gross", "salary_net_rub", "published_at", "url",
+]
+
+
+class ExportSlots:
+    """Счетчик одновременных выгрузок по пользователям: выгрузка держит воркер и квоту HH."""
+
+    def __init__(self, per_user: int = EXPORT_USER_CONCURRENCY):
+        self.per_user = per_user
+        self._active: Dict[int, int] = {}
+
+    def acquire(self, user_id: int) -> bool:
+        if self._active.get(user_id, 0) >= self.per_user:
+            return False
+        self._active[user_id] = self._active.get(user_id, 0) + 1
+        return True
+
+    def release(self, user_id: int) -> None:
+        count = self._active.get(user_id, 0) - 1
+        if count > 0:
+            self._active[user_id] = count
+        else:
+            self._active.pop(user_id, None)
+
+
+async def harvest_vacancies(
+    hh_client: HHClient,
+    filters: Dict[str, Any],
+    max_items: int = HH_MAX_DEPTH
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Выгрузить выдачу HH постранично.
+
+    Следующая страница запрашивается, пока вызывающий обрабатывает
+    текущую, поэтому в памяти одновременно не больше двух страниц.
+    """
+    limit = min(max_items, HH_MAX_DEPTH)
+
+    def fetch(page: int):
+        return asyncio.create_task(
+            hh_client.search_vacancies(**filters, page=page, per_page=HH_PAGE_SIZE)
+        )
+
+    page = 0
+    pending = fetch(page)
+    sent = 0
+    try:
+        while pending is not None:
+            data = await pending
+            pending = None
+            pages = data.get("pages", 0)
+            if page + 1 < pages and (page + 1) * HH_PAGE_SIZE < limit:
+                pending = fetch(page + 1)
+            items = data.get("items", [])[:limit - sent]
+            if not items:
+                break
+            sent += len(items)
+            yield items
+            page += 1
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def iter_local_vacancies(
+    session_factory,
+    filters: Dict[str, Any],
+    max_items: int,
+    chunk_size: int = 1000
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Прочитать вакансии из локального хранилища серверным курсором.
+
+    Строки забираются пачками по chunk_size в пуле потоков, чтобы
+    синхронный драйвер не блокировал event loop.
+    """
+    conditions = ["archived = false"]
+    params: Dict[str, Any] = {"limit": max_items}
+    for column, key in (("professional_role_id", "professional_role"), ("area_id", "area"), ("experience_id", "experience")):
+        if filters.get(key):
+            conditions.append(f"{column} = :{key}")
+            params[key] = str(filters[key])
+    if filters.get("salary_from"):
+        conditions.append("salary_net_rub >= :salary_from")
+        params["salary_from"] = filters["salary_from"]
+    if filters.get("salary_to"):
+        conditions.append("salary_net_rub <= :salary_to")
+        params["salary_to"] = filters["salary_to"]
+
+    columns = [c for c in EXPORT_COLUMNS if c != "url"]
+    db = session_factory()
+    try:
+        result = await run_in_threadpool(
+            lambda: db.execute(
+                text(f"""
+                SELECT {", ".join(columns)} FROM vacancies
+                WHERE {" AND ".join(conditions)}
+                ORDER BY published_at DESC
+                LIMIT :limit
+                """).execution_options(stream_results=True, yield_per=chunk_size),
+                params
+            )
+        )
+        while True:
+            rows = await run_in_threadpool(result.fetchmany, chunk_size)
+            if not rows:
+                break
+            yield [
+                {**dict(zip(columns, row)), "url": f"https://hh.ru/vacancy/{row[0]}"}
+                for row in rows
+            ]
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def export_row_from_hh(item: Dict[str, Any], salary_net_rub: Optional[int]) -> Dict[str, Any]:
+    row = vacancy_row(item)
+    return {
+        **{column: row.get(column) for column in EXPORT_COLUMNS},
+        "salary_net_rub": salary_net_rub,
+        "url": item.get("alternate_url") or f"https://hh.ru/vacancy/{item['id']}",
+    }
+
+
+def hh_export_rows(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    _, _, value = currency_rates.normalize([item.get("salary_range") or item.get("salary") for item in items])
+    return [export_row_from_hh(item, as_int(value[i])) for i, item in enumerate(items)]
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(rows: List[Dict[str, Any]]) -> bytes:
+    return "".join(
+        json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows
+    ).encode()
+
+
+def encode_csv(rows: List[Dict[str, Any]], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(
+        {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()} for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+export_slots = ExportSlots()
@@ -0,0 +1,170 @@
+"""Per-resume parallel vacancy search with k-way merged, deduplicated results."""
+
+import asyncio
+import base64
+import hashlib
+import heapq
+import json
+import os
+import secrets
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.cache import Cache
+from services.hh_client import HHClient
+
+# HH отдает не больше 2000 вакансий на один запрос
+HH_MAX_DEPTH = 2000
+# Сколько живут на сервере уже выданные ID поиска по курсору
+FANOUT_CURSOR_TTL = int(os.getenv("FANOUT_CURSOR_TTL", "900"))
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или выдан для другого пользователя, набора резюме или фильтров."""
+
+
+class CursorExpired(InvalidCursor):
+    """Состояние курсора на сервере истекло — поиск нужно начать заново."""
+
+
+def _search_key(streams: List[Tuple[str, List[str]]], filters: Dict[str, Any], owner: Optional[Any] = None) -> str:
+    """Отпечаток поиска: владелец, резюме с ролями и заданные фильтры.
+
+    Смещения курсора и выданные ID имеют смысл только для той же выдачи,
+    поэтому курсор с другими фильтрами отклоняется, а не листает чужие потоки.
+    """
+    parts = [
+        "" if owner is None else str(owner),
+        ";".join(f"{resume_id}:{','.join(sorted(roles))}" for resume_id, roles in streams),
+        *(f"{name}={value}" for name, value in sorted(filters.items()) if value is not None),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def encode_cursor(key: str, offsets: List[int], search_id: str) -> str:
+    """Курсор: смещения по каждому потоку и ID поиска; выданные ID хранятся на сервере"""
+    payload = json.dumps({"k": key, "o": offsets, "id": search_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key: str, n_streams: int) -> Tuple[List[int], str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        offsets = [int(o) for o in payload["o"]]
+        search_id = str(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if payload.get("k") != key or len(offsets) != n_streams:
+        raise InvalidCursor("Cursor does not match current resumes or filters")
+    return offsets, search_id
+
+
+class FanoutSearch:
+    """Один запрос к HH на каждое резюме, затем k-way merge потоков.
+
+    Потоки сливаются по позиции вакансии в выдаче HH (при равенстве — по
+    порядку резюме), дубликаты между потоками отбрасываются. Все запросы
+    страницы выполняются одним asyncio.gather, поэтому ответ занимает не
+    дольше самого медленного подзапроса. Уже выданные ID хранятся в кеше
+    под ID поиска, поэтому размер курсора не растет с глубиной.
+    """
+
+    def __init__(self, hh_client: HHClient, cache: Cache, ttl: int = FANOUT_CURSOR_TTL):
+        self.hh_client = hh_client
+        self.cache = cache
+        self.ttl = ttl
+
+    async def search(
+        self,
+        streams: List[Tuple[str, List[str]]],
+        filters: Dict[str, Any],
+        per_page: int = 20,
+        cursor: Optional[str] = None,
+        owner: Optional[Any] = None
+    ) -> Dict[str, Any]:
+        key = _search_key(streams, filters, owner)
+        if cursor:
+            offsets, search_id = decode_cursor(cursor, key, len(streams))
+            seen_list = await self._load_seen(search_id)
+        else:
+            offsets, search_id, seen_list = [0] * len(streams), secrets.token_urlsafe(9), []
+        seen = set(seen_list)
+
+        windows = await asyncio.gather(
+            *(self._fetch_window(roles, filters, offset, per_page) for (_, roles), offset in zip(streams, offsets))
+        )
+
+        # k-way merge: каждый поток уже упорядочен по позиции в выдаче HH
+        merged = heapq.merge(
+            *(self._positioned(i, offsets[i], items) for i, (items, _) in enumerate(windows)),
+            key=lambda entry: (entry[0], entry[1])
+        )
+
+        new_offsets = list(offsets)
+        page_items = []
+        for position, stream, vacancy in merged:
+            if len(page_items) >= per_page:
+                break
+            new_offsets[stream] = position + 1
+            vacancy_id = int(vacancy["id"])
+            if vacancy_id in seen:
+                continue
+            seen.add(vacancy_id)
+            seen_list.append(vacancy_id)
+            vacancy["matched_resume_id"] = streams[stream][0]
+            page_items.append(vacancy)
+
+        exhausted = all(
+            new_offsets[i] >= min(found, HH_MAX_DEPTH)
+            for i, (_, found) in enumerate(windows)
+        )
+        if not exhausted:
+            await self.cache.set(f"fanout:{search_id}", array("I", seen_list).tobytes(), self.ttl)
+        return {
+            "items": page_items,
+            "per_page": per_page,
+            "next_cursor": None if exhausted else encode_cursor(key, new_offsets, search_id),
+            "streams": [
+                {"resume_id": resume_id, "found": found, "offset": new_offsets[i]}
+                for i, ((resume_id, _), (_, found)) in enumerate(zip(streams, windows))
+            ],
+            "found": max((found for _, found in windows), default=0),
+        }
+
+    async def _load_seen(self, search_id: str) -> List[int]:
+        entry = await self.cache.get(f"fanout:{search_id}")
+        if entry is None:
+            raise CursorExpired("Search cursor expired, start the search again")
+        seen = array("I")
+        seen.frombytes(entry.body)
+        return seen.tolist()
+
+    @staticmethod
+    def _positioned(stream: int, offset: int, items: List[Dict[str, Any]]):
+        for pos, vacancy in enumerate(items):
+            yield offset + pos, stream, vacancy
+
+    async def _fetch_window(
+        self, roles: List[str], filters: Dict[str, Any], offset: int, per_page: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Получить per_page вакансий потока, начиная со смещения offset.
+
+        Смещение не обязано совпадать с границей страницы HH, поэтому
+        при необходимости одновременно запрашиваются две соседние страницы.
+        """
+        if offset >= HH_MAX_DEPTH:
+            return [], 0
+        first_page = offset // per_page
+        pages = [first_page]
+        if offset % per_page and (first_page + 1) * per_page < HH_MAX_DEPTH:
+            pages.append(first_page + 1)
+
+        responses = await asyncio.gather(*(
+            self.hh_client.search_vacancies(
+                **filters, page=page, per_page=per_page, professional_roles=roles
+            ) for page in pages
+        ))
+        items = [item for response in responses for item in response.get("items", [])]
+        skip = offset - first_page * per_page
+        return items[skip:skip + per_page], responses[0].get("found", 0)
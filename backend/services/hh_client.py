@@ -1,17 +1,96 @@
+import asyncio
 import httpx
 import os
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from pydantic import BaseModel
 from loguru import logger
 
+from services.circuit_breaker import BreakerRegistry, CircuitOpenError
+from services.deadline import DeadlineExceeded, current_deadline
+from services.scheduler import INTERACTIVE, QuotaExceeded, scheduler
+from services.timing import span
+
+# Явные таймауты вместо умолчаний httpx: медленный HH не должен держать воркер
+HH_TIMEOUT = httpx.Timeout(float(os.getenv("HH_TIMEOUT", "5")), connect=float(os.getenv("HH_CONNECT_TIMEOUT", "2")))
+
+# Меньше этого остатка бюджета вызов HH уже не успеет — сразу отдаем устаревшие данные
+HH_MIN_CALL_BUDGET = float(os.getenv("HH_MIN_CALL_BUDGET", "0.2"))
+RETRYABLE_STATUSES = (502, 503, 504)
+HH_SLOW_CALL = float(os.getenv("HH_SLOW_CALL", "2"))
+
+breakers = BreakerRegistry(
+    failure_threshold=int(os.getenv("HH_BREAKER_FAILURES", "5")),
+    recovery_timeout=float(os.getenv("HH_BREAKER_RECOVERY", "30")),
+)
+
+
+# Общий пул соединений с HH: TLS-рукопожатие платится один раз, а не на каждый вызов
+HH_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("HH_POOL_SIZE", "50")),
+    max_keepalive_connections=int(os.getenv("HH_POOL_KEEPALIVE", "20")),
+)
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def http_client() -> httpx.AsyncClient:
+    """Общий AsyncClient текущего event loop"""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(timeout=HH_TIMEOUT, limits=HH_POOL_LIMITS)
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class HHUnavailable(httpx.TransportError):
+    """HH недоступен: цепь группы эндпоинтов разомкнута."""
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Ошибка на стороне HH (сеть, таймаут, 5xx) или исчерпанный бюджет, а не ошибка в запросе"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, DeadlineExceeded))
+
+
+def _call_timeout() -> Tuple[httpx.Timeout, bool]:
+    """Таймаут вызова с учетом бюджета запроса и признак того, что бюджет его урезал"""
+    deadline = current_deadline()
+    if deadline is None:
+        return HH_TIMEOUT, False
+    remaining = deadline.remaining()
+    if remaining < HH_MIN_CALL_BUDGET:
+        raise DeadlineExceeded(f"Only {remaining:.2f}s of request budget left for HH call")
+    if remaining >= HH_TIMEOUT.read:
+        return HH_TIMEOUT, False
+    return httpx.Timeout(remaining, connect=min(HH_TIMEOUT.connect, remaining)), True
+
+
+def _decode(response: httpx.Response) -> Any:
+    with span("decode"):
+        return response.json()
+
+
 class HHClient:
     """Клиент для работы с HeadHunter API"""
     
     BASE_URL = "https://api.hh.ru"
     OAUTH_URL = "https://hh.ru"
     
-    def __init__(self, access_token: Optional[str] = None):
+    def __init__(self, access_token: Optional[str] = None, lane: str = INTERACTIVE, user_id: Optional[int] = None):
         self.access_token = access_token
+        # Полоса планировщика и пользователь, на квоту которого идут вызовы
+        self.lane = lane
+        self.user_id = user_id
         self.client_id = os.getenv("HH_CLIENT_ID")
         self.client_secret = os.getenv("HH_CLIENT_SECRET")
         
@@ -25,6 +104,69 @@ class HHClient:
             headers["Authorization"] = f"Bearer {self.access_token}"
         return headers
     
+    def in_lane(self, lane: str, user_id: Optional[int] = None) -> "HHClient":
+        """Тот же клиент в другой полосе планировщика (например, для фоновых задач)"""
+        return HHClient(access_token=self.access_token, lane=lane, user_id=user_id or self.user_id)
+    
+    async def _request(self, group: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """Запрос к API через circuit breaker группы эндпоинтов.
+
+        Ошибки сети, таймауты и 5xx считаются отказами HH; 4xx — нет,
+        это ответ исправного сервиса на некорректный запрос. Таймаут
+        вызова не превышает остаток бюджета запроса; идемпотентный GET
+        повторяется один раз, если бюджета хватает на вторую попытку.
+        """
+        breaker = breakers.get(group)
+        kwargs.setdefault("headers", self._get_headers())
+        attempts = 2 if method == "GET" else 1
+        for attempt in range(attempts):
+            # Бюджета уже не хватает на вызов — не встаем в очередь
+            _call_timeout()
+            # Разомкнутая цепь отклоняет вызов до очереди: не тратит токены планировщика
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                raise HHUnavailable(str(e))
+            try:
+                with span("hh_queue"):
+                    await scheduler.acquire(self.lane, self.user_id)
+                # Таймаут считается после очереди: ожидание в полосе уже вычтено из бюджета
+                timeout, clamped = _call_timeout()
+            except QuotaExceeded as e:
+                breaker.cancel_call()
+                raise HHUnavailable(str(e))
+            except BaseException:
+                breaker.cancel_call()
+                raise
+            try:
+                with span(f"hh_{group}"):
+                    response = await http_client().request(method, f"{self.BASE_URL}{path}", timeout=timeout, **kwargs)
+                    response.raise_for_status()
+            except httpx.TimeoutException as e:
+                # Таймаут, урезанный бюджетом до долей секунды, не говорит о проблемах HH;
+                # не ответить за HH_SLOW_CALL секунд — уже медленный вызов
+                if not clamped or timeout.read >= HH_SLOW_CALL:
+                    breaker.record_failure()
+                if clamped:
+                    raise DeadlineExceeded(f"HH {group} call exceeded the request deadline") from e
+                raise
+            except Exception as e:
+                if not is_upstream_failure(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                retryable = isinstance(e, httpx.ConnectError) or (
+                    isinstance(e, httpx.HTTPStatusError) and e.response.status_code in RETRYABLE_STATUSES
+                )
+                deadline = current_deadline()
+                enough_budget = deadline is None or deadline.remaining() >= 2 * HH_TIMEOUT.connect
+                if attempt + 1 < attempts and retryable and enough_budget:
+                    logger.debug(f"Retrying HH {group} call after {type(e).__name__}")
+                    continue
+                raise
+            breaker.record_success()
+            return response
+    
     async def get_access_token(self, code: str, redirect_uri: str) -> Dict[str, Any]:
         """Обменять authorization code на access token"""
         data = {
@@ -35,23 +177,22 @@ class HHClient:
             "redirect_uri": redirect_uri
         }
         
-        logger.info(f"Token request data: {data}")
+        response = await http_client().post(
+            f"{self.OAUTH_URL}/oauth/token",
+            data=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.OAUTH_URL}/oauth/token",
-                data=data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            
-            logger.info(f"Token response status: {response.status_code}")
-            logger.info(f"Token response text: {response.text}")
+        if response.status_code != 200:
+            # Тело ответа не логируем: в нем могут быть токены и код авторизации
+            try:
+                error = response.json().get("error", "unknown")
+            except ValueError:
+                error = "unknown"
+            logger.error(f"Token exchange failed: {response.status_code} ({error})")
+            raise Exception(f"Token exchange failed: {response.status_code} ({error})")
             
-            if response.status_code != 200:
-                logger.error(f"Token exchange failed: {response.status_code} - {response.text}")
-                raise Exception(f"Token exchange failed: {response.status_code} - {response.text}")
-                
-            return response.json()
+        return response.json()
     
     async def search_vacancies(
         self,
@@ -83,50 +224,42 @@ class HHClient:
         if professional_roles:
             params["professional_role"] = professional_roles
             
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/vacancies",
-                params=params,
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("search", "GET", "/vacancies", params=params)
+        return _decode(response)
     
     async def get_vacancy(self, vacancy_id: str) -> Dict[str, Any]:
         """Получить детали вакансии"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/vacancies/{vacancy_id}",
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("vacancy", "GET", f"/vacancies/{vacancy_id}")
+        return _decode(response)
+    
+    async def get_employer(self, employer_id: str) -> Dict[str, Any]:
+        """Получить информацию о работодателе (отрасли, тип, проверенность)"""
+        response = await self._request("employers", "GET", f"/employers/{employer_id}")
+        return _decode(response)
     
     async def get_me(self) -> Dict[str, Any]:
         """Получить информацию о текущем пользователе"""
         if not self.access_token:
             raise ValueError("Access token required")
             
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/me",
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("me", "GET", "/me")
+        return _decode(response)
     
     async def get_resumes(self) -> List[Dict[str, Any]]:
         """Получить список резюме пользователя"""
         if not self.access_token:
             raise ValueError("Access token required")
             
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/resumes/mine",
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()["items"]
+        response = await self._request("me", "GET", "/resumes/mine")
+        return _decode(response)["items"]
+    
+    async def get_resume(self, resume_id: str) -> Dict[str, Any]:
+        """Получить полное резюме"""
+        if not self.access_token:
+            raise ValueError("Access token required")
+            
+        response = await self._request("me", "GET", f"/resumes/{resume_id}")
+        return _decode(response)
     
     async def apply_to_vacancy(self, vacancy_id: str, resume_id: str, message: str = "") -> Dict[str, Any]:
         """Откликнуться на вакансию"""
@@ -139,27 +272,27 @@ class HHClient:
             "message": message
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.BASE_URL}/negotiations",
-                json=data,
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
-    
-    async def get_negotiations(self) -> List[Dict[str, Any]]:
+        response = await self._request(
+            "negotiations", "POST", "/negotiations",
+            data=data,
+            headers={k: v for k, v in self._get_headers().items() if k != "Content-Type"}
+        )
+        # HH отвечает 201 Created без тела, ID отклика приходит в Location
+        location = response.headers.get("location", "")
+        return {
+            "id": location.rstrip("/").rsplit("/", 1)[-1] if location else None,
+            "location": location
+        }
+    
+    async def get_negotiations(self, page: int = 0, per_page: int = 20) -> List[Dict[str, Any]]:
         """Получить список переговоров (откликов)"""
         if not self.access_token:
             raise ValueError("Access token required")
             
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/negotiations",
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()["items"]
+        response = await self._request(
+            "negotiations", "GET", "/negotiations", params={"page": page, "per_page": per_page}
+        )
+        return _decode(response)["items"]
     
     async def get_salary_statistics(self, professional_role: Optional[int] = None, area: Optional[int] = None) -> Dict[str, Any]:
         """Получить статистику зарплат"""
@@ -169,31 +302,20 @@ class HHClient:
         if area:
             params["area"] = area
             
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/salary_statistics",
-                params=params,
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("dictionaries", "GET", "/salary_statistics", params=params)
+        return _decode(response)
     
     async def get_areas(self) -> List[Dict[str, Any]]:
         """Получить справочник регионов"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/areas",
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("dictionaries", "GET", "/areas")
+        return _decode(response)
     
     async def get_professional_roles(self) -> List[Dict[str, Any]]:
         """Получить справочник профессиональных ролей"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/professional_roles",
-                headers=self._get_headers()
-            )
-            response.raise_for_status()
-            return response.json()
\ No newline at end of file
+        response = await self._request("dictionaries", "GET", "/professional_roles")
+        return _decode(response)
+    
+    async def get_dictionaries(self) -> Dict[str, Any]:
+        """Получить справочники HH (валюты с курсами, опыт, занятость и т.д.)"""
+        response = await self._request("dictionaries", "GET", "/dictionaries")
+        return _decode(response)
\ No newline at end of file
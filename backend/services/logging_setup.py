@@ -0,0 +1,136 @@
+"""Non-blocking loguru configuration with secret redaction and sampling."""
+
+import atexit
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from typing import Any, Dict, List, TextIO
+
+from loguru import logger
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
+LOG_FILE = os.getenv("LOG_FILE")
+
+# Доля сохраняемых подробных строк по маршрутам; WARNING и выше не сэмплируются
+SAMPLE_RATES: Dict[str, float] = {
+    "auth": float(os.getenv("LOG_SAMPLE_AUTH", "0.05")),
+    "search": float(os.getenv("LOG_SAMPLE_SEARCH", "0.01")),
+}
+
+SECRET_KEYS = ("access_token", "refresh_token", "client_secret", "password", "authorization", "auth_token")
+
+_SECRET_PAIR = re.compile(
+    r"(?i)(['\"]?\b(?:" + "|".join(SECRET_KEYS) + r")\b['\"]?\s*[:=]\s*['\"]?)([^'\"&,}\s]+)"
+)
+_BEARER = re.compile(r"(?i)\b(bearer\s+)[A-Za-z0-9._~+/=-]+")
+# OAuth code: в query string callback-а и в залогированных словарях
+_QUERY_CODE = re.compile(r"(?i)([?&]code=|['\"]code['\"]\s*:\s*['\"]?)[^&\s'\",}]+")
+
+
+def redact(text: str) -> str:
+    """Заменить значения токенов и секретов на ***"""
+    text = _BEARER.sub(r"\1***", text)
+    text = _SECRET_PAIR.sub(r"\1***", text)
+    return _QUERY_CODE.sub(r"\1***", text)
+
+
+def _redact_value(key: str, value: Any) -> Any:
+    if key.lower() in SECRET_KEYS:
+        return "***"
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {k: _redact_value(str(k), v) for k, v in value.items()}
+    return value
+
+
+def _patch(record: Dict[str, Any]) -> None:
+    # Патчер выполняется в вызывающем потоке до постановки в очередь,
+    # поэтому секреты не попадают даже во внутреннюю очередь sink-а
+    record["message"] = redact(record["message"])
+    if record["extra"]:
+        record["extra"] = {k: _redact_value(k, v) for k, v in record["extra"].items()}
+
+
+def _sample(record: Dict[str, Any]) -> bool:
+    rate = record["extra"].get("sample")
+    if rate is None or record["level"].no >= logger.level("WARNING").no:
+        return True
+    return random.random() < rate
+
+
+def sampled(route: str):
+    """Логгер для подробных строк маршрута: пишется только доля SAMPLE_RATES[route]"""
+    return logger.bind(route=route, sample=SAMPLE_RATES.get(route, 1.0))
+
+
+class QueueSink:
+    """Sink, который только кладет готовую строку в очередь в памяти.
+
+    Запись в поток (stderr, файл) и flush выполняет отдельный поток пачками,
+    поэтому медленный диск или забитый pipe не останавливают event loop.
+    В отличие от enqueue=True в loguru, записи не сериализуются через pickle.
+    """
+
+    def __init__(self, stream: TextIO, batch_size: int = 256):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __call__(self, message: str) -> None:
+        self.queue.put(message)
+
+    def _run(self) -> None:
+        while True:
+            batch: List[str] = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = batch[-1] is None
+            self.stream.write("".join(line for line in batch if line is not None))
+            self.stream.flush()
+            if closing:
+                return
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def configure_logging() -> None:
+    """Вывод через QueueSink: event loop только кладет строку в очередь,
+    запись на диск и в stderr идет в отдельном потоке."""
+    logger.remove()
+    logger.configure(patcher=_patch)
+    logger.add(
+        QueueSink(sys.stderr),
+        level=LOG_LEVEL,
+        serialize=LOG_JSON,
+        filter=_sample,
+        backtrace=False,
+        diagnose=False,
+    )
+    if LOG_FILE:
+        # Ротацию умеет только файловый sink loguru; enqueue уносит запись и
+        # ротацию из event loop ценой pickle записи (см. benchmarks/bench_logging.py)
+        logger.add(
+            LOG_FILE,
+            level=LOG_LEVEL,
+            enqueue=True,
+            serialize=True,
+            filter=_sample,
+            rotation=os.getenv("LOG_ROTATION", "100 MB"),
+            retention=os.getenv("LOG_RETENTION", "7 days"),
+            backtrace=False,
+            diagnose=False,
+        )
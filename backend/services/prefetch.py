@@ -0,0 +1,127 @@
+"""Speculative background prefetch of search pages and vacancy details."""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from services.cache import Cache
+from services.deadline import clear_deadline
+from services.rate_limiter import TokenBucket
+
+# Отдельный, заведомо меньший бюджет HH: упреждающие запросы
+# не должны отнимать лимит у запросов пользователей
+PREFETCH_RATE = float(os.getenv("PREFETCH_RATE", "2"))
+PREFETCH_BURST = float(os.getenv("PREFETCH_BURST", "10"))
+PREFETCH_MAX_INFLIGHT = int(os.getenv("PREFETCH_MAX_INFLIGHT", "8"))
+
+Producer = Callable[[], Awaitable[Optional[bytes]]]
+
+
+class Prefetcher:
+    """Фоновое заполнение кеша тем, что пользователь, скорее всего, запросит следующим.
+
+    Каждая задача стоит токенов из собственного bucket: если бюджет
+    исчерпан или в работе уже слишком много задач, prefetch пропускается.
+    Ключи, заполненные упреждающе, запоминаются, чтобы считать долю попаданий.
+    """
+
+    def __init__(
+        self,
+        cache: Cache,
+        rate: float = PREFETCH_RATE,
+        burst: float = PREFETCH_BURST,
+        max_inflight: int = PREFETCH_MAX_INFLIGHT,
+        max_tracked: int = 10000
+    ):
+        self.cache = cache
+        self.bucket = TokenBucket(rate, burst)
+        self.max_inflight = max_inflight
+        self.max_tracked = max_tracked
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight: Set[str] = set()
+        self._prefetched: "OrderedDict[str, Tuple[str, Optional[Callable[[], None]]]]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, kind: str, name: str, amount: int = 1) -> None:
+        counters = self.stats.setdefault(
+            kind, {"scheduled": 0, "stored": 0, "skipped": 0, "failed": 0, "hits": 0}
+        )
+        counters[name] += amount
+
+    def schedule(
+        self, kind: str, key: str, producer: Producer, ttl: int,
+        on_hit: Optional[Callable[[], None]] = None
+    ) -> bool:
+        """Запустить producer в фоне и положить результат в кеш под key.
+
+        on_hit вызывается, когда заполненный ключ действительно запросят, —
+        так prefetch следующей страницы продолжается при листании подряд.
+        """
+        if key in self._inflight or len(self._tasks) >= self.max_inflight or self.bucket.try_acquire():
+            self._count(kind, "skipped")
+            return False
+        self._count(kind, "scheduled")
+        self._inflight.add(key)
+        task = asyncio.create_task(self._run(kind, key, producer, ttl, on_hit))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def schedule_many(self, kind: str, keys: List[str], producer: Callable[[str], Awaitable[Optional[bytes]]], ttl: int) -> int:
+        """Несколько однотипных задач, пока хватает бюджета"""
+        scheduled = 0
+        for key in keys:
+            if not self.schedule(kind, key, lambda key=key: producer(key), ttl):
+                break
+            scheduled += 1
+        return scheduled
+
+    async def _run(
+        self, kind: str, key: str, producer: Producer, ttl: int, on_hit: Optional[Callable[[], None]]
+    ) -> None:
+        # Задача переживает запрос, который ее запустил, и его бюджет
+        clear_deadline()
+        try:
+            if await self.cache.get(key) is not None:
+                # Уже в кеше — токен HH не нужен
+                self.bucket.refund()
+                return
+            body = await producer()
+            if body is None:
+                return
+            await self.cache.set(key, body, ttl)
+            self._count(kind, "stored")
+            self._prefetched[key] = (kind, on_hit)
+            while len(self._prefetched) > self.max_tracked:
+                self._prefetched.popitem(last=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._count(kind, "failed")
+            logger.debug(f"Prefetch {kind} {key} failed: {e}")
+        finally:
+            self._inflight.discard(key)
+
+    def record_hit(self, key: str) -> None:
+        """Вызывается при попадании в кеш: засчитать, если ключ заполнен упреждающе"""
+        prefetched = self._prefetched.pop(key, None)
+        if prefetched is not None:
+            kind, on_hit = prefetched
+            self._count(kind, "hits")
+            if on_hit is not None:
+                on_hit()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for kind, counters in self.stats.items():
+            stored = counters["stored"]
+            result[kind] = {**counters, "hit_rate": round(counters["hits"] / stored, 3) if stored else 0.0}
+        return result
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
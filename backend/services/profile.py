@@ -0,0 +1,83 @@
+"""User profile served from the local users table, revalidated against HH /me."""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import DateTime, text
+from sqlalchemy.orm import Session
+
+# Как долго профиль считается актуальным без сверки с HH /me
+PROFILE_REVALIDATE_AFTER = int(os.getenv("PROFILE_REVALIDATE_AFTER", "3600"))
+
+PROFILE_FIELDS = ("email", "first_name", "last_name", "middle_name")
+
+
+def render_profile(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Ответ /user/profile в прежнем формате (раньше собирался из HH /me)"""
+    first_name = row.get("first_name") or ""
+    last_name = row.get("last_name") or ""
+    middle_name = row.get("middle_name") or ""
+    return {
+        "id": row["hh_user_id"],
+        "email": row.get("email"),
+        "name": f"{first_name} {last_name}".strip(),
+        "full_name": f"{last_name} {first_name} {middle_name}".strip(),
+        "first_name": first_name,
+        "last_name": last_name,
+        "middle_name": middle_name,
+        "hh_id": row["hh_user_id"],
+        "hh_token": "token_exists",
+    }
+
+
+class ProfileStore:
+    """Профиль пользователя в таблице users.
+
+    Имя и email пишет auth callback; дальше строка сверяется с HH /me
+    не чаще раза в PROFILE_REVALIDATE_AFTER секунд и обновляется, только
+    если что-то поменялось. profile_synced_at — время последней сверки.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            text("""
+            SELECT id, hh_user_id, email, first_name, last_name, middle_name, profile_synced_at
+            FROM users WHERE id = :user_id AND is_active IS NOT FALSE
+            """).columns(profile_synced_at=DateTime(timezone=True)),
+            {"user_id": user_id}
+        ).mappings().fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def is_stale(row: Dict[str, Any]) -> bool:
+        synced_at = row.get("profile_synced_at")
+        if synced_at is None:
+            return True
+        if synced_at.tzinfo is None:
+            synced_at = synced_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - synced_at > timedelta(seconds=PROFILE_REVALIDATE_AFTER)
+
+    def apply_me(self, user_id: int, me: Dict[str, Any]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Сверить строку с ответом HH /me; (изменилась ли строка, актуальная строка)"""
+        row = self.get(user_id)
+        if row is None:
+            return False, None
+        now = datetime.now(timezone.utc)
+        changes = {field: me.get(field) for field in PROFILE_FIELDS if me.get(field) and me.get(field) != row.get(field)}
+        if changes:
+            assignments = ", ".join(f"{field} = :{field}" for field in changes)
+            self.db.execute(
+                text(f"UPDATE users SET {assignments}, profile_synced_at = :now, updated_at = :now WHERE id = :user_id"),
+                {**changes, "now": now, "user_id": user_id}
+            )
+        else:
+            self.db.execute(
+                text("UPDATE users SET profile_synced_at = :now WHERE id = :user_id"),
+                {"now": now, "user_id": user_id}
+            )
+        self.db.commit()
+        return bool(changes), {**row, **changes, "profile_synced_at": now}
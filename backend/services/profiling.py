@@ -0,0 +1,169 @@
+"""On-demand sampling profiler and tracemalloc snapshots for a live worker."""
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+Frame = Tuple[str, str, int]
+
+
+class ProfilerBusy(RuntimeError):
+    """Профилирование уже идет — одновременно допускается одно окно."""
+
+
+class SamplingProfiler:
+    """Статистический профайлер потока event loop.
+
+    Отдельный поток раз в interval секунд снимает стек целевого потока
+    через sys._current_frames() и считает одинаковые стеки. Инструментация
+    кода не нужна, а вне окна профилирования поток не существует вовсе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples: Counter = Counter()
+        self.interval = 0.005
+        self.started_at = 0.0
+        self.duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.005, thread_id: Optional[int] = None) -> None:
+        with self._lock:
+            if self.running:
+                raise ProfilerBusy("Profiler is already running")
+            self.samples = Counter()
+            self.interval = interval
+            self.started_at = time.perf_counter()
+            self._stop.clear()
+            target = thread_id if thread_id is not None else threading.get_ident()
+            self._thread = threading.Thread(target=self._run, args=(target,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self, thread_id: int) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None or thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+    def to_speedscope(self, name: str = "jobhunter-pro") -> Dict[str, Any]:
+        """Формат https://www.speedscope.app/file-format-schema.json (sampled)"""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        samples, weights = [], []
+        for stack, count in self.samples.most_common():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.duration, 6),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "jobhunter-pro",
+        }
+
+    def to_collapsed(self) -> str:
+        """Свернутые стеки для flamegraph.pl / inferno: "a;b;c 42" """
+        return "".join(
+            ";".join(f"{name} ({file.rsplit('/', 1)[-1]}:{line})" for name, file, line in stack) + f" {count}\n"
+            for stack, count in self.samples.most_common()
+        )
+
+
+class AllocationTracer:
+    """Снимки tracemalloc и разница между ними — поиск роста кешей и утечек."""
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 10) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def snapshot(self, limit: int = 25, key_type: str = "lineno") -> Dict[str, Any]:
+        """Снять снимок, сделать его базой для diff и вернуть крупнейшие места аллокаций"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        self.baseline = self._take()
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {"location": str(stat.traceback), "size": stat.size, "count": stat.count}
+                for stat in self.baseline.statistics(key_type)[:limit]
+            ],
+        }
+
+    def diff(self, limit: int = 25, key_type: str = "lineno") -> Dict[str, Any]:
+        """Рост памяти с момента последнего snapshot()"""
+        if not tracemalloc.is_tracing() or self.baseline is None:
+            raise RuntimeError("Take a tracemalloc snapshot first")
+        current = self._take()
+        stats = current.compare_to(self.baseline, key_type)
+        return {
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "location": str(stat.traceback),
+                    "size_diff": stat.size_diff,
+                    "size": stat.size,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+
+profiler = SamplingProfiler()
+allocations = AllocationTracer()
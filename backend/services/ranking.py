@@ -0,0 +1,347 @@
+"""Resume-to-vacancy relevance ranking computed over whole result sets."""
+
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.currency import currency_rates
+
+TOKEN_RE = re.compile(r"[\w+#]{2,}")
+HASH_BITS = 18
+HASH_MASK = (1 << HASH_BITS) - 1
+
+# Границы опыта HH в месяцах: experience.id -> (min, max)
+EXPERIENCE_RANGES = {
+    "noExperience": (0, 12),
+    "between1And3": (12, 36),
+    "between3And6": (36, 72),
+    "moreThan6": (72, 600),
+}
+
+WEIGHTS = {"text": 0.45, "skills": 0.25, "salary": 0.15, "experience": 0.15, "employer": 0.10}
+WEIGHT_SUM = sum(WEIGHTS.values())
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def _hash_tokens(tokens: List[str]) -> List[int]:
+    return [hash(t) & HASH_MASK for t in tokens]
+
+
+def vacancy_text(vacancy: Dict[str, Any]) -> str:
+    """Текст вакансии для ранжирования: название, сниппет, ключевые навыки"""
+    snippet = vacancy.get("snippet") or {}
+    parts = [
+        vacancy.get("name") or "",
+        snippet.get("requirement") or "",
+        snippet.get("responsibility") or "",
+    ]
+    parts.extend(skill.get("name", "") for skill in vacancy.get("key_skills") or [])
+    return " ".join(parts)
+
+
+@dataclass
+class ResumeProfile:
+    """Признаки резюме пользователя, собранные один раз и закешированные."""
+
+    term_ids: np.ndarray  # отсортированные хеши токенов с ненулевым весом
+    term_values: np.ndarray  # нормированные веса этих хешей
+    skill_hashes: np.ndarray  # отсортированные хеши токенов навыков
+    salary: Optional[float]  # ожидаемая зарплата в рублях
+    experience_months: Optional[int]
+    built_at: float
+    industries: frozenset = frozenset()  # отрасли прошлых работодателей (из полных резюме)
+
+
+class VacancyRanker:
+    """Скоринг вакансий относительно резюме пользователя.
+
+    Все признаки считаются для всей страницы (или выгрузки) сразу: токены
+    вакансий превращаются в плоские массивы (doc, hash), а TF-IDF, совпадение
+    навыков, зарплата и опыт — в векторные операции NumPy. Токены вакансий
+    кешируются, профили резюме — кешируются на пользователя с TTL.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_profiles: int = 10000, max_cached_vacancies: int = 200000):
+        self.ttl_seconds = ttl_seconds
+        self.max_profiles = max_profiles
+        self.max_cached_vacancies = max_cached_vacancies
+        self._profiles: Dict[int, ResumeProfile] = {}
+        self._terms: "OrderedDict[Tuple[Any, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def get_profile(self, user_id: int) -> Optional[ResumeProfile]:
+        profile = self._profiles.get(user_id)
+        if profile and time.monotonic() - profile.built_at < self.ttl_seconds:
+            return profile
+        return None
+
+    def build_profile(self, user_id: int, resumes: List[Dict[str, Any]]) -> ResumeProfile:
+        """Построить профиль из резюме (get_resumes) и положить в кеш"""
+        # Профиль разреженный: плотный вектор на 2^18 хешей занимал бы 1 МиБ на пользователя
+        hashes: List[int] = []
+        weights: List[float] = []
+        skill_hashes = set()
+        salaries = []
+        experience = []
+        industries = set()
+
+        def add_terms(tokens: List[int], weight: float) -> None:
+            hashes.extend(tokens)
+            weights.extend([weight] * len(tokens))
+
+        for resume in resumes:
+            add_terms(_hash_tokens(tokenize(resume.get("title") or "")), 2.0)
+
+            role_names = " ".join(r.get("name", "") for r in resume.get("professional_roles") or [])
+            add_terms(_hash_tokens(tokenize(role_names)), 1.0)
+
+            skills = list(resume.get("skill_set") or [])
+            skills.extend(s.get("name", "") for s in resume.get("key_skills") or [] if isinstance(s, dict))
+            skill_tokens = _hash_tokens(tokenize(" ".join(skills)))
+            add_terms(skill_tokens, 1.5)
+            skill_hashes.update(skill_tokens)
+
+            salary = resume.get("salary") or {}
+            amount = currency_rates.to_rub(salary.get("amount"), salary.get("currency"))
+            if amount:
+                salaries.append(amount)
+            months = (resume.get("total_experience") or {}).get("months")
+            if months is not None:
+                experience.append(months)
+            # Опыт с отраслями есть только в полном резюме, в списке /resumes/mine его нет
+            for job in resume.get("experience") or []:
+                industries.update(str(i["id"]) for i in job.get("industries") or [] if i.get("id"))
+
+        term_ids, inverse = np.unique(np.array(hashes, dtype=np.int64), return_inverse=True)
+        term_values = np.bincount(inverse, weights=weights, minlength=len(term_ids)).astype(np.float32)
+        norm = np.linalg.norm(term_values)
+        if norm:
+            term_values /= norm
+
+        # Навыки без отдельного списка берем из заголовков резюме
+        if not skill_hashes:
+            skill_hashes.update(term_ids.tolist())
+
+        profile = ResumeProfile(
+            term_ids=term_ids,
+            term_values=term_values,
+            skill_hashes=np.array(sorted(skill_hashes), dtype=np.int64),
+            salary=min(salaries) if salaries else None,
+            experience_months=max(experience) if experience else None,
+            built_at=time.monotonic(),
+            industries=frozenset(industries),
+        )
+
+        if len(self._profiles) >= self.max_profiles:
+            oldest = min(self._profiles, key=lambda uid: self._profiles[uid].built_at)
+            del self._profiles[oldest]
+        self._profiles[user_id] = profile
+        return profile
+
+    def invalidate(self, user_id: int) -> None:
+        self._profiles.pop(user_id, None)
+
+    def score(
+        self,
+        profile: ResumeProfile,
+        vacancies: List[Dict[str, Any]],
+        employers: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, np.ndarray]:
+        """Посчитать компоненты и итоговый скор для списка вакансий.
+
+        employers — детали работодателей страницы по ID (EmployerDirectory.get_many);
+        без них используется только заглушка employer из выдачи.
+        """
+        n = len(vacancies)
+        if not n:
+            empty = np.zeros(0, dtype=np.float32)
+            return {"total": empty, "text": empty, "skills": empty, "salary": empty, "experience": empty, "employer": empty}
+
+        doc_ids, terms, counts = self._flatten(vacancies)
+        text_score, skill_score = self._text_scores(profile, doc_ids, terms, counts, n)
+        salary_score = self._salary_scores(profile, vacancies)
+        experience_score = self._experience_scores(profile, vacancies)
+        employer_score = self._employer_scores(profile, vacancies, employers or {})
+
+        total = (
+            WEIGHTS["text"] * text_score
+            + WEIGHTS["skills"] * skill_score
+            + WEIGHTS["salary"] * salary_score
+            + WEIGHTS["experience"] * experience_score
+            + WEIGHTS["employer"] * employer_score
+        ) / WEIGHT_SUM
+        return {
+            "total": total,
+            "text": text_score,
+            "skills": skill_score,
+            "salary": salary_score,
+            "experience": experience_score,
+            "employer": employer_score,
+        }
+
+    def rank(
+        self,
+        profile: ResumeProfile,
+        vacancies: List[Dict[str, Any]],
+        employers: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Отсортировать вакансии по релевантности, добавив поле relevance"""
+        scores = self.score(profile, vacancies, employers)["total"]
+        order = np.argsort(-scores, kind="stable")
+        ranked = []
+        for i in order:
+            vacancy = vacancies[i]
+            vacancy["relevance"] = round(float(scores[i]), 4)
+            ranked.append(vacancy)
+        return ranked
+
+    def _vacancy_terms(self, vacancies: List[Dict[str, Any]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Уникальные хеши токенов каждой вакансии и их частоты.
+
+        Токенизация — самая дорогая часть скоринга и не зависит от
+        пользователя, поэтому результат кешируется по ID и тексту вакансии.
+        Промахи кеша обрабатываются одной пачкой.
+        """
+        features: List[Optional[Tuple[np.ndarray, np.ndarray]]] = []
+        missing: List[Tuple[int, Tuple[Any, int], str]] = []
+        for i, vacancy in enumerate(vacancies):
+            text = vacancy_text(vacancy)
+            key = (vacancy.get("id"), hash(text))
+            cached = self._terms.get(key)
+            if cached is not None:
+                self._terms.move_to_end(key)
+            else:
+                missing.append((i, key, text))
+            features.append(cached)
+
+        if missing:
+            hashes: List[int] = []
+            lengths = []
+            for _, _, text in missing:
+                tokens = _hash_tokens(tokenize(text))
+                hashes.extend(tokens)
+                lengths.append(len(tokens))
+            docs = np.repeat(np.arange(len(missing), dtype=np.int64), lengths)
+            pairs, counts = np.unique(docs << HASH_BITS | np.array(hashes, dtype=np.int64), return_counts=True)
+            bounds = np.searchsorted(pairs >> HASH_BITS, np.arange(len(missing) + 1))
+            terms = pairs & HASH_MASK
+            for j, (i, key, _) in enumerate(missing):
+                entry = (terms[bounds[j]:bounds[j + 1]], counts[bounds[j]:bounds[j + 1]])
+                self._terms[key] = entry
+                features[i] = entry
+            while len(self._terms) > self.max_cached_vacancies:
+                self._terms.popitem(last=False)
+        return features
+
+    def _flatten(self, vacancies: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Пары (документ, токен) со всех вакансий в виде плоских массивов"""
+        features = self._vacancy_terms(vacancies)
+        lengths = np.fromiter((len(terms) for terms, _ in features), dtype=np.int64, count=len(features))
+        doc_ids = np.repeat(np.arange(len(vacancies), dtype=np.int64), lengths)
+        if not len(doc_ids):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        terms = np.concatenate([terms for terms, _ in features])
+        counts = np.concatenate([counts for _, counts in features])
+        return doc_ids, terms, counts
+
+    @staticmethod
+    def _text_scores(profile: ResumeProfile, pair_docs: np.ndarray, pair_terms: np.ndarray, tf: np.ndarray, n: int):
+        if not len(pair_terms):
+            zeros = np.zeros(n, dtype=np.float32)
+            return zeros, zeros
+
+        # IDF считается по самому набору вакансий
+        df = np.bincount(pair_terms, minlength=1 << HASH_BITS)
+        idf = np.log((n + 1) / (df[pair_terms] + 1)) + 1.0
+        tfidf = (1.0 + np.log(tf)) * idf
+
+        doc_norm = np.sqrt(np.bincount(pair_docs, weights=tfidf ** 2, minlength=n))
+        # Веса профиля по токенам вакансий — выборка из разреженного профиля
+        if len(profile.term_ids):
+            positions = np.minimum(np.searchsorted(profile.term_ids, pair_terms), len(profile.term_ids) - 1)
+            profile_weights = np.where(profile.term_ids[positions] == pair_terms, profile.term_values[positions], 0.0)
+        else:
+            profile_weights = np.zeros(len(pair_terms))
+        dot = np.bincount(pair_docs, weights=tfidf * profile_weights, minlength=n)
+        text_score = np.divide(dot, doc_norm, out=np.zeros(n), where=doc_norm > 0)
+
+        if len(profile.skill_hashes):
+            matched = np.isin(pair_terms, profile.skill_hashes)
+            skill_score = np.bincount(pair_docs, weights=matched, minlength=n) / len(profile.skill_hashes)
+            skill_score = np.minimum(skill_score * 2.0, 1.0)
+        else:
+            skill_score = np.zeros(n)
+        return text_score.astype(np.float32), skill_score.astype(np.float32)
+
+    @staticmethod
+    def _salary_scores(profile: ResumeProfile, vacancies: List[Dict[str, Any]]) -> np.ndarray:
+        n = len(vacancies)
+        if not profile.salary:
+            return np.full(n, 0.5, dtype=np.float32)
+
+        # Верхняя граница вилки в месячном net-рубле, для открытых диапазонов — нижняя
+        lower, upper, _ = currency_rates.normalize(
+            [vacancy.get("salary_range") or vacancy.get("salary") for vacancy in vacancies]
+        )
+        upper = np.where(np.isnan(upper), lower, upper)
+
+        # Без зарплаты — оценка по соседям (salary_estimate), сжатая к нейтральной по ее уверенности
+        estimates = [vacancy.get("salary_estimate") or {} for vacancy in vacancies]
+        estimated = np.array([estimate.get("to") or np.nan for estimate in estimates], dtype=np.float64)
+        confidence = np.array([estimate.get("confidence") or 0.0 for estimate in estimates], dtype=np.float64)
+        estimated_fit = 0.5 + confidence * (np.clip(estimated / profile.salary, 0.0, 1.0) - 0.5)
+
+        # Вакансии без зарплаты и без оценки получают нейтральную оценку
+        fit = np.clip(upper / profile.salary, 0.0, 1.0)
+        fit = np.where(np.isnan(fit), estimated_fit, fit)
+        return np.where(np.isnan(fit), 0.5, fit).astype(np.float32)
+
+    @staticmethod
+    def _experience_scores(profile: ResumeProfile, vacancies: List[Dict[str, Any]]) -> np.ndarray:
+        n = len(vacancies)
+        if profile.experience_months is None:
+            return np.full(n, 0.5, dtype=np.float32)
+
+        bounds = np.array([
+            EXPERIENCE_RANGES.get((vacancy.get("experience") or {}).get("id"), (np.nan, np.nan))
+            for vacancy in vacancies
+        ], dtype=np.float64).reshape(n, 2)
+        months = profile.experience_months
+        # Расстояние до диапазона в годах; каждый год промаха снижает оценку
+        distance = np.maximum(bounds[:, 0] - months, 0) + np.maximum(months - bounds[:, 1], 0)
+        match = 1.0 / (1.0 + distance / 12.0)
+        return np.where(np.isnan(match), 0.5, match).astype(np.float32)
+
+    @staticmethod
+    def _employer_scores(
+        profile: ResumeProfile, vacancies: List[Dict[str, Any]], employers: Dict[str, Dict[str, Any]]
+    ) -> np.ndarray:
+        """Проверенность работодателя и совпадение его отраслей с опытом пользователя"""
+        n = len(vacancies)
+        trust = np.full(n, 0.5, dtype=np.float32)
+        industry = np.full(n, 0.5, dtype=np.float32)
+        parents = frozenset(i.split(".", 1)[0] for i in profile.industries)
+        for i, vacancy in enumerate(vacancies):
+            stub = vacancy.get("employer") or {}
+            details = employers.get(str(stub.get("id"))) or stub
+            if details.get("trusted") is not None:
+                trust[i] = 1.0 if details["trusted"] else 0.0
+            ids = {str(item["id"]) for item in details.get("industries") or []}
+            if profile.industries and ids:
+                if ids & profile.industries:
+                    industry[i] = 1.0
+                elif {item.split(".", 1)[0] for item in ids} & parents:
+                    industry[i] = 0.7
+                else:
+                    industry[i] = 0.0
+        return 0.5 * trust + 0.5 * industry
+
+
+ranker = VacancyRanker()
@@ -0,0 +1,60 @@
+"""Rate limiting primitives for outgoing HeadHunter API calls."""
+
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """Взять токены. Возвращает 0, если получилось, иначе сколько секунд ждать."""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def refund(self, amount: float = 1.0) -> None:
+        """Вернуть токены, если вызов так и не был сделан."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Глобальный лимит плюс отдельный bucket на каждого пользователя."""
+
+    def __init__(self, global_rate: float, global_burst: float, user_rate: float, user_burst: float):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.user_buckets: Dict[int, TokenBucket] = {}
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self.user_buckets[user_id] = bucket
+        return bucket
+
+    def try_acquire(self, user_id: Optional[int] = None) -> float:
+        """Проверить оба лимита. 0 — можно вызывать, иначе время ожидания в секундах."""
+        if user_id is not None:
+            user_wait = self._user_bucket(user_id).try_acquire()
+            if user_wait:
+                return user_wait
+        global_wait = self.global_bucket.try_acquire()
+        if global_wait and user_id is not None:
+            # Глобальный лимит исчерпан — пользовательский токен не тратим
+            self._user_bucket(user_id).refund()
+        return global_wait
@@ -0,0 +1,77 @@
+"""Per-user cache of full HH resumes, invalidated by the resume's updated_at."""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from loguru import logger
+
+from services.cache import Cache, CacheEntry
+from services.hh_client import HHClient
+
+RESUME_DETAIL_TTL = int(os.getenv("RESUME_DETAIL_TTL", "3600"))
+# Сколько резюме одного пользователя загружается из HH одновременно
+RESUME_FETCH_CONCURRENCY = int(os.getenv("RESUME_FETCH_CONCURRENCY", "4"))
+
+
+def detail_key(user_id: int, resume_id: str) -> str:
+    return f"resume:{user_id}:{resume_id}"
+
+
+class ResumeDetails:
+    """Полные резюме пользователя в кеше.
+
+    Список /resumes/mine содержит updated_at каждого резюме: если он совпал
+    с закешированной копией, резюме не перезапрашивается. Изменившиеся и
+    отсутствующие резюме загружаются параллельно, не больше concurrency
+    одновременно.
+    """
+
+    def __init__(self, cache: Cache, ttl: int = RESUME_DETAIL_TTL, concurrency: int = RESUME_FETCH_CONCURRENCY):
+        self.cache = cache
+        self.ttl = ttl
+        self.concurrency = concurrency
+
+    async def get(self, user_id: int, resume_id: str) -> Optional[CacheEntry]:
+        return await self.cache.get(detail_key(user_id, resume_id))
+
+    async def put(self, user_id: int, detail: Dict[str, Any]) -> CacheEntry:
+        return await self.cache.set(detail_key(user_id, str(detail["id"])), orjson.dumps(detail), self.ttl)
+
+    async def _outdated(self, user_id: int, summaries: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+        ids = [str(summary["id"]) for summary in summaries if summary.get("id")]
+        updated_at = {str(summary["id"]): summary.get("updated_at") for summary in summaries if summary.get("id")}
+        entries = await self.cache.get_many([detail_key(user_id, resume_id) for resume_id in ids])
+        details, outdated = {}, []
+        for resume_id, entry in zip(ids, entries):
+            detail = orjson.loads(entry.body) if entry is not None else None
+            if detail is not None and detail.get("updated_at") == updated_at[resume_id]:
+                details[resume_id] = detail
+            else:
+                outdated.append(resume_id)
+        return details, outdated
+
+    async def sync(self, hh_client: HHClient, user_id: int, summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Полные резюме для списка: актуальные из кеша, изменившиеся — из HH"""
+        details, outdated = await self._outdated(user_id, summaries)
+        if not outdated:
+            return details
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(resume_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await hh_client.get_resume(resume_id)
+
+        results = await asyncio.gather(*(fetch(resume_id) for resume_id in outdated), return_exceptions=True)
+        fresh = {}
+        for resume_id, result in zip(outdated, results):
+            if isinstance(result, Exception):
+                # Резюме без деталей UI догрузит отдельным запросом
+                logger.warning(f"Failed to fetch resume {resume_id} for user {user_id}: {type(result).__name__}: {result}")
+                continue
+            details[resume_id] = result
+            fresh[detail_key(user_id, resume_id)] = orjson.dumps(result)
+        await self.cache.set_many(fresh, self.ttl)
+        return details
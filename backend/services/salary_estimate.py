@@ -0,0 +1,456 @@
+"""Salary estimates for vacancies without a published salary: nearest salaried neighbours in the local store."""
+
+import asyncio
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import JSON, bindparam, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from services.text_features import VECTOR_DIM, extract_features, hashed_vectors, unpack_vector
+
+SALARY_NEIGHBORS = int(os.getenv("SALARY_NEIGHBORS", "10"))
+# Сколько последних вакансий с зарплатой держать в индексе процесса и по одной роли:
+# время оценки страницы растет с размером роли, а не всего индекса
+SALARY_INDEX_SIZE = int(os.getenv("SALARY_INDEX_SIZE", "100000"))
+SALARY_ROLE_SIZE = int(os.getenv("SALARY_ROLE_SIZE", "10000"))
+# Индекс у каждого воркера свой: изменения, сохраненные другими, подтягиваются из таблицы
+SALARY_INDEX_REFRESH_INTERVAL = int(os.getenv("SALARY_INDEX_REFRESH_INTERVAL", "60"))
+# Окно перекрытия между обновлениями: часы БД и воркеров, долгие транзакции
+SALARY_INDEX_REFRESH_OVERLAP = 60
+# Соседи с меньшим сходством текста не участвуют в оценке
+SALARY_MIN_SIMILARITY = float(os.getenv("SALARY_MIN_SIMILARITY", "0.15"))
+# Оценки ниже этой уверенности не показываются и не участвуют в фильтре по зарплате
+SALARY_MIN_CONFIDENCE = float(os.getenv("SALARY_MIN_CONFIDENCE", "0.2"))
+# Прибавка к сходству за тот же регион и за совпадающий опыт (роль — жесткое условие)
+AREA_WEIGHT = 0.3
+EXPERIENCE_WEIGHT = 0.2
+
+EXPERIENCE_LEVELS = {"noExperience": 0, "between1And3": 1, "between3And6": 2, "moreThan6": 3}
+# Прибавка за опыт по паре уровней (уровень + 1, 0 — неизвестен): убывает с расстоянием
+_EXPERIENCE_BONUS = np.array([
+    [0.0] * 5,
+    *([0.0] + [EXPERIENCE_WEIGHT * (1 - abs(a - b) / 3) for b in range(4)] for a in range(4)),
+], dtype=np.float32)
+
+
+def row_vectors(rows: List[Dict[str, Any]]) -> np.ndarray:
+    """Векторы строк: сохраненный vector, для старых признаков без него — из tokens и skills"""
+    vectors = np.zeros((len(rows), VECTOR_DIM), dtype=np.float32)
+    missing = []
+    for i, row in enumerate(rows):
+        vector = unpack_vector(row.get("vector"))
+        if vector is None:
+            missing.append(i)
+        else:
+            vectors[i] = vector
+    if missing:
+        vectors[missing] = hashed_vectors([(rows[i].get("tokens") or [], rows[i].get("skills") or []) for i in missing])
+    return vectors
+
+
+def _area_code(area_id: Optional[str]) -> int:
+    return int(area_id) if area_id and str(area_id).isdigit() else -1
+
+
+def _experience_code(experience_id: Optional[str]) -> int:
+    return EXPERIENCE_LEVELS.get(experience_id or "", -1)
+
+
+def _weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: Tuple[float, ...]) -> List[float]:
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    positions = np.searchsorted(cumulative, np.array(quantiles) * cumulative[-1])
+    return [float(values[order[min(p, len(order) - 1)]]) for p in positions]
+
+
+class _Partition:
+    """Вакансии с зарплатой одной профессиональной роли: строки матрицы без дыр."""
+
+    __slots__ = ("vectors", "log_salaries", "areas", "experience", "ids", "order")
+
+    def __init__(self, capacity: int = 64):
+        self.vectors = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+        self.log_salaries = np.zeros(capacity, dtype=np.float32)
+        self.areas = np.zeros(capacity, dtype=np.int32)
+        self.experience = np.zeros(capacity, dtype=np.int8)
+        self.ids: List[str] = []
+        # ID в порядке добавления — для вытеснения самых старых вакансий роли
+        self.order: "OrderedDict[str, None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, vacancy_id: str, vector: np.ndarray, salary: float, area: int, experience: int) -> int:
+        row = len(self.ids)
+        if row == len(self.log_salaries):
+            capacity = row * 2
+            self.vectors = np.resize(self.vectors, (capacity, VECTOR_DIM))
+            self.log_salaries = np.resize(self.log_salaries, capacity)
+            self.areas = np.resize(self.areas, capacity)
+            self.experience = np.resize(self.experience, capacity)
+        self.vectors[row] = vector
+        self.log_salaries[row] = math.log(salary)
+        self.areas[row] = area
+        self.experience[row] = experience
+        self.ids.append(vacancy_id)
+        self.order[vacancy_id] = None
+        return row
+
+    def remove(self, row: int) -> Optional[str]:
+        """Удалить строку, переставив на ее место последнюю; ID переставленной вакансии"""
+        last = len(self.ids) - 1
+        self.order.pop(self.ids[row], None)
+        moved = None
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.log_salaries[row] = self.log_salaries[last]
+            self.areas[row] = self.areas[last]
+            self.experience[row] = self.experience[last]
+            moved = self.ids[row] = self.ids[last]
+        self.ids.pop()
+        return moved
+
+
+class SalaryIndex:
+    """Индекс ближайших соседей по вакансиям с зарплатой, разбитый по профессиональной роли.
+
+    Сходство — косинус хешированных векторов текста плюс AREA_WEIGHT за
+    тот же регион и до EXPERIENCE_WEIGHT за близкий опыт; соседи ищутся
+    только среди вакансий той же роли, одним матричным умножением на
+    всю страницу. Индекс пополняется по мере сохранения вакансий
+    (замена строки при новой версии или зарплате), самые старые
+    вытесняются после capacity вакансий всего и role_capacity в роли —
+    полного переобучения нет.
+
+    Индекс живет в памяти процесса. ingest пополняет только индекс
+    воркера, сохранившего вакансию; остальные догоняют его через
+    SalaryIndexRefresher, поэтому оценки воркеров расходятся не дольше
+    чем на SALARY_INDEX_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, neighbors: int = SALARY_NEIGHBORS, capacity: int = SALARY_INDEX_SIZE, role_capacity: int = SALARY_ROLE_SIZE):
+        self.neighbors = neighbors
+        self.capacity = capacity
+        self.role_capacity = role_capacity
+        self._partitions: Dict[str, _Partition] = {}
+        # ID -> (роль, строка) и версия (зарплата, роль, регион, опыт, хеш текста) для пропуска неизменных
+        self._where: Dict[str, Tuple[str, int]] = {}
+        self._versions: "OrderedDict[str, Tuple]" = OrderedDict()
+        # Индекс пополняется из пула потоков
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def _remove(self, vacancy_id: str) -> None:
+        role, row = self._where.pop(vacancy_id)
+        self._versions.pop(vacancy_id, None)
+        partition = self._partitions[role]
+        moved = partition.remove(row)
+        if moved is not None:
+            self._where[moved] = (role, row)
+        if not len(partition):
+            del self._partitions[role]
+
+    def add_many(self, rows: List[Dict[str, Any]]) -> int:
+        """Добавить или обновить вакансии с зарплатой: vacancy_id, role_id, area_id,
+        experience_id, salary, content_hash, vector (или tokens и skills). Возвращает число измененных."""
+        changed = []
+        with self._lock:
+            for row in rows:
+                version = (row["salary"], row["role_id"], row["area_id"], row["experience_id"], row["content_hash"])
+                if self._versions.get(row["vacancy_id"]) != version:
+                    changed.append((row, version))
+        if not changed:
+            return 0
+        vectors = row_vectors([row for row, _ in changed])
+        with self._lock:
+            for (row, version), vector in zip(changed, vectors):
+                vacancy_id = row["vacancy_id"]
+                if vacancy_id in self._where:
+                    self._remove(vacancy_id)
+                partition = self._partitions.setdefault(row["role_id"], _Partition())
+                position = partition.append(
+                    vacancy_id, vector, row["salary"], _area_code(row["area_id"]), _experience_code(row["experience_id"])
+                )
+                self._where[vacancy_id] = (row["role_id"], position)
+                self._versions[vacancy_id] = version
+                if len(partition) > self.role_capacity:
+                    self._remove(next(iter(partition.order)))
+            while len(self._versions) > self.capacity:
+                self._remove(next(iter(self._versions)))
+        return len(changed)
+
+    def remove_many(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for vacancy_id in ids:
+                if vacancy_id in self._where:
+                    self._remove(vacancy_id)
+
+    def estimate_many(self, queries: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Оценки для вакансий без зарплаты: role_id, area_id, experience_id, vector (или tokens и skills).
+
+        Оценка — взвешенная сходством медиана логарифма зарплат соседей,
+        from/to — 25-й и 75-й перцентили. confidence от 0 до 1: среднее
+        сходство соседей, согласие их зарплат (узкий разброс) и полнота
+        набора соседей. None — у роли нет достаточно похожих вакансий.
+        """
+        estimates: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        if not queries:
+            return estimates
+        vectors = row_vectors(queries)
+        by_role: Dict[str, List[int]] = {}
+        for i, query in enumerate(queries):
+            by_role.setdefault(query.get("role_id") or "", []).append(i)
+
+        max_score = 1.0 + AREA_WEIGHT + EXPERIENCE_WEIGHT
+        with self._lock:
+            for role, positions in by_role.items():
+                partition = self._partitions.get(role)
+                if partition is None:
+                    continue
+                size = len(partition)
+                # (страница, вакансии роли): строки непрерывны для argpartition
+                similarity = np.ascontiguousarray((partition.vectors[:size] @ vectors[positions].T).T)
+                scores = similarity.copy()
+                # Прибавки зависят только от (регион, опыт) запроса — на странице их обычно пара вариантов
+                bonuses: Dict[Tuple[int, int], np.ndarray] = {}
+                for row_scores, i in zip(scores, positions):
+                    key = (_area_code(queries[i].get("area_id")), _experience_code(queries[i].get("experience_id")))
+                    if key not in bonuses:
+                        area, level = key
+                        bonus = _EXPERIENCE_BONUS[level + 1][partition.experience[:size] + 1]
+                        if area >= 0:
+                            bonus = bonus + np.where(partition.areas[:size] == area, np.float32(AREA_WEIGHT), np.float32(0.0))
+                        bonuses[key] = bonus
+                    row_scores += bonuses[key]
+                scores[similarity < SALARY_MIN_SIMILARITY] = 0.0
+
+                k = min(self.neighbors, size)
+                nearest = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < size else np.tile(np.arange(size), (len(positions), 1))
+                for row_scores, rows, i in zip(scores, nearest, positions):
+                    weights = row_scores[rows]
+                    found = weights > 0
+                    if not found.any():
+                        continue
+                    rows, weights = rows[found], weights[found]
+                    low, median, high = _weighted_quantiles(partition.log_salaries[rows], weights, (0.25, 0.5, 0.75))
+                    confidence = (
+                        float(weights.mean()) / max_score
+                        * math.exp(-(high - low))
+                        * len(rows) / self.neighbors
+                    )
+                    estimates[i] = {
+                        "from": int(round(math.exp(low), -3)),
+                        "to": int(round(math.exp(high), -3)),
+                        "value": int(round(math.exp(median), -3)),
+                        "confidence": round(min(confidence, 1.0), 3),
+                        "neighbors": len(rows),
+                    }
+        return estimates
+
+    def load(self, rows: List[Dict[str, Any]]) -> int:
+        """Восстановить индекс из таблицы, от старых вакансий к новым"""
+        return self.add_many(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "vacancies": len(self._versions),
+                "roles": len(self._partitions),
+                "bytes": sum(p.vectors.nbytes + p.log_salaries.nbytes + p.areas.nbytes + p.experience.nbytes for p in self._partitions.values()),
+            }
+
+
+def vacancy_query(item: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
+    """Запрос к индексу из элемента выдачи HH и его признаков"""
+    roles = item.get("professional_roles") or []
+    return {
+        "role_id": str(roles[0]["id"]) if roles else "",
+        "area_id": str((item.get("area") or {}).get("id") or "") or None,
+        "experience_id": (item.get("experience") or {}).get("id"),
+        "vector": features["vector"],
+    }
+
+
+def has_salary(item: Dict[str, Any]) -> bool:
+    salary = item.get("salary_range") or item.get("salary") or {}
+    return bool(salary.get("from") or salary.get("to"))
+
+
+def attach_salary_estimates(items: List[Dict[str, Any]], index: SalaryIndex) -> int:
+    """Добавить salary_estimate вакансиям страницы без зарплаты; признаки — из текста выдачи.
+
+    Оценка — месячный net в рублях, как salary_net_rub в хранилище.
+    Возвращает число оцененных вакансий.
+    """
+    pending = [item for item in items if item.get("id") and not has_salary(item)]
+    if not pending or not len(index):
+        return 0
+    features = extract_features(pending)
+    estimates = index.estimate_many([vacancy_query(item, row) for item, row in zip(pending, features)])
+    estimated = 0
+    for item, estimate in zip(pending, estimates):
+        if estimate is not None and estimate["confidence"] >= SALARY_MIN_CONFIDENCE:
+            item["salary_estimate"] = estimate
+            estimated += 1
+    return estimated
+
+
+class SalaryEstimateStore:
+    """Оценки зарплат в таблице salary_estimates и выборки вакансий для индекса."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _rows(self, condition: str, params: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        statement = text(f"""
+            SELECT v.id AS vacancy_id, COALESCE(v.professional_role_id, '') AS role_id, v.area_id, v.experience_id,
+                   v.salary_net_rub AS salary, f.content_hash, f.vector,
+                   CASE WHEN f.vector IS NULL THEN f.tokens END AS tokens,
+                   CASE WHEN f.vector IS NULL THEN f.skills END AS skills
+            FROM vacancies v JOIN vacancy_features f ON f.vacancy_id = v.id
+            WHERE {condition}
+            {"ORDER BY v.updated_at DESC LIMIT :limit" if limit else ""}
+        """).columns(tokens=JSON, skills=JSON)
+        if "ids" in params:
+            statement = statement.bindparams(bindparam("ids", expanding=True))
+        rows = [dict(row) for row in self.db.execute(statement, {**params, "limit": limit}).mappings()]
+        return rows[::-1] if limit else rows
+
+    def recent_salaried(self, limit: int) -> List[Dict[str, Any]]:
+        """Последние вакансии с зарплатой и признаками для индекса, от старых к новым"""
+        return self._rows("v.salary_net_rub > 0", {}, limit)
+
+    def changed_since(self, since: datetime) -> List[Dict[str, Any]]:
+        """Вакансии, у которых после since изменились данные или признаки"""
+        return self._rows(
+            "(v.updated_at >= :since OR f.computed_at >= :since)",
+            {"since": since}
+        )
+
+    def sync(self, index: SalaryIndex, since: datetime) -> Dict[str, int]:
+        """Применить к индексу изменения, сохраненные после since (в том числе другими воркерами)"""
+        rows = self.changed_since(since)
+        index.remove_many(row["vacancy_id"] for row in rows if not (row["salary"] and row["salary"] > 0))
+        indexed = index.add_many([row for row in rows if row["salary"] and row["salary"] > 0])
+        return {"changed": len(rows), "indexed": indexed}
+
+    def ingest(self, ids: List[str], index: SalaryIndex) -> Dict[str, int]:
+        """Вакансии с зарплатой — в индекс, остальным — сохранить оценку по индексу"""
+        if not ids:
+            return {"indexed": 0, "estimated": 0}
+        rows = self._rows("v.id IN :ids", {"ids": [str(vacancy_id) for vacancy_id in ids]})
+        salaried = [row for row in rows if row["salary"] and row["salary"] > 0]
+        unsalaried = [row for row in rows if not (row["salary"] and row["salary"] > 0)]
+        # Вакансия могла потерять зарплату в новой версии
+        index.remove_many(row["vacancy_id"] for row in unsalaried)
+        indexed = index.add_many(salaried)
+        estimates = index.estimate_many(unsalaried) if len(index) else []
+        self.save({row["vacancy_id"]: estimate for row, estimate in zip(unsalaried, estimates)})
+        return {"indexed": indexed, "estimated": sum(1 for estimate in estimates if estimate is not None)}
+
+    def save(self, estimates: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        """Записать оценки; вакансия без оценки теряет устаревшую"""
+        missing = [vacancy_id for vacancy_id, estimate in estimates.items() if estimate is None]
+        if missing:
+            self.db.execute(
+                text("DELETE FROM salary_estimates WHERE vacancy_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": missing}
+            )
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"vacancy_id": vacancy_id, "salary_from": e["from"], "salary_to": e["to"], "salary_value": e["value"],
+             "confidence": e["confidence"], "neighbors": e["neighbors"], "estimated_at": now}
+            for vacancy_id, e in estimates.items() if e is not None
+        ]
+        if rows:
+            self.db.execute(
+                text("""
+                INSERT INTO salary_estimates (vacancy_id, salary_from, salary_to, salary_value, confidence, neighbors, estimated_at)
+                VALUES (:vacancy_id, :salary_from, :salary_to, :salary_value, :confidence, :neighbors, :estimated_at)
+                ON CONFLICT (vacancy_id) DO UPDATE SET
+                    salary_from = EXCLUDED.salary_from,
+                    salary_to = EXCLUDED.salary_to,
+                    salary_value = EXCLUDED.salary_value,
+                    confidence = EXCLUDED.confidence,
+                    neighbors = EXCLUDED.neighbors,
+                    estimated_at = EXCLUDED.estimated_at
+                """),
+                rows
+            )
+        self.db.commit()
+
+    def get(self, vacancy_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            text("""
+            SELECT salary_from, salary_to, salary_value, confidence, neighbors, estimated_at
+            FROM salary_estimates WHERE vacancy_id = :id
+            """),
+            {"id": str(vacancy_id)}
+        ).mappings().fetchone()
+        return dict(row) if row else None
+
+
+class SalaryIndexRefresher:
+    """Загрузка индекса из таблицы и его догрузка изменениями раз в interval секунд."""
+
+    def __init__(self, session_factory, index: SalaryIndex, interval: int = SALARY_INDEX_REFRESH_INTERVAL):
+        self.session_factory = session_factory
+        self.index = index
+        self.interval = interval
+        self.since: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> Dict[str, int]:
+        """Первый вызов загружает последние вакансии с зарплатой, следующие — изменения с прошлого"""
+        with self._lock:
+            started = datetime.now(timezone.utc)
+            db = self.session_factory()
+            try:
+                store = SalaryEstimateStore(db)
+                if self.since is None:
+                    result = {"loaded": self.index.load(store.recent_salaried(self.index.capacity))}
+                else:
+                    result = store.sync(self.index, self.since)
+            finally:
+                db.close()
+            self.since = started - timedelta(seconds=SALARY_INDEX_REFRESH_OVERLAP)
+            return result
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                result = await run_in_threadpool(self.run_once)
+                if result.get("indexed"):
+                    logger.info(f"Salary index refresh: {result['indexed']} of {result['changed']} changed vacancies applied")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Salary index refresh failed: {e}")
+
+
+salary_index = SalaryIndex()
@@ -0,0 +1,225 @@
+"""Priority-lane, weighted-fair scheduler for outgoing HeadHunter API calls."""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.deadline import DeadlineExceeded, current_deadline
+from services.rate_limiter import TokenBucket
+
+# Полосы в порядке приоритета: пока есть ожидающие в старшей полосе,
+# младшие не получают квоту
+INTERACTIVE = "interactive"
+APPLY = "apply"
+MONITORING = "monitoring"
+BACKFILL = "backfill"
+LANES = (INTERACTIVE, APPLY, MONITORING, BACKFILL)
+
+
+class QuotaExceeded(Exception):
+    """Пользователь израсходовал дневную квоту фоновых вызовов HH."""
+
+
+@dataclass(order=True)
+class _Ticket:
+    finish_tag: float
+    seq: int
+    user_id: Optional[int] = field(compare=False)
+    cost: float = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class _Lane:
+    """Очередь полосы: weighted fair queuing по виртуальному времени окончания."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.heap: List[_Ticket] = []
+        self.virtual_time = 0.0
+        self.user_finish: Dict[Optional[int], float] = {}
+        self.granted = 0
+        self.waits: Deque[float] = deque(maxlen=1000)
+
+    def push(self, ticket_seq: int, user_id: Optional[int], cost: float, weight: float, future: asyncio.Future) -> None:
+        start = max(self.virtual_time, self.user_finish.get(user_id, 0.0))
+        finish_tag = start + cost / weight
+        self.user_finish[user_id] = finish_tag
+        heapq.heappush(self.heap, _Ticket(finish_tag, ticket_seq, user_id, cost, time.monotonic(), future))
+
+    def peek(self) -> Optional[_Ticket]:
+        # Отмененные ожидания (клиент ушел, истек бюджет) просто выбрасываем
+        while self.heap and self.heap[0].future.done():
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def pop(self) -> _Ticket:
+        ticket = heapq.heappop(self.heap)
+        self.virtual_time = ticket.finish_tag
+        if len(self.user_finish) > 10000:
+            self.user_finish = {u: f for u, f in self.user_finish.items() if f > self.virtual_time}
+        return ticket
+
+    def record_grant(self, waited: float) -> None:
+        self.granted += 1
+        self.waits.append(waited)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        queued = [t for t in self.heap if not t.future.done()]
+        return {
+            "queued": len(queued),
+            "queued_users": len({t.user_id for t in queued}),
+            "granted": self.granted,
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p99": percentile(0.99),
+        }
+
+
+class QuotaLedger:
+    """Суточный учет вызовов HH по пользователям и полосам."""
+
+    def __init__(self, daily_quota: float):
+        self.daily_quota = daily_quota
+        self.day = date.today()
+        self.usage: Dict[Optional[int], Dict[str, float]] = {}
+
+    def _rollover(self) -> None:
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.usage = {}
+
+    def check(self, user_id: Optional[int], lane: str, cost: float) -> None:
+        """Интерактивные вызовы не ограничиваются — квота только на фоновые"""
+        self._rollover()
+        if user_id is None or lane == INTERACTIVE or not self.daily_quota:
+            return
+        used = sum(v for k, v in self.usage.get(user_id, {}).items() if k != INTERACTIVE)
+        if used + cost > self.daily_quota:
+            raise QuotaExceeded(f"User {user_id} exhausted daily background HH quota ({self.daily_quota:.0f})")
+
+    def charge(self, user_id: Optional[int], lane: str, cost: float) -> None:
+        self._rollover()
+        lanes = self.usage.setdefault(user_id, {})
+        lanes[lane] = lanes.get(lane, 0.0) + cost
+
+    def top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        totals = sorted(
+            ((user_id, sum(lanes.values()), lanes) for user_id, lanes in self.usage.items() if user_id is not None),
+            key=lambda row: row[1],
+            reverse=True,
+        )
+        return [{"user_id": user_id, "total": total, "lanes": lanes} for user_id, total, lanes in totals[:limit]]
+
+
+class UpstreamScheduler:
+    """Общий бюджет вызовов HH, распределяемый по полосам и пользователям.
+
+    Между полосами — строгий приоритет: interactive > apply > monitoring >
+    backfill, поэтому фоновые задачи забирают только свободную квоту.
+    Внутри полосы — weighted fair queuing: пользователь с сотней
+    запросов в очереди не задерживает того, у кого один запрос.
+    Если очередь пуста и токен есть, вызов проходит сразу, без диспетчера.
+    """
+
+    def __init__(
+        self,
+        rate: float = float(os.getenv("HH_GLOBAL_RPS", "20")),
+        burst: float = float(os.getenv("HH_GLOBAL_BURST", "40")),
+        user_daily_quota: float = float(os.getenv("HH_USER_DAILY_QUOTA", "5000"))
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.lanes: Dict[str, _Lane] = {name: _Lane(name) for name in LANES}
+        self.ledger = QuotaLedger(user_daily_quota)
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _queued_ahead(self, lane: str) -> bool:
+        for name in LANES:
+            if self.lanes[name].peek() is not None:
+                return True
+            if name == lane:
+                return False
+        return False
+
+    def _ensure_dispatcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher is None or self._dispatcher.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def acquire(self, lane: str = INTERACTIVE, user_id: Optional[int] = None, cost: float = 1.0, weight: float = 1.0) -> None:
+        """Дождаться разрешения на вызов HH (с учетом бюджета запроса)"""
+        self.ledger.check(user_id, lane, cost)
+        if not self._queued_ahead(lane) and not self.bucket.try_acquire(cost):
+            self._grant(lane, user_id, cost, 0.0)
+            return
+
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        self.lanes[lane].push(next(self._seq), user_id, cost, weight, future)
+        self._wakeup.set()
+
+        deadline = current_deadline()
+        try:
+            await asyncio.wait_for(future, deadline.remaining() if deadline is not None else None)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Request deadline exceeded while queued for HH ({lane})")
+
+    def _grant(self, lane: str, user_id: Optional[int], cost: float, waited: float) -> None:
+        self.lanes[lane].record_grant(waited)
+        self.ledger.charge(user_id, lane, cost)
+
+    def _next_ticket(self) -> Optional[Tuple[_Lane, _Ticket]]:
+        for name in LANES:
+            ticket = self.lanes[name].peek()
+            if ticket is not None:
+                return self.lanes[name], ticket
+        return None
+
+    async def _dispatch(self) -> None:
+        while True:
+            head = self._next_ticket()
+            if head is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            lane, ticket = head
+            wait = self.bucket.try_acquire(ticket.cost)
+            if wait:
+                # После паузы голова очереди пересчитывается: могла прийти
+                # заявка из более приоритетной полосы
+                await asyncio.sleep(wait)
+                continue
+            lane.pop()
+            if ticket.future.done():
+                self.bucket.refund(ticket.cost)
+                continue
+            self._grant(lane.name, ticket.user_id, ticket.cost, time.monotonic() - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        self.bucket._refill()
+        return {
+            "tokens_available": round(self.bucket.tokens, 2),
+            "rate": self.bucket.rate,
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+            "top_users_today": self.ledger.top_users(),
+        }
+
+
+scheduler = UpstreamScheduler()
@@ -0,0 +1,62 @@
+"""Field projection for API responses built from HH payloads."""
+
+from typing import Any, Dict, List, Optional
+
+# Ключи ответа поиска, которые не относятся к отдельным вакансиям и
+# возвращаются всегда, независимо от fields=
+META_KEYS = {
+    "found", "pages", "page", "per_page", "offset", "next_cursor", "streams", "snapshot", "arguments",
+    "smart_search_applied", "professional_roles_used", "ranking_applied", "fanout_applied", "stale", "filtered_out", "backfilled",
+    "salary_estimated", "employer_filter_unchecked",
+}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Разобрать fields=id,name,salary.from,employer.name в дерево путей.
+
+    Лист дерева — None, что означает «взять значение целиком».
+    """
+    if not fields:
+        return None
+    tree: Dict[str, Any] = {}
+    for path in fields.split(","):
+        parts = [part for part in path.strip().split(".") if part]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is None:
+                # Родитель уже запрошен целиком
+                break
+            node = node.setdefault(part, child)
+        else:
+            node[parts[-1]] = None
+    return tree or None
+
+
+def _project(value: Any, tree: Dict[str, Any]) -> Any:
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, subtree in tree.items():
+        if key in value:
+            result[key] = value[key] if subtree is None else _project(value[key], subtree)
+    return result
+
+
+def project_items(items: List[Dict[str, Any]], tree: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if tree is None:
+        return items
+    return [_project(item, tree) for item in items]
+
+
+def project_search_response(data: Dict[str, Any], tree: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Оставить в каждой вакансии только запрошенные поля, метаданные — как есть"""
+    if tree is None:
+        return data
+    result = {key: value for key, value in data.items() if key in META_KEYS}
+    result["items"] = project_items(data.get("items", []), tree)
+    return result
@@ -0,0 +1,311 @@
+"""Skill demand index: weekly skill counts of vacancies per (role, area), top-k and trends."""
+
+import asyncio
+import heapq
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import JSON, DateTime, bindparam, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from services.analytics import ALL_SKILLS, VACANCY_LOCKS, RollupDeltas, lock_sources, week_start
+from services.deadline import clear_deadline
+
+# Публикация на HH живет 30 дней: более старая вакансия уже не спрос, а история
+VACANCY_LIFETIME_DAYS = int(os.getenv("VACANCY_LIFETIME_DAYS", "30"))
+# Сколько недель истории навыков хранить; более старые строки skill_rollups удаляются
+SKILL_DEMAND_WEEKS = int(os.getenv("SKILL_DEMAND_WEEKS", "52"))
+# Вес недели в рейтинге навыков убывает вдвое за столько недель
+SKILL_DEMAND_HALF_LIFE = float(os.getenv("SKILL_DEMAND_HALF_LIFE", "4"))
+# Навык с меньшим числом вакансий за последние недели не попадает в растущие: шум
+SKILL_TREND_MIN_COUNT = int(os.getenv("SKILL_TREND_MIN_COUNT", "5"))
+SKILL_DEMAND_MAINTENANCE_INTERVAL = int(os.getenv("SKILL_DEMAND_MAINTENANCE_INTERVAL", "3600"))
+BATCH_SIZE = 1000
+_SKILL_LENGTH = 100
+
+Contribution = Optional[Tuple[Tuple[str, str, date], FrozenSet[str], bool]]
+
+
+def skill_contribution(vacancy: Optional[Mapping[str, Any]], skills: Optional[Iterable[str]]) -> Contribution:
+    """Ключ skill_rollups, навыки и активность, которые вакансия вносит в счетчики; None — не вносит.
+
+    Считаются вакансии с известной датой публикации и уже посчитанными
+    признаками (vacancy_features); архивная остается в истории недели,
+    но не в счетчике active.
+    """
+    if vacancy is None or skills is None or not vacancy.get("published_at"):
+        return None
+    key = (
+        vacancy.get("professional_role_id") or "",
+        vacancy.get("area_id") or "",
+        week_start(vacancy["published_at"]),
+    )
+    names = frozenset(skill[:_SKILL_LENGTH] for skill in skills if skill and skill != ALL_SKILLS)
+    return key, names, not vacancy.get("archived")
+
+
+def track_skill_change(deltas: RollupDeltas, before: Contribution, after: Contribution) -> None:
+    """Перенести вклад вакансии в счетчики навыков из before в after"""
+    if before == after:
+        return
+    if before is not None:
+        deltas.add_skills(*before, sign=-1)
+    if after is not None:
+        deltas.add_skills(*after)
+
+
+def stored_skills(db: Session, ids: List[str]) -> Dict[str, List[str]]:
+    """Навыки из vacancy_features; у вакансий без признаков записи нет"""
+    return {
+        row[0]: row[1] or [] for row in db.execute(
+            text("SELECT vacancy_id, skills FROM vacancy_features WHERE vacancy_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)).columns(skills=JSON),
+            {"ids": ids}
+        ).fetchall()
+    }
+
+
+def stored_vacancies(db: Session, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Поля вакансий, от которых зависит ключ skill_rollups"""
+    return {
+        row["id"]: dict(row) for row in db.execute(
+            text("""
+            SELECT id, professional_role_id, area_id, published_at, archived
+            FROM vacancies WHERE id IN :ids
+            """).bindparams(bindparam("ids", expanding=True)).columns(published_at=DateTime(timezone=True)),
+            {"ids": ids}
+        ).mappings()
+    }
+
+
+def expire_vacancies(db: Session, ids: Optional[List[str]] = None) -> int:
+    """Пометить вакансии архивными и вычесть их навыки из счетчиков active.
+
+    ids — вакансии, которые HH отдал как архивные; без ids истекают все
+    опубликованные раньше VACANCY_LIFETIME_DAYS назад (HH снимает их сам,
+    продленная вакансия вернется с новой датой при следующем сохранении).
+    """
+    params: Dict[str, Any] = {"limit": BATCH_SIZE}
+    if ids is not None:
+        condition = "v.id IN :ids"
+        params["ids"] = [str(vacancy_id) for vacancy_id in ids]
+    else:
+        condition = "v.published_at < :cutoff"
+        params["cutoff"] = datetime.now(timezone.utc) - timedelta(days=VACANCY_LIFETIME_DAYS)
+    candidates = text(f"SELECT v.id FROM vacancies v WHERE v.archived = false AND {condition} LIMIT :limit")
+    # Состояние перечитывается под блокировкой: параллельное сохранение могло его изменить
+    locked = text(f"""
+        SELECT v.id, v.professional_role_id, v.area_id, v.published_at, v.archived, f.skills
+        FROM vacancies v LEFT JOIN vacancy_features f ON f.vacancy_id = v.id
+        WHERE v.archived = false AND v.id IN :batch AND {condition}
+    """).bindparams(bindparam("batch", expanding=True)).columns(published_at=DateTime(timezone=True), skills=JSON)
+    if ids is not None:
+        candidates = candidates.bindparams(bindparam("ids", expanding=True))
+        locked = locked.bindparams(bindparam("ids", expanding=True))
+
+    expired = 0
+    while True:
+        batch = [row[0] for row in db.execute(candidates, params).fetchall()]
+        if not batch:
+            break
+        lock_sources(db, VACANCY_LOCKS, batch)
+        rows = db.execute(locked, {**params, "batch": batch}).mappings().fetchall()
+        deltas = RollupDeltas()
+        for row in rows:
+            track_skill_change(
+                deltas,
+                skill_contribution(row, row["skills"]),
+                skill_contribution({**row, "archived": True}, row["skills"])
+            )
+        if rows:
+            db.execute(
+                text("UPDATE vacancies SET archived = true, updated_at = CURRENT_TIMESTAMP WHERE id IN :ids")
+                .bindparams(bindparam("ids", expanding=True)),
+                {"ids": [row["id"] for row in rows]}
+            )
+        deltas.apply(db)
+        db.commit()
+        expired += len(rows)
+        if len(batch) < BATCH_SIZE:
+            break
+    return expired
+
+
+def prune_skill_rollups(db: Session) -> int:
+    """Удалить недели старше SKILL_DEMAND_WEEKS и обнулившиеся счетчики"""
+    result = db.execute(
+        text("DELETE FROM skill_rollups WHERE week < :since OR count <= 0"),
+        {"since": week_start(None) - timedelta(weeks=SKILL_DEMAND_WEEKS)}
+    )
+    db.commit()
+    return result.rowcount
+
+
+def rebuild_skill_rollups(db: Session) -> int:
+    """Пересчитать skill_rollups с нуля (после смены извлечения навыков). Возвращает число вакансий."""
+    db.execute(text("DELETE FROM skill_rollups"))
+    counted, last_id = 0, ""
+    while True:
+        rows = db.execute(
+            text("""
+            SELECT v.id, v.professional_role_id, v.area_id, v.published_at, v.archived, f.skills
+            FROM vacancies v JOIN vacancy_features f ON f.vacancy_id = v.id
+            WHERE v.id > :last_id
+            ORDER BY v.id
+            LIMIT :limit
+            """).columns(published_at=DateTime(timezone=True), skills=JSON),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).mappings().fetchall()
+        if not rows:
+            break
+        deltas = RollupDeltas()
+        for row in rows:
+            track_skill_change(deltas, None, skill_contribution(row, row["skills"]))
+        deltas.apply(db)
+        counted += len(rows)
+        last_id = rows[-1]["id"]
+    db.commit()
+    return counted
+
+
+class SkillDemandService:
+    """Топ навыков и их динамика только из skill_rollups: объем не зависит от числа вакансий."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_top_skills(
+        self,
+        role_ids: Optional[List[str]] = None,
+        area_id: Optional[str] = None,
+        weeks: int = 12,
+        limit: int = 20,
+        sort: str = "demand",
+        half_life: float = SKILL_DEMAND_HALF_LIFE
+    ) -> Dict[str, Any]:
+        """Навыки по востребованности (sort=demand) или по росту доли (sort=trend).
+
+        active и share — открытые сейчас вакансии с навыком и их доля среди
+        открытых вакансий с навыками; по ним строится топ. weekly — сколько
+        вакансий с навыком опубликовано за каждую неделю окна, score — доля
+        за окно с весом недели, убывающим вдвое за half_life недель, trend —
+        изменение доли за вторую половину окна против первой.
+        """
+        current = week_start(None)
+        since = current - timedelta(weeks=weeks - 1)
+        conditions = ["week >= :since"]
+        params: Dict[str, Any] = {"since": since}
+        if role_ids:
+            conditions.append("role_id IN :role_ids")
+            params["role_ids"] = list(role_ids)
+        if area_id:
+            conditions.append("area_id = :area_id")
+            params["area_id"] = str(area_id)
+        statement = text(f"""
+            SELECT week, skill, SUM(count), SUM(active) FROM skill_rollups
+            WHERE {' AND '.join(conditions)}
+            GROUP BY week, skill
+        """)
+        if role_ids:
+            statement = statement.bindparams(bindparam("role_ids", expanding=True))
+
+        week_index = {since + timedelta(weeks=i): i for i in range(weeks)}
+        weekly: Dict[str, List[int]] = defaultdict(lambda: [0] * weeks)
+        active: Dict[str, int] = defaultdict(int)
+        scores: Dict[str, float] = defaultdict(float)
+        for week, skill, count, open_count in self.db.execute(statement, params).fetchall():
+            week = week if isinstance(week, date) else date.fromisoformat(week)
+            if week not in week_index:
+                continue
+            weekly[skill][week_index[week]] += count or 0
+            active[skill] += open_count or 0
+            scores[skill] += (count or 0) * 0.5 ** ((current - week).days / 7 / half_life)
+
+        totals = weekly.pop(ALL_SKILLS, [0] * weeks)
+        active_total = active.pop(ALL_SKILLS, 0)
+        score_total = scores.pop(ALL_SKILLS, 0.0)
+        split = weeks // 2
+        recent_total, previous_total = sum(totals[split:]), sum(totals[:split])
+
+        def trend(series: List[int]) -> Optional[float]:
+            if not recent_total or not previous_total:
+                return None
+            return sum(series[split:]) / recent_total - sum(series[:split]) / previous_total
+
+        if sort == "trend":
+            candidates = [skill for skill, series in weekly.items() if sum(series[split:]) >= SKILL_TREND_MIN_COUNT]
+            top = heapq.nlargest(limit, candidates, key=lambda skill: trend(weekly[skill]) or 0.0)
+        else:
+            top = heapq.nlargest(limit, weekly, key=lambda skill: (active[skill], scores[skill]))
+
+        skills = []
+        for skill in top:
+            series = weekly[skill]
+            change = trend(series)
+            skills.append({
+                "skill": skill,
+                "active": active[skill],
+                "share": round(active[skill] / active_total, 4) if active_total else None,
+                "vacancies": sum(series),
+                "score": round(scores[skill] / score_total, 4) if score_total else None,
+                "trend": round(change, 4) if change is not None else None,
+                "weekly": series,
+            })
+        return {
+            "weeks": [str(week) for week in week_index],
+            "active_vacancies": active_total,
+            "vacancies": sum(totals),
+            "weekly_vacancies": totals,
+            "skills": skills,
+        }
+
+
+class SkillDemandMaintenance:
+    """Фоновое истечение старых вакансий и чистка skill_rollups раз в interval секунд."""
+
+    def __init__(self, session_factory, interval: int = SKILL_DEMAND_MAINTENANCE_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> Dict[str, int]:
+        clear_deadline()
+        db = self.session_factory()
+        try:
+            return {"expired": expire_vacancies(db), "pruned": prune_skill_rollups(db)}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                result = await run_in_threadpool(self.run_once)
+                if any(result.values()):
+                    logger.info(f"Skill demand maintenance: {result['expired']} vacancies expired, {result['pruned']} rollup rows pruned")
+                delay = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Skill demand maintenance failed: {e}")
+                delay = 300
+            await asyncio.sleep(delay)
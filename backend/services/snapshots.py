@@ -0,0 +1,177 @@
+"""Server-side search result snapshots for consistent deep pagination."""
+
+import asyncio
+import base64
+import os
+import secrets
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from services.cache import Cache
+from services.fanout_search import CursorExpired, InvalidCursor
+from services.hh_client import HHClient
+
+# HH отдает не больше 2000 вакансий на один запрос
+HH_MAX_DEPTH = 2000
+HH_PAGE_SIZE = 100
+
+SNAPSHOT_TTL = int(os.getenv("SEARCH_SNAPSHOT_TTL", "900"))
+# Сколько вакансий захватывается первым запросом (страницы по 100 параллельно)
+SNAPSHOT_WINDOW = int(os.getenv("SEARCH_SNAPSHOT_WINDOW", "500"))
+
+
+class SnapshotExpired(CursorExpired):
+    """Снимок выдачи истек — поиск нужно начать заново."""
+
+
+def encode_cursor(snapshot_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{snapshot_id}.{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        snapshot_id, _, offset = base64.urlsafe_b64decode(padded).decode().rpartition(".")
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not snapshot_id or offset < 0:
+        raise InvalidCursor("Malformed cursor")
+    return snapshot_id, offset
+
+
+def pack_snapshot(meta: Dict[str, Any], ids: List[int]) -> bytes:
+    """Заголовок JSON и упакованные uint32 ID: 4 байта на вакансию"""
+    return orjson.dumps(meta) + b"\n" + array("I", ids).tobytes()
+
+
+def unpack_snapshot(body: bytes) -> Tuple[Dict[str, Any], List[int]]:
+    header, _, packed = body.partition(b"\n")
+    ids = array("I")
+    ids.frombytes(packed)
+    return orjson.loads(header), ids.tolist()
+
+
+class SearchSnapshots:
+    """Снимки упорядоченного списка ID выдачи HH.
+
+    Первый запрос фиксирует порядок вакансий и кладет каждую в кеш в том
+    виде, в каком она пришла в выдаче HH (сниппет поиска); следующие
+    страницы читаются по курсору из снимка, без запроса к HH, и все
+    вакансии на них одной формы.
+    Если пользователь листает дальше захваченного окна, снимок дописывается
+    следующими страницами HH, причем уже выданные ID не повторяются.
+    """
+
+    def __init__(self, cache: Cache, ttl: int = SNAPSHOT_TTL, window: int = SNAPSHOT_WINDOW):
+        self.cache = cache
+        self.ttl = ttl
+        self.window = min(window, HH_MAX_DEPTH)
+
+    async def search(
+        self,
+        hh_client: HHClient,
+        owner: str,
+        filters: Dict[str, Any],
+        per_page: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Страница выдачи из снимка; без курсора снимок создается.
+
+        owner — ключ пользователя и фильтров: курсор чужого поиска не принимается.
+        """
+        if cursor:
+            snapshot_id, offset = decode_cursor(cursor)
+            meta, ids = await self._load(snapshot_id)
+            if meta["owner"] != owner:
+                raise InvalidCursor("Cursor does not match current search")
+        else:
+            snapshot_id, offset = secrets.token_urlsafe(9), 0
+            meta, ids = {"owner": owner, "found": 0, "pages": 0, "complete": False, "created_at": time.time()}, []
+
+        if offset + per_page > len(ids) and not meta["complete"]:
+            meta, ids = await self._extend(hh_client, snapshot_id, meta, ids, filters, offset + per_page)
+
+        page_ids = ids[offset:offset + per_page]
+        next_offset = offset + len(page_ids)
+        has_more = next_offset < len(ids) or not meta["complete"]
+        return {
+            "items": await self._items(page_ids),
+            "found": meta["found"],
+            "per_page": per_page,
+            "offset": offset,
+            "next_cursor": encode_cursor(snapshot_id, next_offset) if page_ids and has_more else None,
+            "snapshot": {
+                "id": snapshot_id,
+                "size": len(ids),
+                "complete": meta["complete"],
+                "created_at": meta["created_at"],
+            },
+        }
+
+    async def _load(self, snapshot_id: str) -> Tuple[Dict[str, Any], List[int]]:
+        entry = await self.cache.get(f"snapshot:{snapshot_id}")
+        if entry is None:
+            raise SnapshotExpired("Search snapshot expired, start the search again")
+        return unpack_snapshot(entry.body)
+
+    async def _extend(
+        self,
+        hh_client: HHClient,
+        snapshot_id: str,
+        meta: Dict[str, Any],
+        ids: List[int],
+        filters: Dict[str, Any],
+        needed: int
+    ) -> Tuple[Dict[str, Any], List[int]]:
+        """Дописать в снимок страницы HH, пока не наберется needed ID"""
+        target = min(max(needed, len(ids) + self.window), HH_MAX_DEPTH)
+        first_page = meta["pages"]
+        last_page = (target + HH_PAGE_SIZE - 1) // HH_PAGE_SIZE
+        if meta["found"]:
+            last_page = min(last_page, (min(meta["found"], HH_MAX_DEPTH) + HH_PAGE_SIZE - 1) // HH_PAGE_SIZE)
+
+        responses = await asyncio.gather(*(
+            hh_client.search_vacancies(**filters, page=page, per_page=HH_PAGE_SIZE)
+            for page in range(first_page, max(last_page, first_page + 1))
+        ))
+
+        seen = set(ids)
+        details: Dict[str, bytes] = {}
+        for response in responses:
+            for item in response.get("items", []):
+                vacancy_id = int(item["id"])
+                if vacancy_id in seen:
+                    continue
+                seen.add(vacancy_id)
+                ids.append(vacancy_id)
+                details[f"snapshot_item:{vacancy_id}"] = orjson.dumps(item)
+
+        found = responses[0].get("found", 0) if responses else meta["found"]
+        pages = first_page + len(responses)
+        meta = {
+            **meta,
+            "found": found,
+            "pages": pages,
+            "complete": pages * HH_PAGE_SIZE >= min(found, HH_MAX_DEPTH) or not details,
+        }
+        # Вакансии живут не меньше самого снимка
+        await self.cache.set_many(details, self.ttl)
+        remaining = self.ttl - (time.time() - meta["created_at"])
+        await self.cache.set(f"snapshot:{snapshot_id}", pack_snapshot(meta, ids), max(1, int(remaining)))
+        return meta, ids
+
+    async def _items(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """Вакансии страницы из кеша в форме выдачи поиска.
+
+        Вытесненную вакансию не подменить деталями из /vacancies/{id} — у них
+        другая форма, а сниппет отдельно не запросить, поэтому снимок считается
+        истекшим.
+        """
+        entries = await self.cache.get_many([f"snapshot_item:{vacancy_id}" for vacancy_id in ids])
+        if any(entry is None for entry in entries):
+            raise SnapshotExpired("Search snapshot expired, start the search again")
+        return [orjson.loads(entry.body) for entry in entries]
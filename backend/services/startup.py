@@ -0,0 +1,129 @@
+"""Startup warm-up phases and the readiness state behind /health/ready."""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Прогрев не должен задерживать старт дольше этого: что не успело — догреется на запросах
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", "10"))
+# Не принимать трафик, пока схема БД отстает от alembic head
+REQUIRE_SCHEMA_HEAD = os.getenv("REQUIRE_SCHEMA_HEAD", "true").lower() == "true"
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "1"))
+
+_script_head: Optional[str] = None
+
+
+def check_schema(engine) -> Dict[str, Any]:
+    """Ревизия БД против head из alembic/versions"""
+    global _script_head
+    if _script_head is None:
+        config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+        config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+        _script_head = ScriptDirectory.from_config(config).get_current_head()
+    with engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    return {"current": current, "head": _script_head, "ok": current == _script_head}
+
+
+class StartupState:
+    """Результаты фаз прогрева и признак готовности принимать трафик.
+
+    Фазы идут параллельно и ограничены STARTUP_WARMUP_TIMEOUT. Готовность
+    ждет только их; упавший прогрев не мешает — догреется на первых запросах,
+    обязательны только доступная БД и актуальная схема. Фоновые фазы (HH,
+    индексы из БД) готовность не задерживают: пока они идут, запросы
+    обслуживаются без них, а /health/ready показывает их как running.
+    """
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.warmed = False
+        self.warmed_after: Optional[float] = None
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.schema: Optional[Dict[str, Any]] = None
+        self._background: List[asyncio.Task] = []
+
+    async def _phase(self, name: str, factory: Callable[[], Awaitable[Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            result = await factory()
+        except Exception as e:
+            self.phases[name] = {"ok": False, "ms": round((time.perf_counter() - started) * 1000, 1), "error": f"{type(e).__name__}: {e}"}
+            logger.warning(f"Startup phase {name} failed: {type(e).__name__}: {e}")
+            return
+        self.phases[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1), "result": result}
+
+    async def _background_phase(self, name: str, factory: Callable[[], Awaitable[Any]]) -> None:
+        await self._phase(name, factory)
+        phase = self.phases[name]
+        logger.info(f"Startup background phase {name} finished in {phase['ms']:.0f} ms{'' if phase['ok'] else ' FAILED'}")
+
+    async def warm_up(
+        self,
+        phases: Dict[str, Callable[[], Awaitable[Any]]],
+        background: Optional[Dict[str, Callable[[], Awaitable[Any]]]] = None,
+        timeout: float = STARTUP_WARMUP_TIMEOUT
+    ) -> None:
+        started = time.perf_counter()
+        for name, factory in (background or {}).items():
+            self.phases[name] = {"ok": None, "running": True}
+            self._background.append(asyncio.ensure_future(self._background_phase(name, factory)))
+        tasks = [asyncio.ensure_future(self._phase(name, factory)) for name, factory in phases.items()]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for name in phases:
+            self.phases.setdefault(name, {"ok": False, "ms": round(timeout * 1000, 1), "error": "timeout"})
+        self.warmed = True
+        self.warmed_after = time.perf_counter() - self.created_at
+        logger.info(
+            f"Startup warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms "
+            f"({self.warmed_after * 1000:.0f} ms since app import): "
+            + ", ".join(f"{name} {self.phases[name]['ms']:.0f} ms{'' if self.phases[name]['ok'] else ' FAILED'}" for name in phases)
+        )
+
+    async def stop(self) -> None:
+        """Отменить незавершенные фоновые фазы при остановке"""
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background.clear()
+
+    async def check_schema(self, engine) -> Dict[str, Any]:
+        # Успешная проверка запоминается; иначе повторяется на каждом readiness
+        if self.schema is None or not self.schema["ok"]:
+            self.schema = await run_in_threadpool(check_schema, engine)
+        return self.schema
+
+    async def verify_schema(self, engine) -> str:
+        """Фаза прогрева: ошибка, если миграции не накатаны"""
+        schema = await self.check_schema(engine)
+        if not schema["ok"]:
+            raise RuntimeError(f"Database schema is at {schema['current']}, expected {schema['head']}; run alembic upgrade head")
+        return schema["current"]
+
+    async def readiness(self, engine, ping: Callable[[], None]) -> Tuple[bool, Dict[str, Any]]:
+        """Готов ли процесс принимать трафик и почему нет"""
+        if not self.warmed:
+            return False, {"status": "starting"}
+        try:
+            await asyncio.wait_for(run_in_threadpool(ping), READINESS_DB_TIMEOUT)
+        except Exception as e:
+            return False, {"status": "unavailable", "database": f"{type(e).__name__}: {e}"}
+        if REQUIRE_SCHEMA_HEAD:
+            schema = await self.check_schema(engine)
+            if not schema["ok"]:
+                return False, {"status": "schema_outdated", "schema": schema}
+        return True, {"status": "ready", "warmed_after_ms": round(self.warmed_after * 1000, 1)}
+
+
+startup = StartupState()
@@ -0,0 +1,357 @@
+"""Vacancy text features computed once per vacancy version: plain text, lemmas, skills."""
+
+import hashlib
+import html
+import multiprocessing
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import orjson
+from sqlalchemy import JSON, bindparam, text
+from sqlalchemy.orm import Session
+
+from services.analytics import VACANCY_LOCKS, RollupDeltas, lock_sources
+from services.skill_demand import skill_contribution, stored_vacancies, track_skill_change
+
+try:
+    import pymorphy3
+except ImportError:  # без pymorphy3 русские слова приводятся к основе отсечением окончаний
+    pymorphy3 = None
+
+# Меняется вместе с алгоритмом: все признаки пересчитаются при следующем сохранении
+FEATURES_VERSION = 3
+# Процессы для больших пачек; 0 — считать в вызывающем потоке (по умолчанию на одном ядре)
+FEATURES_PROCESSES = int(os.getenv("FEATURES_PROCESSES", str((os.cpu_count() or 1) // 2)))
+# Пачки меньше этой не стоят пересылки в другой процесс
+FEATURES_POOL_MIN_BATCH = int(os.getenv("FEATURES_POOL_MIN_BATCH", "200"))
+FEATURES_CHUNK_SIZE = 100
+# Хешированный вектор текста (для оценки зарплат по соседям): размерность и вес навыка
+VECTOR_DIM = 128
+VECTOR_SKILL_WEIGHT = 3.0
+
+# Признаки из полного описания не заменяются признаками из сниппета выдачи
+SOURCE_PRIORITY = {"search": 0, "detail": 1}
+
+# Слова вместе с c++, c#, .net, node.js и составными через дефис
+TOKEN_RE = re.compile(r"\.?[\w+#]+(?:[.-][\w+#]+)*")
+_BLOCK_TAG = re.compile(r"<\s*(?:br|/p|/li|/ul|/ol|/h\d|/div)\b[^>]*>", re.IGNORECASE)
+_LIST_ITEM = re.compile(r"<\s*li\b[^>]*>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"[ \t\r\f\v\u00a0]+")
+_CYRILLIC = re.compile(r"[а-яё]")
+
+STOP_WORDS = frozenset("""
+и в во не на с со по к ко о об от до из за для при без над под про или но а же ли бы то это как что
+так также все всё наш ваш мы вы их его ее её она он они быть будет будут есть был была
+the and or of to in on for with at by from an be is are as we you our your will
+""".split())
+
+# Навыки, которые ищутся в тексте: вариант написания -> каноническое имя.
+# Сравнение идет по леммам, так что "активных продаж" найдет "активные продажи"
+SKILL_ALIASES = {
+    "python": "Python", "django": "Django", "flask": "Flask", "fastapi": "FastAPI",
+    "java": "Java", "kotlin": "Kotlin", "spring": "Spring", "scala": "Scala",
+    "javascript": "JavaScript", "js": "JavaScript", "typescript": "TypeScript", "ts": "TypeScript",
+    "react": "React", "vue": "Vue.js", "vue.js": "Vue.js", "angular": "Angular", "node.js": "Node.js", "nodejs": "Node.js",
+    "go": "Go", "golang": "Go", "rust": "Rust", "c++": "C++", "c#": "C#", ".net": ".NET", "php": "PHP",
+    "laravel": "Laravel", "ruby": "Ruby", "swift": "Swift", "1с": "1С",
+    "sql": "SQL", "postgresql": "PostgreSQL", "postgres": "PostgreSQL", "mysql": "MySQL", "oracle": "Oracle",
+    "mongodb": "MongoDB", "redis": "Redis", "clickhouse": "ClickHouse", "elasticsearch": "Elasticsearch",
+    "kafka": "Kafka", "rabbitmq": "RabbitMQ", "celery": "Celery",
+    "docker": "Docker", "kubernetes": "Kubernetes", "k8s": "Kubernetes", "linux": "Linux", "git": "Git",
+    "ansible": "Ansible", "terraform": "Terraform", "aws": "AWS", "nginx": "Nginx",
+    "ci cd": "CI/CD", "rest": "REST", "graphql": "GraphQL", "grpc": "gRPC",
+    "pandas": "Pandas", "numpy": "NumPy", "pytorch": "PyTorch", "tensorflow": "TensorFlow",
+    "machine learning": "Machine Learning", "машинное обучение": "Machine Learning",
+    "excel": "Excel", "power bi": "Power BI", "tableau": "Tableau", "figma": "Figma",
+    "photoshop": "Photoshop", "jira": "Jira", "confluence": "Confluence", "agile": "Agile", "scrum": "Scrum",
+    "английский язык": "Английский язык", "english": "Английский язык",
+    "водительское удостоверение": "Водительское удостоверение",
+    "продажи": "Продажи", "активные продажи": "Активные продажи", "crm": "CRM",
+    "бухгалтерский учет": "Бухгалтерский учет", "налоговый учет": "Налоговый учет",
+}
+_MAX_ALIAS_WORDS = max(len(alias.split()) for alias in SKILL_ALIASES)
+
+# Окончания для стемминга без словаря, от длинных к коротким
+_ENDINGS = tuple(sorted("""
+иями ями ами ого его ому ему ыми ими ых их ой ей ий ый ые ие ая яя ое ее ую юю ом ем ам ям ах ях ов ев
+ость ости ние ния нию нием ать ять ить еть ует уют ет ют ит ат ят ы и а я о е у ю ь
+""".split(), key=len, reverse=True))
+
+_analyzer = None
+
+
+def clean_html(value: Optional[str]) -> str:
+    """HTML описания в простой текст: блоки — по строкам, сущности раскрыты, пробелы схлопнуты"""
+    if not value:
+        return ""
+    value = _LIST_ITEM.sub("\n", _BLOCK_TAG.sub("\n", value))
+    value = html.unescape(_TAG.sub(" ", value))
+    lines = (_SPACES.sub(" ", line).strip() for line in value.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+@lru_cache(maxsize=200000)
+def lemma(word: str) -> str:
+    """Нормальная форма русского слова (pymorphy3) или его основа; прочие слова как есть"""
+    if not _CYRILLIC.search(word):
+        return word
+    if pymorphy3 is None:
+        return _stem(word)
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = pymorphy3.MorphAnalyzer()
+    return _analyzer.parse(word)[0].normal_form
+
+
+def vacancy_source(item: Dict[str, Any]) -> Tuple[str, str]:
+    """(источник, исходный текст): полное описание из карточки или сниппет из выдачи"""
+    if item.get("description"):
+        return "detail", item["description"]
+    snippet = item.get("snippet") or {}
+    return "search", "\n".join(filter(None, [snippet.get("requirement"), snippet.get("responsibility")]))
+
+
+def content_hash(item: Dict[str, Any]) -> str:
+    """Хеш того, из чего считаются признаки: меняется только с новой версией вакансии"""
+    _, body = vacancy_source(item)
+    key_skills = sorted(skill.get("name", "") for skill in item.get("key_skills") or [])
+    return hashlib.sha256(orjson.dumps([FEATURES_VERSION, item.get("name"), body, key_skills])).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def _lemma_aliases() -> Dict[str, str]:
+    return {" ".join(lemma(word) for word in alias.split()): skill for alias, skill in SKILL_ALIASES.items()}
+
+
+def extract_skills(lemmas: List[str], key_skills: List[str]) -> List[str]:
+    """Навыки: key_skills вакансии плюс известные навыки, найденные в лемматизированном тексте"""
+    aliases = _lemma_aliases()
+    # key_skills приводятся к тем же каноническим именам, что и найденные в тексте
+    found: Dict[str, None] = {
+        SKILL_ALIASES.get(name.strip().lower(), name.strip()): None for name in key_skills if name and name.strip()
+    }
+    known = {name.lower() for name in found}
+    for size in range(1, _MAX_ALIAS_WORDS + 1):
+        for i in range(len(lemmas) - size + 1):
+            skill = aliases.get(" ".join(lemmas[i:i + size]))
+            if skill is not None and skill.lower() not in known:
+                found[skill] = None
+                known.add(skill.lower())
+    return list(found)
+
+
+@lru_cache(maxsize=200000)
+def _bucket(token: str) -> int:
+    """Корзина токена в хешированном векторе + 1, со знаком токена"""
+    value = zlib.crc32(token.encode())
+    return -(value % VECTOR_DIM + 1) if value & 0x80000000 else value % VECTOR_DIM + 1
+
+
+def hashed_vectors(docs: List[Tuple[Iterable[str], Iterable[str]]]) -> np.ndarray:
+    """Нормированные векторы (len(docs), VECTOR_DIM) float32 из пар (токены, навыки).
+
+    Feature hashing со знаком: без словаря и без обучения, так что вектор
+    одной вакансии не зависит от остальных. Значение корзины сжимается
+    как log(1 + tf), навыки добавляются с весом VECTOR_SKILL_WEIGHT.
+    """
+    tokens = [doc_tokens if isinstance(doc_tokens, list) else list(doc_tokens) for doc_tokens, _ in docs]
+    skills = [[f"skill:{skill.lower()}" for skill in doc_skills] for _, doc_skills in docs]
+    vectors = np.zeros((len(docs), VECTOR_DIM), dtype=np.float32)
+    for lists, weight in ((tokens, 1.0), (skills, VECTOR_SKILL_WEIGHT)):
+        lengths = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+        if not lengths.sum():
+            continue
+        hashed = np.fromiter(map(_bucket, chain.from_iterable(lists)), dtype=np.int64, count=int(lengths.sum()))
+        cells = np.repeat(np.arange(len(lists)), lengths) * VECTOR_DIM + np.abs(hashed) - 1
+        counts = np.bincount(cells, weights=np.sign(hashed), minlength=vectors.size).reshape(vectors.shape)
+        vectors += (weight * np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def unpack_vector(packed: Optional[bytes]) -> Optional[np.ndarray]:
+    """Вектор из колонки vector (float16); None — не посчитан или другой размерности"""
+    if not packed or len(packed) != VECTOR_DIM * 2:
+        return None
+    return np.frombuffer(packed, dtype=np.float16).astype(np.float32)
+
+
+def extract_features(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Признаки пачки вакансий; чистая функция, выполняется и в процессах пула"""
+    rows = []
+    for item in items:
+        source, body = vacancy_source(item)
+        plain = clean_html("\n".join(filter(None, [item.get("name"), body])))
+        words = [word for word in TOKEN_RE.findall(plain.lower()) if len(word) > 1]
+        lemmas = [lemma(word) for word in words]
+        rows.append({
+            "vacancy_id": str(item["id"]),
+            "content_hash": item.get("content_hash") or content_hash(item),
+            "source": source,
+            "text": plain,
+            "tokens": [token for word, token in zip(words, lemmas) if word not in STOP_WORDS],
+            "skills": extract_skills(lemmas, [skill.get("name", "") for skill in item.get("key_skills") or []]),
+        })
+    vectors = hashed_vectors([(row["tokens"], row["skills"]) for row in rows]).astype(np.float16)
+    for row, vector in zip(rows, vectors):
+        row["vector"] = vector.tobytes()
+    return rows
+
+
+def _feature_input(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Только нужные для признаков поля: в процесс пула уходит меньше данных"""
+    return {
+        "id": item["id"],
+        "name": item.get("name"),
+        "description": item.get("description"),
+        "snippet": item.get("snippet"),
+        "key_skills": item.get("key_skills"),
+        "content_hash": item.get("content_hash"),
+    }
+
+
+class FeatureExtractor:
+    """Расчет признаков: маленькие пачки — в вызывающем потоке, большие — в пуле процессов.
+
+    Лемматизация pymorphy3 — чистый Python и держит GIL, поэтому пачки
+    от FEATURES_POOL_MIN_BATCH вакансий делятся на части и считаются
+    в отдельных процессах. Процессы стартуют через spawn: форк
+    многопоточного процесса приложения небезопасен.
+    """
+
+    def __init__(self, processes: int = FEATURES_PROCESSES, min_batch: int = FEATURES_POOL_MIN_BATCH):
+        self.processes = processes
+        self.min_batch = min_batch
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def compute(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        inputs = [_feature_input(item) for item in items]
+        if self.processes <= 0 or len(inputs) < self.min_batch:
+            return extract_features(inputs)
+        chunks = [inputs[i:i + FEATURES_CHUNK_SIZE] for i in range(0, len(inputs), FEATURES_CHUNK_SIZE)]
+        return [row for rows in self._get_pool().map(extract_features, chunks) for row in rows]
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class FeatureStore:
+    """Признаки вакансий в таблице vacancy_features, по одной строке на вакансию."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _stored(self, ids: List[str]) -> Dict[str, Tuple[str, str, List[str]]]:
+        return {
+            row[0]: (row[1], row[2], row[3] or []) for row in self.db.execute(
+                text("SELECT vacancy_id, content_hash, source, skills FROM vacancy_features WHERE vacancy_id IN :ids")
+                .bindparams(bindparam("ids", expanding=True)).columns(skills=JSON),
+                {"ids": ids}
+            ).fetchall()
+        }
+
+    def _drop_processed(self, pending: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Убрать из pending вакансии, чья версия уже посчитана (или посчитана по лучшему источнику).
+
+        Возвращает сохраненные навыки остальных вакансий, у которых признаки уже есть.
+        """
+        previous_skills: Dict[str, List[str]] = {}
+        for vacancy_id, (stored_hash, stored_source, skills) in self._stored(list(pending)).items():
+            item = pending[vacancy_id]
+            source, _ = vacancy_source(item)
+            if stored_hash == item["content_hash"] or SOURCE_PRIORITY[source] < SOURCE_PRIORITY.get(stored_source, 0):
+                del pending[vacancy_id]
+            else:
+                previous_skills[vacancy_id] = skills
+        return previous_skills
+
+    def ingest(self, items: List[Dict[str, Any]], extractor: "FeatureExtractor") -> int:
+        """Посчитать и сохранить признаки вакансий, чья версия еще не обработана. Возвращает число пересчитанных."""
+        pending: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            if item.get("id"):
+                pending[str(item["id"])] = {**item, "content_hash": content_hash(item)}
+        if not pending:
+            return 0
+        self._drop_processed(pending)
+        if not pending:
+            return 0
+
+        rows = extractor.compute(list(pending.values()))
+        # Признаки считаются без блокировки; перед записью сохраненное состояние
+        # перечитывается под блокировкой вакансий, чтобы навыки не учлись дважды
+        lock_sources(self.db, VACANCY_LOCKS, pending)
+        previous_skills = self._drop_processed(pending)
+        rows = [row for row in rows if row["vacancy_id"] in pending]
+        if not rows:
+            self.db.commit()
+            return 0
+
+        # Новые навыки сразу заменяют старые в счетчиках спроса (для уже сохраненных вакансий)
+        vacancies = stored_vacancies(self.db, list(pending))
+        deltas = RollupDeltas()
+        for row in rows:
+            vacancy = vacancies.get(row["vacancy_id"])
+            track_skill_change(
+                deltas,
+                skill_contribution(vacancy, previous_skills.get(row["vacancy_id"])),
+                skill_contribution(vacancy, row["skills"])
+            )
+        now = datetime.now(timezone.utc)
+        self.db.execute(
+            text("""
+            INSERT INTO vacancy_features (vacancy_id, content_hash, source, text, tokens, skills, vector, computed_at)
+            VALUES (:vacancy_id, :content_hash, :source, :text, :tokens, :skills, :vector, :computed_at)
+            ON CONFLICT (vacancy_id) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash,
+                source = EXCLUDED.source,
+                text = EXCLUDED.text,
+                tokens = EXCLUDED.tokens,
+                skills = EXCLUDED.skills,
+                vector = EXCLUDED.vector,
+                computed_at = EXCLUDED.computed_at
+            """).bindparams(bindparam("tokens", type_=JSON), bindparam("skills", type_=JSON)),
+            [{**row, "computed_at": now} for row in rows]
+        )
+        deltas.apply(self.db)
+        self.db.commit()
+        return len(rows)
+
+    def get_many(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Готовые признаки по ID вакансий; для необработанных записей нет"""
+        if not ids:
+            return {}
+        rows = self.db.execute(
+            text("""
+            SELECT vacancy_id, content_hash, source, text, tokens, skills, computed_at
+            FROM vacancy_features WHERE vacancy_id IN :ids
+            """).bindparams(bindparam("ids", expanding=True)).columns(tokens=JSON, skills=JSON),
+            {"ids": [str(vacancy_id) for vacancy_id in ids]}
+        ).mappings().fetchall()
+        return {row["vacancy_id"]: dict(row) for row in rows}
+
+
+feature_extractor = FeatureExtractor()
@@ -0,0 +1,130 @@
+"""Context-local timing spans rendered as a Server-Timing header."""
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# off — выключено; header — по заголовку запроса X-Debug-Timing: 1; always — всегда
+SERVER_TIMING_MODE = os.getenv("SERVER_TIMING", "header")
+DEBUG_HEADER = b"x-debug-timing"
+
+
+class Timings:
+    """Фазы одного запроса: одноименные спаны суммируются, считается число вызовов."""
+
+    __slots__ = ("started_at", "phases", "marks")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}
+        self.marks: Dict[str, str] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            phase[0] += seconds
+            phase[1] += 1
+
+    def header(self) -> str:
+        parts = []
+        for name, (seconds, count) in self.phases.items():
+            part = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                part += f';desc="x{int(count)}"'
+            parts.append(part)
+        parts.extend(f'{name};desc="{value}"' for name, value in self.marks.items())
+        parts.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "phases": {name: {"ms": round(seconds * 1000, 2), "count": int(count)} for name, (seconds, count) in self.phases.items()},
+            "marks": dict(self.marks),
+            "total_ms": round((time.perf_counter() - self.started_at) * 1000, 2),
+        }
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+class _Span:
+    __slots__ = ("timings", "name", "started")
+
+    def __init__(self, timings: Timings, name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.timings.add(self.name, time.perf_counter() - self.started)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Замерить фазу; вне замеряемого запроса — общая заглушка без аллокаций"""
+    timings = _current.get()
+    return _NOOP if timings is None else _Span(timings, name)
+
+
+def mark(name: str, value: str) -> None:
+    """Отметка без длительности, например cache=hit"""
+    timings = _current.get()
+    if timings is not None:
+        timings.marks[name] = value
+
+
+class ServerTimingMiddleware:
+    """Добавляет Server-Timing в ответ и пишет структурированную запись о фазах запроса."""
+
+    def __init__(self, app, mode: str = SERVER_TIMING_MODE):
+        self.app = app
+        self.mode = mode
+
+    def _enabled(self, scope) -> bool:
+        if self.mode == "always":
+            return True
+        if self.mode != "header":
+            return False
+        return any(key.lower() == DEBUG_HEADER and value == b"1" for key, value in scope.get("headers", []))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._enabled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _current.set(timings)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers: List[Tuple[bytes, bytes]] = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+                logger.bind(timing=timings.as_dict(), path=scope["path"], status=message["status"]).info(
+                    f"Timing {scope['method']} {scope['path']}: {timings.header()}"
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -6,6 +6,13 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import Optional, Dict, Any
+from loguru import logger
+
+from services.deadline import DeadlineExceeded, current_deadline, remaining_budget
+from services.timing import span
+
+# Обновление токена — лишний запрос в hh.ru; без этого запаса бюджета не начинаем
+TOKEN_REFRESH_MIN_BUDGET = float(os.getenv("TOKEN_REFRESH_MIN_BUDGET", "1.5"))
 
 class TokenService:
     """Service for managing HH OAuth tokens with automatic refresh."""
@@ -20,17 +27,18 @@ class TokenService:
         """Get valid access token for user, refreshing if needed."""
         
         # Get user's current token from database
-        result = self.db.execute(
-            text("""
-            SELECT ut.access_token, ut.refresh_token, ut.expires_at 
-            FROM user_tokens ut 
-            JOIN users u ON ut.user_id = u.id 
-            WHERE u.id = :user_id 
-            ORDER BY ut.created_at DESC 
-            LIMIT 1
-            """),
-            {"user_id": user_id}
-        ).fetchone()
+        with span("token"):
+            result = self.db.execute(
+                text("""
+                SELECT ut.access_token, ut.refresh_token, ut.expires_at 
+                FROM user_tokens ut 
+                JOIN users u ON ut.user_id = u.id 
+                WHERE u.id = :user_id 
+                ORDER BY ut.created_at DESC 
+                LIMIT 1
+                """),
+                {"user_id": user_id}
+            ).fetchone()
         
         if not result:
             return None
@@ -42,12 +50,18 @@ class TokenService:
         if expires_at and expires_at > now + timedelta(minutes=5):
             return access_token
             
-        # Token expired, try to refresh
-        new_token_data = await self._refresh_token(refresh_token)
-        if new_token_data:
-            # Update token in database
-            await self._update_user_token(user_id, new_token_data)
-            return new_token_data["access_token"]
+        # Token expired, try to refresh if the request budget allows it.
+        # Нехватка бюджета — не истекшая авторизация: None здесь разлогинил бы пользователя
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() < TOKEN_REFRESH_MIN_BUDGET:
+            logger.warning(f"Skipping token refresh for user {user_id}: request budget nearly exhausted")
+            raise DeadlineExceeded(f"Not enough request budget left to refresh the HH token ({deadline.remaining():.2f}s)")
+        with span("token_refresh"):
+            new_token_data = await self._refresh_token(refresh_token)
+            if new_token_data:
+                # Update token in database
+                await self._update_user_token(user_id, new_token_data)
+                return new_token_data["access_token"]
             
         return None
     
@@ -103,13 +117,13 @@ class TokenService:
             
         except Exception as e:
             self.db.rollback()
-            print(f"Error saving tokens: {e}")
+            logger.error(f"Error saving tokens: {e}")
             return False
     
     async def _refresh_token(self, refresh_token: str) -> Optional[Dict[str, Any]]:
         """Refresh access token using refresh token."""
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(timeout=remaining_budget(10.0)) as client:
                 response = await client.post(
                     self.refresh_url,
                     data={
@@ -124,11 +138,11 @@ class TokenService:
                 if response.status_code == 200:
                     return response.json()
                 else:
-                    print(f"Token refresh failed: {response.status_code} - {response.text}")
+                    logger.warning(f"Token refresh failed: {response.status_code}")
                     return None
                     
         except Exception as e:
-            print(f"Error refreshing token: {e}")
+            logger.error(f"Error refreshing token: {e}")
             return None
     
     async def _update_user_token(self, user_id: int, token_data: Dict[str, Any]) -> None:
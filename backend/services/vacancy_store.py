@@ -0,0 +1,303 @@
+"""Local vacancy and negotiation stores with incremental rollup maintenance."""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import JSON, DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from services.analytics import NEGOTIATION_LOCKS, VACANCY_LOCKS, RollupDeltas, lock_sources, week_start
+from services.currency import as_int, currency_rates
+from services.dedup import duplicate_index, minhash_many, vacancy_text
+from services.salary_estimate import SALARY_MIN_CONFIDENCE
+from services.skill_demand import skill_contribution, stored_skills, track_skill_change
+
+
+def parse_hh_datetime(value: Optional[str]) -> Optional[datetime]:
+    """HH отдает даты в формате 2024-01-15T10:00:00+0300"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")
+    except ValueError:
+        return None
+
+
+def _payload(raw: Any) -> Optional[Dict[str, Any]]:
+    """Сохраненная выдача HH; ранние версии записывали в JSON-колонку строку с JSON"""
+    return json.loads(raw) if isinstance(raw, str) else raw
+
+
+def vacancy_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Плоская строка таблицы vacancies из элемента выдачи HH"""
+    salary = item.get("salary") or {}
+    employer = item.get("employer") or {}
+    area = item.get("area") or {}
+    roles = item.get("professional_roles") or []
+    return {
+        "id": str(item["id"]),
+        "name": (item.get("name") or "")[:512],
+        "employer_id": str(employer["id"]) if employer.get("id") else None,
+        "employer_name": employer.get("name"),
+        "area_id": str(area["id"]) if area.get("id") else None,
+        "area_name": area.get("name"),
+        "professional_role_id": str(roles[0]["id"]) if roles else None,
+        "experience_id": (item.get("experience") or {}).get("id"),
+        "salary_from": salary.get("from"),
+        "salary_to": salary.get("to"),
+        "salary_currency": salary.get("currency"),
+        "salary_gross": salary.get("gross"),
+        "published_at": parse_hh_datetime(item.get("published_at")),
+        "archived": bool(item.get("archived")),
+        "raw": item,
+    }
+
+
+def rollup_contribution(row: Optional[Dict[str, Any]]) -> Optional[Tuple[Tuple[str, str, str, Any], Optional[float]]]:
+    """Ключ rollup-таблицы и зарплата, которые вакансия вносит в агрегаты; None — не вносит.
+
+    Вакансия без даты публикации не относится ни к одной неделе
+    (как и в rebuild_vacancy_rollups и skill_rollups).
+    """
+    if row is None or not row.get("published_at"):
+        return None
+    key = (
+        row.get("professional_role_id") or "",
+        row.get("area_id") or "",
+        row.get("experience_id") or "",
+        week_start(row.get("published_at")),
+    )
+    return key, row.get("salary_net_rub")
+
+
+class VacancyStore:
+    """Хранилище вакансий; каждое изменение сразу отражается в rollup-таблицах (включая навыки)."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def upsert_many(self, items: List[Dict[str, Any]]) -> int:
+        """Сохранить пачку вакансий. Возвращает число новых."""
+        rows = {}
+        salaries = {}
+        texts = {}
+        for item in items:
+            if item.get("id"):
+                row = vacancy_row(item)
+                rows[row["id"]] = row
+                salaries[row["id"]] = item.get("salary_range") or item.get("salary")
+                texts[row["id"]] = vacancy_text(item)
+        if not rows:
+            return 0
+
+        # MinHash-сигнатуры всей пачкой; индекс дубликатов пополняется сразу
+        signatures, valid = minhash_many(list(texts.values()))
+        clusters = duplicate_index.add_many(list(rows), signatures, valid)
+        for i, row in enumerate(rows.values()):
+            row["minhash"] = signatures[i].tobytes() if valid[i] else None
+            row["cluster_id"] = clusters[row["id"]]
+
+        # Нормализация зарплат всей пачкой за один векторный проход
+        lower, upper, value = currency_rates.normalize(list(salaries.values()))
+        for i, row in enumerate(rows.values()):
+            row["salary_net_rub_from"] = as_int(lower[i])
+            row["salary_net_rub_to"] = as_int(upper[i])
+            row["salary_net_rub"] = as_int(value[i])
+
+        # До чтения старых строк: иначе параллельное сохранение тех же вакансий применит дельты дважды
+        lock_sources(self.db, VACANCY_LOCKS, rows)
+        existing = {
+            row["id"]: dict(row) for row in self.db.execute(
+                text("""
+                SELECT id, professional_role_id, area_id, experience_id, published_at, salary_net_rub, archived
+                FROM vacancies WHERE id IN :ids
+                """).bindparams(bindparam("ids", expanding=True)).columns(published_at=DateTime(timezone=True)),
+                {"ids": list(rows)}
+            ).mappings()
+        }
+
+        # Навыки уже посчитанных версий: смена роли, региона или архивация переносит их в счетчиках
+        skills = stored_skills(self.db, list(rows))
+
+        deltas = RollupDeltas()
+        for vacancy_id, row in rows.items():
+            old = existing.get(vacancy_id)
+            track_skill_change(
+                deltas,
+                skill_contribution(old, skills.get(vacancy_id)),
+                skill_contribution(row, skills.get(vacancy_id))
+            )
+            before, after = rollup_contribution(old), rollup_contribution(row)
+            if before == after:
+                continue
+            if before is not None:
+                deltas.add_vacancy(*before, sign=-1)
+            if after is not None:
+                deltas.add_vacancy(*after)
+
+        self.db.execute(
+            text("""
+            INSERT INTO vacancies (
+                id, name, employer_id, employer_name, area_id, area_name, professional_role_id,
+                experience_id, salary_from, salary_to, salary_currency, salary_gross,
+                salary_net_rub_from, salary_net_rub_to, salary_net_rub, published_at, archived, raw,
+                minhash, cluster_id
+            ) VALUES (
+                :id, :name, :employer_id, :employer_name, :area_id, :area_name, :professional_role_id,
+                :experience_id, :salary_from, :salary_to, :salary_currency, :salary_gross,
+                :salary_net_rub_from, :salary_net_rub_to, :salary_net_rub, :published_at, :archived, :raw,
+                :minhash, :cluster_id
+            )
+            ON CONFLICT (id) DO UPDATE SET
+                name = EXCLUDED.name,
+                employer_id = EXCLUDED.employer_id,
+                employer_name = EXCLUDED.employer_name,
+                area_id = EXCLUDED.area_id,
+                area_name = EXCLUDED.area_name,
+                professional_role_id = EXCLUDED.professional_role_id,
+                experience_id = EXCLUDED.experience_id,
+                salary_from = EXCLUDED.salary_from,
+                salary_to = EXCLUDED.salary_to,
+                salary_currency = EXCLUDED.salary_currency,
+                salary_gross = EXCLUDED.salary_gross,
+                salary_net_rub_from = EXCLUDED.salary_net_rub_from,
+                salary_net_rub_to = EXCLUDED.salary_net_rub_to,
+                salary_net_rub = EXCLUDED.salary_net_rub,
+                published_at = EXCLUDED.published_at,
+                archived = EXCLUDED.archived,
+                raw = EXCLUDED.raw,
+                minhash = EXCLUDED.minhash,
+                cluster_id = EXCLUDED.cluster_id,
+                updated_at = CURRENT_TIMESTAMP
+            """).bindparams(bindparam("raw", type_=JSON)),
+            list(rows.values())
+        )
+        deltas.apply(self.db)
+        self.db.commit()
+        return len(rows) - len(existing)
+
+    def search(
+        self,
+        filters: Dict[str, Any],
+        professional_roles: Optional[List[str]] = None,
+        page: int = 0,
+        per_page: int = 20
+    ) -> Dict[str, Any]:
+        """Поиск по локальной копии в формате выдачи HH — запасной путь, пока HH недоступен"""
+        conditions = ["archived = false"]
+        params: Dict[str, Any] = {"limit": per_page, "offset": page * per_page}
+        if filters.get("text"):
+            conditions.append("LOWER(name) LIKE :text")
+            params["text"] = f"%{filters['text'].lower()}%"
+        if filters.get("area"):
+            conditions.append("area_id = :area")
+            params["area"] = str(filters["area"])
+        if filters.get("experience"):
+            conditions.append("experience_id = :experience")
+            params["experience"] = filters["experience"]
+        if filters.get("salary"):
+            # Вакансии без вилки проходят фильтр по достаточно уверенной оценке зарплаты
+            conditions.append("""(salary_net_rub_to >= :salary OR (salary_net_rub IS NULL AND id IN (
+                SELECT vacancy_id FROM salary_estimates WHERE salary_to >= :salary AND confidence >= :min_confidence
+            )))""")
+            params["salary"] = filters["salary"]
+            params["min_confidence"] = SALARY_MIN_CONFIDENCE
+        query = f"SELECT raw FROM vacancies WHERE {' AND '.join(conditions)}"
+        if professional_roles:
+            query += " AND professional_role_id IN :roles"
+            params["roles"] = list(professional_roles)
+
+        statement = text(f"{query} ORDER BY published_at DESC LIMIT :limit OFFSET :offset")
+        count_statement = text(query.replace("SELECT raw", "SELECT COUNT(*)", 1))
+        if professional_roles:
+            statement = statement.bindparams(bindparam("roles", expanding=True))
+            count_statement = count_statement.bindparams(bindparam("roles", expanding=True))
+
+        items = [_payload(row[0]) for row in self.db.execute(statement.columns(raw=JSON), params).fetchall()]
+        found = self.db.execute(count_statement, params).scalar() or 0
+        return {
+            "items": items,
+            "found": found,
+            "pages": (found + per_page - 1) // per_page,
+            "page": page,
+            "per_page": per_page,
+        }
+
+    def recent_signatures(self, limit: int) -> List[Tuple[str, bytes, Optional[str]]]:
+        """Сигнатуры последних вакансий для индекса дубликатов, от старых к новым"""
+        rows = self.db.execute(
+            text("""
+            SELECT id, minhash, cluster_id FROM vacancies
+            WHERE minhash IS NOT NULL AND archived = false
+            ORDER BY created_at DESC
+            LIMIT :limit
+            """),
+            {"limit": limit}
+        ).fetchall()
+        return [(row[0], bytes(row[1]), row[2]) for row in reversed(rows)]
+
+    def get_raw(self, vacancy_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            text("SELECT raw FROM vacancies WHERE id = :id").columns(raw=JSON), {"id": str(vacancy_id)}
+        ).fetchone()
+        return _payload(row[0]) if row else None
+
+
+class NegotiationStore:
+    """Локальная копия откликов пользователя для статистики ответов работодателей."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def upsert_many(self, user_id: int, items: List[Dict[str, Any]]) -> None:
+        rows = {}
+        for item in items:
+            if not item.get("id"):
+                continue
+            state = item.get("state")
+            rows[str(item["id"])] = {
+                "id": str(item["id"]),
+                "user_id": user_id,
+                "vacancy_id": str((item.get("vacancy") or {}).get("id") or "") or None,
+                "resume_id": str((item.get("resume") or {}).get("id") or "") or None,
+                "state": (state.get("id") if isinstance(state, dict) else state) or "response",
+                "created_at": parse_hh_datetime(item.get("created_at")) or datetime.now(timezone.utc),
+            }
+        if not rows:
+            return
+
+        lock_sources(self.db, NEGOTIATION_LOCKS, rows)
+        existing = {
+            row[0]: (row[1], row[2]) for row in self.db.execute(
+                text("SELECT id, state, created_at FROM negotiations WHERE id IN :ids")
+                .bindparams(bindparam("ids", expanding=True))
+                .columns(created_at=DateTime(timezone=True)),
+                {"ids": list(rows)}
+            ).fetchall()
+        }
+
+        deltas = RollupDeltas()
+        for negotiation_id, row in rows.items():
+            old = existing.get(negotiation_id)
+            if old is not None:
+                old_state, created_at = old
+                if old_state == row["state"]:
+                    continue
+                # Отклик остается в неделе создания, меняется только состояние
+                row["created_at"] = created_at
+                deltas.add_negotiation(user_id, week_start(created_at), old_state, sign=-1)
+            deltas.add_negotiation(user_id, week_start(row["created_at"]), row["state"])
+
+        self.db.execute(
+            text("""
+            INSERT INTO negotiations (id, user_id, vacancy_id, resume_id, state, created_at)
+            VALUES (:id, :user_id, :vacancy_id, :resume_id, :state, :created_at)
+            ON CONFLICT (id) DO UPDATE SET
+                state = EXCLUDED.state,
+                updated_at = CURRENT_TIMESTAMP
+            """),
+            list(rows.values())
+        )
+        deltas.apply(self.db)
+        self.db.commit()
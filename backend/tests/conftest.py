@@ -0,0 +1,58 @@
+"""Общие фикстуры: временная SQLite-база со схемой из миграций Alembic.
+
+DATABASE_URL задается до импорта модулей приложения: database.py создает
+engine при импорте. SQL только для PostgreSQL (SKIP LOCKED, make_interval,
+date_trunc) на SQLite не выполняется, поэтому claim_batch, take_stale и
+rebuild_vacancy_rollups тестами не покрыты.
+"""
+
+import os
+import tempfile
+from datetime import datetime, timezone
+
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="jobhunter-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ["APPLY_WORKER_ENABLED"] = "false"
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def engine():
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    command.upgrade(config, "head")
+    engine = create_engine(os.environ["DATABASE_URL"])
+
+    @event.listens_for(engine, "connect")
+    def register_now(connection, _):
+        # NOW() из PostgreSQL: запросы очереди откликов пишут им applied_at
+        connection.create_function("NOW", 0, lambda: datetime.now(timezone.utc).isoformat(" "))
+
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # Каждый тест начинает с пустых таблиц
+    metadata = MetaData()
+    metadata.reflect(engine)
+    with engine.begin() as connection:
+        for table in reversed(metadata.sorted_tables):
+            if table.name != "alembic_version":
+                connection.execute(table.delete())
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
@@ -0,0 +1,262 @@
+"""Очередь автооткликов: постановка в очередь, исходы отправки и переходы статусов."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from services.apply_queue import ApplyQueueService, ApplyWorker
+from services.hh_client import HHClient, HHUnavailable
+from services.rate_limiter import RateLimiter
+from services.token_service import TokenService
+
+
+@pytest.fixture
+def worker(session_factory):
+    worker = ApplyWorker(session_factory, limiter=RateLimiter(1000, 1000, 1000, 1000))
+    worker.max_attempts = 3
+    return worker
+
+
+@pytest.fixture
+def queue(db):
+    return ApplyQueueService(db)
+
+
+def _claim(db, vacancy_id, attempts=1):
+    """То, что делает claim_batch (на SQLite его SQL не выполнить): запись в работе"""
+    db.execute(
+        text("""
+        UPDATE apply_queue SET status = 'in_progress', locked_at = CURRENT_TIMESTAMP, attempts = :attempts
+        WHERE vacancy_id = :vacancy_id
+        """),
+        {"vacancy_id": vacancy_id, "attempts": attempts}
+    )
+    db.commit()
+    return _row(db, vacancy_id)
+
+
+def _row(db, vacancy_id):
+    row = db.execute(
+        text("""
+        SELECT id, user_id, resume_id, vacancy_id, message, status, attempts, last_error, negotiation_id, next_attempt_at
+        FROM apply_queue WHERE vacancy_id = :vacancy_id
+        """),
+        {"vacancy_id": vacancy_id}
+    ).mappings().fetchone()
+    return dict(row)
+
+
+def _next_attempt(row):
+    return datetime.fromisoformat(row["next_attempt_at"])
+
+
+def _status_error(status, errors=()):
+    request = httpx.Request("POST", "https://api.hh.ru/negotiations")
+    response = httpx.Response(
+        status, json={"errors": [{"type": "negotiations", "value": value} for value in errors]}, request=request
+    )
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def test_enqueue_returns_only_inserted_ids(queue):
+    first = queue.enqueue(1, "r1", ["1", "2", "2"])
+    assert first["queued_ids"] == ["1", "2"]
+    assert (first["queued"], first["duplicates"], first["near_duplicates"]) == (2, 1, 0)
+
+    second = queue.enqueue(1, "r1", ["2", "3"])
+    assert second["queued_ids"] == ["3"]
+    assert second["duplicates"] == 1
+
+
+def test_enqueue_skips_near_duplicates(db, queue):
+    db.execute(
+        text("INSERT INTO vacancies (id, name, cluster_id) VALUES (:id, :name, :cluster_id)"),
+        [
+            {"id": "10", "name": "Python developer", "cluster_id": "10"},
+            {"id": "11", "name": "Python developer", "cluster_id": "10"},
+            {"id": "12", "name": "Go developer", "cluster_id": "12"},
+        ]
+    )
+    db.commit()
+
+    result = queue.enqueue(1, "r1", ["10", "11", "12"])
+    assert result["queued_ids"] == ["10", "12"]
+    assert result["near_duplicates"] == 1
+
+    # Кластер уже в очереди: перепост не ставится и с другим резюме
+    again = queue.enqueue(1, "r2", ["11"])
+    assert again["queued_ids"] == []
+    assert again["near_duplicates"] == 1
+
+    # Без skip_near_duplicates кластеры не учитываются
+    assert queue.enqueue(1, "r2", ["11"], skip_near_duplicates=False)["queued_ids"] == ["11"]
+
+
+def test_mark_verify_keeps_attempts(db, queue):
+    queue.enqueue(1, "r1", ["1"])
+    item = _claim(db, "1", attempts=2)
+    queue.mark_verify(item["id"], "ReadTimeout")
+    row = _row(db, "1")
+    assert (row["status"], row["attempts"], row["last_error"]) == ("verify", 2, "ReadTimeout")
+
+
+def test_release_refunds_uncounted_attempt(db, queue):
+    queue.enqueue(1, "r1", ["1", "2"])
+    counted = _claim(db, "1", attempts=2)
+    refunded = _claim(db, "2", attempts=2)
+    queue.release(counted["id"], 60, "HTTP 429")
+    queue.release(refunded["id"], 60, count_attempt=False)
+
+    assert (_row(db, "1")["status"], _row(db, "1")["attempts"]) == ("pending", 2)
+    assert _row(db, "1")["last_error"] == "HTTP 429"
+    assert (_row(db, "2")["status"], _row(db, "2")["attempts"]) == ("pending", 1)
+    assert _next_attempt(_row(db, "1")) > datetime.now(timezone.utc) + timedelta(seconds=50)
+
+
+@pytest.mark.parametrize("error, outcome", [
+    (_status_error(502), "verify"),
+    (_status_error(503), "verify"),
+    (_status_error(429), "retry"),
+    (_status_error(400, ["already_applied"]), "done"),
+    (_status_error(403, ["limit_exceeded"]), "limit"),
+    (_status_error(403, ["test_required"]), "failed"),
+    (_status_error(404), "failed"),
+    (_status_error(409), "retry"),
+    (httpx.ConnectError("connection refused"), "retry"),
+    (httpx.ConnectTimeout("connect timeout"), "retry"),
+    (httpx.PoolTimeout("pool timeout"), "retry"),
+    (httpx.ReadTimeout("read timeout"), "verify"),
+    (httpx.RemoteProtocolError("server disconnected"), "verify"),
+    (HHUnavailable("circuit open"), "unavailable"),
+])
+def test_apply_outcome(monkeypatch, worker, error, outcome):
+    async def apply_to_vacancy(self, vacancy_id, resume_id, message=""):
+        raise error
+
+    monkeypatch.setattr(HHClient, "apply_to_vacancy", apply_to_vacancy)
+    item = {"id": 1, "user_id": 1, "resume_id": "r1", "vacancy_id": "1", "message": None}
+    assert asyncio.run(worker._apply(item, "token"))[0] == outcome
+
+
+def test_apply_success_and_missing_token(monkeypatch, worker):
+    async def apply_to_vacancy(self, vacancy_id, resume_id, message=""):
+        return {"id": "n1"}
+
+    monkeypatch.setattr(HHClient, "apply_to_vacancy", apply_to_vacancy)
+    item = {"id": 1, "user_id": 1, "resume_id": "r1", "vacancy_id": "1", "message": None}
+    assert asyncio.run(worker._apply(item, "token")) == ("done", "n1")
+    assert asyncio.run(worker._apply(item, None))[0] == "failed"
+
+
+def test_apply_deferred_by_rate_limit(session_factory):
+    worker = ApplyWorker(session_factory, limiter=RateLimiter(1000, 1000, 0.1, 1))
+    item = {"id": 1, "user_id": 1, "resume_id": "r1", "vacancy_id": "1", "message": None}
+    worker.limiter.try_acquire(1)
+    outcome, wait = asyncio.run(worker._apply(item, "token"))
+    assert outcome == "deferred" and wait > 0
+
+
+def test_record_done_stores_negotiation(db, queue, worker):
+    queue.enqueue(1, "r1", ["1"])
+    worker._record(queue, _claim(db, "1"), "done", "n1")
+    row = _row(db, "1")
+    assert (row["status"], row["negotiation_id"]) == ("done", "n1")
+    negotiation = db.execute(text("SELECT vacancy_id, state FROM negotiations WHERE id = 'n1'")).fetchone()
+    assert tuple(negotiation) == ("1", "response")
+
+
+def test_record_verify_waits_for_reconciliation(db, queue, worker):
+    queue.enqueue(1, "r1", ["1"])
+    worker._record(queue, _claim(db, "1"), "verify", "HTTP 503")
+    row = _row(db, "1")
+    assert (row["status"], row["attempts"], row["last_error"]) == ("verify", 1, "HTTP 503")
+    assert worker.stats["deferred"] == 1
+
+
+def test_record_retry_backs_off_until_max_attempts(db, queue, worker):
+    queue.enqueue(1, "r1", ["1", "2"])
+    worker._record(queue, _claim(db, "1", attempts=2), "retry", "HTTP 429")
+    row = _row(db, "1")
+    assert (row["status"], row["attempts"]) == ("pending", 2)
+    assert _next_attempt(row) > datetime.now(timezone.utc) + timedelta(seconds=110)
+
+    worker._record(queue, _claim(db, "2", attempts=3), "retry", "HTTP 429")
+    assert (_row(db, "2")["status"], _row(db, "2")["last_error"]) == ("failed", "HTTP 429")
+    assert worker.stats["failed"] == 1
+
+
+def test_record_unavailable_does_not_count_attempt(db, queue, worker):
+    queue.enqueue(1, "r1", ["1"])
+    worker._record(queue, _claim(db, "1", attempts=3), "unavailable", "circuit open")
+    row = _row(db, "1")
+    assert (row["status"], row["attempts"], row["last_error"]) == ("pending", 2, "circuit open")
+
+
+def test_record_limit_defers_until_next_day(db, queue, worker):
+    queue.enqueue(1, "r1", ["1"])
+    worker._record(queue, _claim(db, "1", attempts=1), "limit", None)
+    row = _row(db, "1")
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    assert (row["status"], row["attempts"], row["last_error"]) == ("pending", 0, "limit_exceeded")
+    assert abs((_next_attempt(row) - tomorrow).total_seconds()) < 5
+
+
+def _stale(db, vacancy_id, attempts=1, last_error=None):
+    """Запись в том виде, в каком ее возвращает take_stale"""
+    item = _claim(db, vacancy_id, attempts)
+    db.execute(
+        text("UPDATE apply_queue SET status = 'verify', last_error = :error WHERE id = :id"),
+        {"id": item["id"], "error": last_error}
+    )
+    db.commit()
+    return {**_row(db, vacancy_id), "locked_at": datetime.now(timezone.utc)}
+
+
+def _token(monkeypatch, token):
+    async def get_valid_token(self, user_id):
+        return token
+
+    monkeypatch.setattr(TokenService, "get_valid_token", get_valid_token)
+
+
+def test_verify_stale_without_token_fails(monkeypatch, db, queue, worker):
+    _token(monkeypatch, None)
+    queue.enqueue(1, "r1", ["1"])
+    asyncio.run(worker._verify_stale(queue, db, [_stale(db, "1")]))
+    row = _row(db, "1")
+    assert (row["status"], row["last_error"]) == ("failed", "HH token expired, please re-authenticate")
+
+
+def test_verify_stale_reconciles_with_negotiations(monkeypatch, db, queue, worker):
+    _token(monkeypatch, "token")
+
+    async def get_negotiations(self, page=0, per_page=20):
+        return [{"id": "n1", "vacancy": {"id": "1"}}]
+
+    monkeypatch.setattr(HHClient, "get_negotiations", get_negotiations)
+    queue.enqueue(1, "r1", ["1", "2", "3"])
+    stale = [_stale(db, "1"), _stale(db, "2", last_error="ReadTimeout"), _stale(db, "3", attempts=3)]
+    asyncio.run(worker._verify_stale(queue, db, stale))
+
+    assert (_row(db, "1")["status"], _row(db, "1")["negotiation_id"]) == ("done", "n1")
+    # Отклик не дошел: повтор с прежней ошибкой и засчитанной попыткой
+    assert (_row(db, "2")["status"], _row(db, "2")["attempts"], _row(db, "2")["last_error"]) == ("pending", 1, "ReadTimeout")
+    assert (_row(db, "3")["status"], _row(db, "3")["last_error"]) == ("failed", "not found in HH negotiations")
+
+
+def test_find_negotiations_stops_before_lease(monkeypatch, worker):
+    pages = []
+    old = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    async def get_negotiations(self, page=0, per_page=20):
+        pages.append(page)
+        return [{"id": f"n{page}-{i}", "vacancy": {"id": f"x{i}"}, "updated_at": old} for i in range(per_page)]
+
+    monkeypatch.setattr(HHClient, "get_negotiations", get_negotiations)
+    items = [{"vacancy_id": "1", "locked_at": datetime.now(timezone.utc)}]
+    assert asyncio.run(worker._find_negotiations("token", 1, items)) == {}
+    # Отклики страницы старше захвата записи: дальше листать незачем
+    assert pages == [0]
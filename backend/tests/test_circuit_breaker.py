@@ -0,0 +1,91 @@
+"""Автомат circuit breaker: closed → open → half_open."""
+
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("hh", failure_threshold=3, recovery_timeout=30)
+    _fail(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    _fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == pytest.approx(30)
+    assert breaker.snapshot()["opened"] == 1
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_probe_closes_on_success(clock):
+    breaker = CircuitBreaker("hh", failure_threshold=1, recovery_timeout=30)
+    _fail(breaker, 1)
+    clock.now += 30
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Пока пробный вызов не завершился, остальные отклоняются
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_half_open_failure_reopens(clock):
+    breaker = CircuitBreaker("hh", failure_threshold=5, recovery_timeout=30)
+    _fail(breaker, 5)
+    clock.now += 31
+    _fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["opened"] == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_cancelled_probe_frees_slot(clock):
+    breaker = CircuitBreaker("hh", failure_threshold=1, recovery_timeout=30)
+    _fail(breaker, 1)
+    clock.now += 30
+    breaker.before_call()
+    breaker.cancel_call()
+    breaker.before_call()
+    assert breaker.probes == 1
+
+
+def test_stuck_probe_expires(clock):
+    breaker = CircuitBreaker("hh", failure_threshold=1, recovery_timeout=30)
+    _fail(breaker, 1)
+    clock.now += 30
+    breaker.before_call()
+    # Пробный вызов так и не вернулся: через recovery_timeout пускается новый
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,154 @@
+"""Курсоры поиска по нескольким резюме и снимков выдачи."""
+
+import asyncio
+
+import pytest
+
+from services import fanout_search, snapshots
+from services.cache import Cache
+from services.fanout_search import CursorExpired, FanoutSearch, InvalidCursor, _search_key
+from services.snapshots import SearchSnapshots, SnapshotExpired, pack_snapshot, unpack_snapshot
+
+
+class FakeHH:
+    """Выдача HH по ролям: роль -> упорядоченный список ID вакансий"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    async def search_vacancies(self, page=0, per_page=20, professional_roles=None, **filters):
+        self.calls.append((tuple(professional_roles or ()), page, per_page))
+        ids = self.results[(professional_roles or [None])[0]]
+        chunk = ids[page * per_page:(page + 1) * per_page]
+        return {"items": [{"id": str(i), "name": f"vacancy {i}"} for i in chunk], "found": len(ids)}
+
+
+def test_fanout_cursor_roundtrip():
+    key = _search_key([("r1", ["96"]), ("r2", ["10"])], {"area": "1"}, owner=7)
+    cursor = fanout_search.encode_cursor(key, [20, 13], "search")
+    assert fanout_search.decode_cursor(cursor, key, 2) == ([20, 13], "search")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", fanout_search.encode_cursor("other", [0, 0], "s")])
+def test_fanout_cursor_rejects_foreign_or_malformed(cursor):
+    key = _search_key([("r1", ["96"]), ("r2", ["10"])], {}, owner=7)
+    with pytest.raises(InvalidCursor):
+        fanout_search.decode_cursor(cursor, key, 2)
+
+
+def test_fanout_cursor_rejects_other_stream_count():
+    key = _search_key([("r1", ["96"])], {}, owner=7)
+    with pytest.raises(InvalidCursor):
+        fanout_search.decode_cursor(fanout_search.encode_cursor(key, [0, 0], "s"), key, 1)
+
+
+def test_search_key_covers_owner_and_filters():
+    streams = [("r1", ["96", "10"])]
+    key = _search_key(streams, {"area": "1", "salary": None}, owner=7)
+    assert key == _search_key([("r1", ["10", "96"])], {"area": "1"}, owner=7)
+    assert key != _search_key(streams, {"area": "2"}, owner=7)
+    assert key != _search_key(streams, {"area": "1"}, owner=8)
+
+
+def test_fanout_pages_merge_streams_without_duplicates():
+    hh = FakeHH({"96": [1, 2, 3, 4, 5, 6], "10": [2, 7, 4, 8]})
+    search = FanoutSearch(hh, Cache())
+    streams = [("r1", ["96"]), ("r2", ["10"])]
+
+    async def run():
+        pages, cursor = [], None
+        while True:
+            page = await search.search(streams, {"area": "1"}, per_page=3, cursor=cursor, owner=7)
+            pages.append([(item["id"], item["matched_resume_id"]) for item in page["items"]])
+            cursor = page["next_cursor"]
+            if not cursor:
+                return pages
+
+    pages = asyncio.run(run())
+    ids = [vacancy_id for page in pages for vacancy_id, _ in page]
+    # Слияние по позиции в выдаче: 2 есть в обоих потоках и выдается один раз
+    assert ids == ["1", "2", "7", "3", "4", "8", "5", "6"]
+    assert pages[0] == [("1", "r1"), ("2", "r2"), ("7", "r2")]
+
+
+def test_fanout_cursor_bound_to_owner_filters_and_state():
+    hh = FakeHH({"96": list(range(1, 50))})
+    search = FanoutSearch(hh, Cache())
+    streams = [("r1", ["96"])]
+
+    async def run():
+        cursor = (await search.search(streams, {"area": "1"}, per_page=5, owner=7))["next_cursor"]
+        with pytest.raises(InvalidCursor):
+            await search.search(streams, {"area": "2"}, per_page=5, cursor=cursor, owner=7)
+        with pytest.raises(InvalidCursor):
+            await search.search(streams, {"area": "1"}, per_page=5, cursor=cursor, owner=8)
+        # Выданные ID не пережили кеш: курсор истек
+        with pytest.raises(CursorExpired):
+            await FanoutSearch(hh, Cache()).search(streams, {"area": "1"}, per_page=5, cursor=cursor, owner=7)
+
+    asyncio.run(run())
+
+
+def test_snapshot_cursor_roundtrip():
+    cursor = snapshots.encode_cursor("abc.def", 40)
+    assert snapshots.decode_cursor(cursor) == ("abc.def", 40)
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", snapshots.encode_cursor("abc", -1), snapshots.encode_cursor("", 5)])
+def test_snapshot_cursor_rejects_malformed(cursor):
+    with pytest.raises(InvalidCursor):
+        snapshots.decode_cursor(cursor)
+
+
+def test_pack_snapshot_roundtrip():
+    meta = {"owner": "7", "found": 3, "pages": 1, "complete": True, "created_at": 1.5}
+    assert unpack_snapshot(pack_snapshot(meta, [5, 4_000_000_000, 1])) == (meta, [5, 4_000_000_000, 1])
+
+
+def test_snapshot_pages_are_stable_and_extend_without_duplicates():
+    ids = list(range(1, 251))
+    hh = FakeHH({None: ids})
+    search = SearchSnapshots(Cache(), window=100)
+
+    async def run():
+        first = await search.search(hh, "7", {}, per_page=60)
+        # HH сдвинул выдачу: следующая страница HH повторяет уже захваченные ID
+        hh.results[None] = ids[:100] + ids[90:]
+        second = await search.search(hh, "7", {}, per_page=60, cursor=first["next_cursor"])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [item["id"] for item in first["items"]] == [str(i) for i in range(1, 61)]
+    assert [item["id"] for item in second["items"]] == [str(i) for i in range(61, 121)]
+    # Повторенные HH ID 91-100 в снимок второй раз не попали
+    assert second["snapshot"]["size"] == 190
+    # Все вакансии снимка — в форме выдачи поиска
+    assert all(set(item) == {"id", "name"} for item in first["items"] + second["items"])
+    assert len(hh.calls) == 2
+
+
+def test_snapshot_cursor_bound_to_owner():
+    hh = FakeHH({None: list(range(1, 30))})
+    search = SearchSnapshots(Cache(), window=100)
+
+    async def run():
+        cursor = (await search.search(hh, "7", {}, per_page=10))["next_cursor"]
+        with pytest.raises(InvalidCursor):
+            await search.search(hh, "8", {}, per_page=10, cursor=cursor)
+
+    asyncio.run(run())
+
+
+def test_snapshot_expires_when_item_evicted():
+    hh = FakeHH({None: list(range(1, 30))})
+    cache = Cache()
+    search = SearchSnapshots(cache, window=100)
+
+    async def run():
+        cursor = (await search.search(hh, "7", {}, per_page=10))["next_cursor"]
+        del cache._memory["snapshot_item:15"]
+        with pytest.raises(SnapshotExpired):
+            await search.search(hh, "7", {}, per_page=10, cursor=cursor)
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+"""MinHash-сигнатуры и свертка почти-дубликатов вакансий."""
+
+import numpy as np
+
+from services.dedup import DuplicateIndex, minhash_many, vacancy_text
+
+TEXT = (
+    "Senior Python developer for backend services with Django PostgreSQL Redis Celery "
+    "Docker Kubernetes and code review experience in a product team"
+)
+# Перепост: то же описание с другим последним словом
+REPOST = TEXT.replace("team", "company")
+OTHER = (
+    "Accountant for a retail chain: primary documents, VAT returns, reconciliation with "
+    "suppliers and monthly closing in 1C"
+)
+
+THIRD = (
+    "Warehouse forklift operator, night shifts, loading and unloading trucks, "
+    "inventory counts and safety training provided"
+)
+
+
+def _vacancy(vacancy_id, text):
+    return {"id": vacancy_id, "name": text}
+
+
+def _index(vacancies, **kwargs):
+    index = DuplicateIndex(**kwargs)
+    signatures, valid = minhash_many([vacancy_text(vacancy) for vacancy in vacancies])
+    clusters = index.add_many([vacancy["id"] for vacancy in vacancies], signatures, valid)
+    return index, clusters
+
+
+def test_minhash_marks_short_texts_invalid():
+    signatures, valid = minhash_many([TEXT, TEXT, "Python developer", ""])
+    assert valid.tolist() == [True, True, False, False]
+    assert np.array_equal(signatures[0], signatures[1])
+
+
+def test_add_many_assigns_clusters():
+    index, clusters = _index([_vacancy("1", TEXT), _vacancy("2", REPOST), _vacancy("3", OTHER), _vacancy("4", "Python developer")])
+    assert clusters == {"1": "1", "2": "1", "3": "3", "4": None}
+    assert index.get_stats() == {"vacancies": 3, "clusters": 2, "duplicates": 1}
+
+    # Текст изменился: вакансия ищет кластер заново
+    signatures, valid = minhash_many([OTHER])
+    assert index.add_many(["2"], signatures, valid) == {"2": "3"}
+
+
+def test_capacity_evicts_oldest():
+    index, _ = _index([_vacancy("1", TEXT), _vacancy("2", OTHER), _vacancy("3", THIRD)], capacity=2)
+    assert len(index) == 2
+    # Вытесненная вакансия больше не находится как кандидат
+    signatures, valid = minhash_many([TEXT])
+    assert index.assign(["9"], signatures, valid) == ["9"]
+
+
+def test_load_restores_clusters():
+    source, _ = _index([_vacancy("1", TEXT), _vacancy("2", REPOST)])
+    signatures, _ = minhash_many([TEXT, REPOST])
+    index = DuplicateIndex()
+    assert index.load([("1", signatures[0].tobytes(), "1"), ("2", signatures[1].tobytes(), "1"), ("3", b"\0" * 16, None)]) == 2
+    assert index.get_stats() == source.get_stats()
+
+
+def test_collapse_keeps_first_of_each_cluster():
+    vacancies = [_vacancy("1", TEXT), _vacancy("2", REPOST), _vacancy("3", OTHER), _vacancy("4", TEXT)]
+    kept = DuplicateIndex().collapse(vacancies)
+    assert [vacancy["id"] for vacancy in kept] == ["1", "3"]
+    assert kept[0]["duplicates"] == ["2", "4"]
+    # Исходные словари не меняются: они же уходят в хранилище
+    assert "duplicates" not in vacancies[0]
+
+
+def test_collapse_keeps_short_titles():
+    vacancies = [_vacancy("1", "Python developer"), _vacancy("2", "Python developer")]
+    assert DuplicateIndex().collapse(vacancies) == vacancies
+
+
+def test_collapse_across_chunks_uses_seen_clusters():
+    index, _ = _index([_vacancy("1", TEXT), _vacancy("2", REPOST)])
+    seen = set()
+    assert [v["id"] for v in index.collapse([_vacancy("1", TEXT), _vacancy("3", OTHER)], seen)] == ["1", "3"]
+    assert index.collapse([_vacancy("2", REPOST)], seen) == []
+    assert seen == {"1", "3"}
@@ -0,0 +1,55 @@
+"""Справочник работодателей: фильтр выдачи и кеш неудачных загрузок."""
+
+import asyncio
+
+import httpx
+
+from services.cache import Cache
+from services.employers import EmployerDirectory, filter_vacancies, unchecked_count
+
+
+class FakeHH:
+    def __init__(self, employers):
+        self.employers = employers
+        self.calls = []
+
+    async def get_employer(self, employer_id):
+        self.calls.append(employer_id)
+        if employer_id not in self.employers:
+            request = httpx.Request("GET", f"https://api.hh.ru/employers/{employer_id}")
+            raise httpx.HTTPStatusError("HTTP 404", request=request, response=httpx.Response(404, request=request))
+        return {"id": employer_id, "name": f"Employer {employer_id}", **self.employers[employer_id]}
+
+
+def _vacancy(vacancy_id, employer_id=None):
+    return {"id": vacancy_id, "employer": {"id": employer_id} if employer_id else None}
+
+
+def test_filter_keeps_unchecked_and_drops_anonymous():
+    employers = {
+        "1": {"trusted": True, "industries": [{"id": "7.540"}]},
+        "2": {"trusted": False, "industries": [{"id": "7.540"}]},
+    }
+    vacancies = [_vacancy("a", "1"), _vacancy("b", "2"), _vacancy("c", "3"), _vacancy("d")]
+    assert filter_vacancies(vacancies, employers) is vacancies
+    assert [v["id"] for v in filter_vacancies(vacancies, employers, trusted_only=True)] == ["a", "c"]
+    assert [v["id"] for v in filter_vacancies(vacancies, employers, industry="7")] == ["a", "b", "c"]
+    assert [v["id"] for v in filter_vacancies(vacancies, employers, industry="8")] == ["c"]
+    assert unchecked_count(vacancies, employers) == 1
+
+
+def test_failed_lookups_are_cached(session_factory):
+    hh = FakeHH({"1": {"trusted": True}})
+    directory = EmployerDirectory(Cache(), session_factory)
+
+    async def run():
+        first = await directory.get_many(hh, ["1", "2"])
+        second = await directory.get_many(hh, ["1", "2"])
+        await asyncio.gather(*directory._writes)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert list(first) == list(second) == ["1"]
+    # Неудачная загрузка не повторяется до истечения miss_ttl
+    assert sorted(hh.calls) == ["1", "2"]
+    assert directory.stats["cached_misses"] == 1
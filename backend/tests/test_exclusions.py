@@ -0,0 +1,79 @@
+"""Наборы исключений пользователя: скрытые работодатели, вакансии с откликом и в очереди."""
+
+import asyncio
+
+import numpy as np
+from sqlalchemy import text
+
+from services.exclusions import ExclusionIndex, ExclusionSet, ExclusionStore, IdSet, as_id
+
+
+def _vacancy(vacancy_id, employer_id=None):
+    return {"id": vacancy_id, "employer": {"id": employer_id} if employer_id else None}
+
+
+def test_as_id():
+    assert as_id("123") == 123
+    assert as_id(123) == 123
+    assert as_id(None) == 0
+    assert as_id("abc") == 0
+    assert as_id(str(1 << 32)) == 0
+
+
+def test_id_set_ignores_missing_ids():
+    ids = IdSet([3, 0, 1, 3])
+    assert len(ids) == 2
+    assert ids.contains_many(np.array([0, 1, 2, 3, 4], dtype=np.uint32)).tolist() == [False, True, False, True, False]
+    assert IdSet().contains_many(np.array([1], dtype=np.uint32)).tolist() == [False]
+
+
+def test_filter_by_vacancy_and_employer():
+    exclusions = ExclusionSet(employers=[100], vacancies=[2])
+    vacancies = [_vacancy("1", "100"), _vacancy("2", "200"), _vacancy("3", "200"), _vacancy("4"), _vacancy("x", "y")]
+    assert [v["id"] for v in exclusions.filter(vacancies)] == ["3", "4", "x"]
+
+
+def test_filter_returns_same_list_when_nothing_excluded():
+    vacancies = [_vacancy("1", "100")]
+    assert ExclusionSet().filter(vacancies) is vacancies
+    assert ExclusionSet(vacancies=[5]).filter(vacancies) is vacancies
+
+
+def test_fingerprint_changes_only_with_content():
+    exclusions = ExclusionSet(vacancies=[1])
+    fingerprint = exclusions.fingerprint
+    exclusions.add(vacancies=[1])
+    assert exclusions.fingerprint == fingerprint
+    exclusions.add(employers=[7])
+    assert exclusions.fingerprint != fingerprint
+    assert not ExclusionSet()
+
+
+def test_store_load_combines_sources(db):
+    ExclusionStore(db).add(1, "employer", ["100", "100"])
+    ExclusionStore(db).add(1, "vacancy", ["1"])
+    db.execute(text("INSERT INTO negotiations (id, user_id, vacancy_id, state) VALUES ('n1', 1, '2', 'response')"))
+    db.execute(text("""
+        INSERT INTO apply_queue (user_id, resume_id, vacancy_id, status, attempts)
+        VALUES (1, 'r1', '3', 'pending', 0), (1, 'r1', '4', 'failed', 1), (2, 'r2', '5', 'pending', 0)
+    """))
+    db.commit()
+
+    exclusions = ExclusionStore(db).load(1)
+    assert exclusions.employers.ids.tolist() == [100]
+    # Проваленный автоотклик вакансию не скрывает
+    assert exclusions.vacancies.ids.tolist() == [1, 2, 3]
+
+
+def test_index_note_updates_loaded_set(session_factory):
+    index = ExclusionIndex(session_factory)
+
+    async def run():
+        # Незагруженный набор не создается: он прочитается из БД целиком
+        index.note(1, vacancies=["9"])
+        exclusions = await index.get(1)
+        assert len(exclusions.vacancies) == 0
+        index.note(1, vacancies=["9"])
+        assert (await index.get(1)).vacancies.ids.tolist() == [9]
+
+    asyncio.run(run())
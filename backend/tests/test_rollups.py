@@ -0,0 +1,200 @@
+"""Инкрементальные rollup-таблицы: дельты вакансий, гистограммы и навыков."""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import DateTime, text
+
+from services.analytics import ALL_SKILLS, RollupDeltas, salary_bucket, week_start
+from services.skill_demand import expire_vacancies, rebuild_skill_rollups, skill_contribution, track_skill_change
+from services.text_features import FeatureExtractor, FeatureStore
+from services.vacancy_store import VacancyStore, rollup_contribution
+
+WEEK = date(2026, 10, 12)
+# Середина недели: перевод в UTC не переносит вакансию в соседнюю
+PUBLISHED = datetime(2026, 10, 14, 12, 0, tzinfo=timezone(timedelta(hours=3)))
+
+
+def _item(vacancy_id, role="96", area="1", salary=None, published=PUBLISHED, skills=("python", "docker")):
+    return {
+        "id": str(vacancy_id),
+        "name": "Разработчик",
+        "professional_roles": [{"id": role}],
+        "area": {"id": area},
+        "experience": {"id": "between1And3"},
+        "salary": salary,
+        "published_at": published.strftime("%Y-%m-%dT%H:%M:%S%z") if published else None,
+        "snippet": {"requirement": "Опыт " + " ".join(skills), "responsibility": "работа"},
+    }
+
+
+def _rows(db, table, columns):
+    return sorted(
+        tuple(row) for row in db.execute(text(f"SELECT {columns} FROM {table}")).fetchall()
+    )
+
+
+def _nonzero_skills(db):
+    return sorted(
+        tuple(row) for row in db.execute(
+            text("SELECT role_id, area_id, week, skill, count, active FROM skill_rollups WHERE count <> 0 OR active <> 0")
+        ).fetchall()
+    )
+
+
+def _expected_vacancy_rollups(db):
+    """Агрегаты по текущему содержимому vacancies — то, что считает rebuild_vacancy_rollups"""
+    totals = defaultdict(lambda: [0, 0, 0])
+    histogram = defaultdict(int)
+    rows = db.execute(
+        text("SELECT professional_role_id, area_id, experience_id, published_at, salary_net_rub FROM vacancies")
+        .columns(published_at=DateTime(timezone=True))
+    ).mappings()
+    for row in rows:
+        contribution = rollup_contribution(dict(row))
+        if contribution is None:
+            continue
+        key, salary = contribution
+        totals[key][0] += 1
+        if salary:
+            totals[key][1] += 1
+            totals[key][2] += salary
+            histogram[key + (salary_bucket(salary),)] += 1
+    return totals, histogram
+
+
+def test_deltas_net_out_before_apply(db):
+    key = ("96", "1", "between1And3", WEEK)
+    deltas = RollupDeltas()
+    deltas.add_vacancy(key, 100000)
+    deltas.add_vacancy(key, 100000, sign=-1)
+    deltas.add_negotiation(1, WEEK, "response")
+    deltas.add_negotiation(1, WEEK, "response", sign=-1)
+    deltas.apply(db)
+    db.commit()
+    # Взаимно погашенные дельты не пишутся вовсе
+    assert _rows(db, "vacancy_rollups", "role_id") == []
+    assert _rows(db, "salary_histogram", "role_id") == []
+    assert _rows(db, "negotiation_rollups", "user_id") == []
+
+
+def test_deltas_accumulate_across_batches(db):
+    key = ("96", "1", "between1And3", WEEK)
+    for salary, sign in ((100000, 1), (150000, 1), (100000, -1), (None, 1)):
+        deltas = RollupDeltas()
+        deltas.add_vacancy(key, salary, sign)
+        deltas.add_negotiation(1, WEEK, "invitation", sign)
+        deltas.add_skills(("96", "1", WEEK), ["python"], active=salary is not None, sign=sign)
+        deltas.apply(db)
+    db.commit()
+
+    assert _rows(db, "vacancy_rollups", "vacancy_count, salary_count, salary_sum") == [(2, 1, 150000)]
+    assert _rows(db, "salary_histogram", "bucket, count") == sorted([
+        (salary_bucket(100000), 0), (salary_bucket(150000), 1)
+    ])
+    assert _rows(db, "negotiation_rollups", "state, count") == [("invitation", 2)]
+    assert _rows(db, "skill_rollups", "skill, count, active") == [(ALL_SKILLS, 2, 1), ("python", 2, 1)]
+
+
+def test_skill_contribution():
+    vacancy = {"professional_role_id": "96", "area_id": "1", "published_at": PUBLISHED, "archived": False}
+    key, names, active = skill_contribution(vacancy, ["python", "", ALL_SKILLS, "x" * 150])
+    assert key == ("96", "1", WEEK)
+    assert names == frozenset({"python", "x" * 100})
+    assert active is True
+
+    assert skill_contribution({**vacancy, "archived": True}, ["python"])[2] is False
+    # Без даты публикации или без посчитанных признаков вакансия в счетчики не входит
+    assert skill_contribution({**vacancy, "published_at": None}, ["python"]) is None
+    assert skill_contribution(vacancy, None) is None
+    assert skill_contribution(None, ["python"]) is None
+
+
+def test_track_skill_change_moves_counts():
+    vacancy = {"professional_role_id": "96", "area_id": "1", "published_at": PUBLISHED, "archived": False}
+    before = skill_contribution(vacancy, ["python"])
+
+    deltas = RollupDeltas()
+    track_skill_change(deltas, before, before)
+    assert not deltas.skills
+
+    track_skill_change(deltas, before, skill_contribution({**vacancy, "professional_role_id": "10"}, ["python"]))
+    assert {k: v for k, v in deltas.skills.items()} == {
+        ("96", "1", WEEK, ALL_SKILLS): [-1, -1],
+        ("96", "1", WEEK, "python"): [-1, -1],
+        ("10", "1", WEEK, ALL_SKILLS): [1, 1],
+        ("10", "1", WEEK, "python"): [1, 1],
+    }
+
+    archived = RollupDeltas()
+    track_skill_change(archived, before, skill_contribution({**vacancy, "archived": True}, ["python"]))
+    # Архивация оставляет вакансию в истории недели, но убирает из active
+    assert {k: v for k, v in archived.skills.items()} == {
+        ("96", "1", WEEK, ALL_SKILLS): [0, -1],
+        ("96", "1", WEEK, "python"): [0, -1],
+    }
+
+
+def test_rollup_contribution():
+    row = {"professional_role_id": "96", "area_id": "1", "experience_id": None, "published_at": PUBLISHED, "salary_net_rub": 90000}
+    assert rollup_contribution(row) == (("96", "1", "", week_start(PUBLISHED)), 90000)
+    assert rollup_contribution({**row, "published_at": None}) is None
+    assert rollup_contribution(None) is None
+
+
+def test_vacancy_store_keeps_rollups_in_sync(db):
+    store = VacancyStore(db)
+    rub = {"from": 100000, "to": 140000, "currency": "RUR", "gross": False}
+    store.upsert_many([
+        _item(1, salary=rub),
+        _item(2, salary={"from": 200000, "currency": "RUR", "gross": False}),
+        _item(3),
+        _item(4, published=None),
+    ])
+    # Смена зарплаты, роли, недели и потеря даты публикации переносят вклад вакансии
+    store.upsert_many([
+        _item(1, salary={"from": 150000, "to": 150000, "currency": "RUR", "gross": False}),
+        _item(2, role="10", salary=rub),
+        _item(3, published=PUBLISHED - timedelta(weeks=1)),
+        _item(4),
+    ])
+    store.upsert_many([_item(3, published=None), _item(5, area="2", salary=rub)])
+
+    totals, histogram = _expected_vacancy_rollups(db)
+    stored = {
+        (row[0], row[1], row[2], date.fromisoformat(row[3])): [row[4], row[5], row[6]]
+        for row in db.execute(text("SELECT * FROM vacancy_rollups WHERE vacancy_count <> 0")).fetchall()
+    }
+    assert stored == dict(totals)
+    stored_histogram = {
+        (row[0], row[1], row[2], date.fromisoformat(row[3]), row[4]): row[5]
+        for row in db.execute(text("SELECT * FROM salary_histogram WHERE count <> 0")).fetchall()
+    }
+    assert stored_histogram == dict(histogram)
+
+
+@pytest.fixture
+def extractor():
+    return FeatureExtractor(processes=0)
+
+
+def test_skill_rollups_match_rebuild(db, extractor):
+    items = [
+        _item(1, skills=("python", "docker")),
+        _item(2, skills=("sql", "kafka"), area="2"),
+        _item(3, skills=("python", "sql"), published=PUBLISHED - timedelta(weeks=2)),
+    ]
+    VacancyStore(db).upsert_many(items)
+    FeatureStore(db).ingest(items, extractor)
+    incremental = _nonzero_skills(db)
+    assert incremental
+
+    # Новые навыки, смена роли и архивация после подсчета признаков
+    FeatureStore(db).ingest([{**items[0], "key_skills": [{"name": "Rust"}], "description": "<p>Нужен Rust</p>"}], extractor)
+    VacancyStore(db).upsert_many([_item(2, role="10", skills=("sql", "kafka"), area="2")])
+    assert expire_vacancies(db, ["3"]) == 1
+
+    incremental = _nonzero_skills(db)
+    rebuild_skill_rollups(db)
+    assert _nonzero_skills(db) == incremental
@@ -0,0 +1,118 @@
+"""Индекс оценки зарплат: добавление, удаление, вытеснение и догрузка из таблицы."""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from services.salary_estimate import SalaryEstimateStore, SalaryIndex, SalaryIndexRefresher
+
+WORDS = [f"слово{i}" for i in range(200)]
+
+
+def _row(vacancy_id, role="96", salary=100000, tokens=None, area="1", version="1"):
+    return {
+        "vacancy_id": str(vacancy_id),
+        "role_id": role,
+        "area_id": area,
+        "experience_id": "between1And3",
+        "salary": salary,
+        "content_hash": version,
+        "tokens": tokens or random.Random(vacancy_id).choices(WORDS, k=30),
+        "skills": ["python"],
+    }
+
+
+def test_add_skips_unchanged_versions():
+    index = SalaryIndex()
+    assert index.add_many([_row(1), _row(2)]) == 2
+    assert index.add_many([_row(1), _row(2)]) == 0
+    assert index.add_many([_row(1, salary=120000), _row(2, version="2")]) == 2
+    assert len(index) == 2
+
+
+def test_remove_keeps_other_rows_estimable():
+    index = SalaryIndex(neighbors=3)
+    tokens = WORDS[:30]
+    index.add_many([_row(1, salary=100000, tokens=tokens), _row(2, salary=300000, tokens=tokens), _row(3, salary=100000, tokens=tokens)])
+    index.remove_many(["2", "missing"])
+    assert len(index) == 2
+
+    estimate, = index.estimate_many([{"role_id": "96", "area_id": "1", "experience_id": "between1And3", "tokens": tokens, "skills": ["python"]}])
+    assert estimate["value"] == 100000
+    assert estimate["neighbors"] == 2
+
+    index.remove_many(["1", "3"])
+    assert index.get_stats() == {"vacancies": 0, "roles": 0, "bytes": 0}
+
+
+def test_estimate_uses_only_same_role():
+    index = SalaryIndex()
+    index.add_many([_row(1, role="96", tokens=WORDS[:30])])
+    query = {"role_id": "10", "area_id": "1", "experience_id": None, "tokens": WORDS[:30], "skills": []}
+    assert index.estimate_many([query]) == [None]
+
+
+def test_role_capacity_evicts_oldest_of_role():
+    index = SalaryIndex(role_capacity=2)
+    index.add_many([_row(1), _row(2), _row(3, role="10"), _row(4)])
+    assert len(index) == 3
+    assert "1" not in index._where
+    assert index.get_stats()["roles"] == 2
+
+
+def test_capacity_evicts_oldest_overall():
+    index = SalaryIndex(capacity=3)
+    index.add_many([_row(1), _row(2, role="10"), _row(3), _row(4, role="10")])
+    assert sorted(index._where) == ["2", "3", "4"]
+    # Обновление строки делает ее самой новой
+    index.add_many([_row(2, role="10", salary=90000), _row(5)])
+    assert sorted(index._where) == ["2", "4", "5"]
+
+
+def _store(db, vacancy_id, salary, updated_at):
+    db.execute(
+        text("""
+        INSERT INTO vacancies (id, name, professional_role_id, area_id, experience_id, salary_net_rub, updated_at)
+        VALUES (:id, 'Разработчик', '96', '1', 'between1And3', :salary, :updated_at)
+        ON CONFLICT (id) DO UPDATE SET salary_net_rub = EXCLUDED.salary_net_rub, updated_at = EXCLUDED.updated_at
+        """),
+        {"id": str(vacancy_id), "salary": salary, "updated_at": updated_at}
+    )
+    db.execute(
+        text("""
+        INSERT INTO vacancy_features (vacancy_id, content_hash, source, text, tokens, skills, computed_at)
+        VALUES (:id, :id, 'snippet', '', :tokens, '["python"]', :computed_at)
+        ON CONFLICT (vacancy_id) DO NOTHING
+        """),
+        {"id": str(vacancy_id), "tokens": '["' + '", "'.join(WORDS[:20]) + '"]', "computed_at": updated_at}
+    )
+    db.commit()
+
+
+@pytest.fixture
+def refresher(session_factory):
+    return SalaryIndexRefresher(session_factory, SalaryIndex(), interval=60)
+
+
+def test_refresher_loads_then_syncs_changes(db, refresher):
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    _store(db, 1, 100000, old)
+    _store(db, 2, 200000, old)
+    _store(db, 3, None, old)
+    assert refresher.run_once() == {"loaded": 2}
+
+    # Изменения, сохраненные другим воркером: зарплата исчезла, появилась новая вакансия
+    now = datetime.now(timezone.utc)
+    _store(db, 2, None, now)
+    _store(db, 4, 150000, now)
+    assert refresher.run_once() == {"changed": 2, "indexed": 1}
+    assert sorted(refresher.index._where) == ["1", "4"]
+
+
+def test_store_sync_ignores_older_changes(db):
+    index = SalaryIndex()
+    _store(db, 1, 100000, datetime.now(timezone.utc) - timedelta(hours=1))
+    assert SalaryEstimateStore(db).sync(index, datetime.now(timezone.utc) - timedelta(minutes=5)) == {"changed": 0, "indexed": 0}
+    assert len(index) == 0
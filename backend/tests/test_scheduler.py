@@ -0,0 +1,113 @@
+"""Планировщик вызовов HH: приоритет полос, WFQ внутри полосы и дневная квота."""
+
+import asyncio
+
+import pytest
+
+from services.scheduler import APPLY, BACKFILL, INTERACTIVE, MONITORING, QuotaExceeded, UpstreamScheduler, _Lane
+
+
+class _Gate:
+    """Бюджет вызовов, закрытый, пока все запросы теста не встанут в очередь"""
+
+    def __init__(self):
+        self.open = False
+
+    def try_acquire(self, amount=1.0):
+        return 0.0 if self.open else 0.001
+
+    def refund(self, amount=1.0):
+        pass
+
+
+async def _grant_order(scheduler, requests):
+    """Поставить все запросы в очередь при закрытом бюджете и вернуть порядок выдачи"""
+    scheduler.bucket = gate = _Gate()
+    granted = []
+
+    async def request(lane, user_id, tag):
+        await scheduler.acquire(lane, user_id)
+        granted.append(tag)
+
+    tasks = [asyncio.create_task(request(lane, user_id, tag)) for lane, user_id, tag in requests]
+    while sum(len(lane.heap) for lane in scheduler.lanes.values()) < len(requests):
+        await asyncio.sleep(0)
+    gate.open = True
+    await asyncio.gather(*tasks)
+    return granted
+
+
+def test_lanes_are_served_by_priority():
+    scheduler = UpstreamScheduler(user_daily_quota=0)
+    order = asyncio.run(_grant_order(scheduler, [
+        (BACKFILL, 1, "backfill"),
+        (MONITORING, 1, "monitoring"),
+        (APPLY, 1, "apply"),
+        (INTERACTIVE, 1, "interactive"),
+    ]))
+    assert order == ["interactive", "apply", "monitoring", "backfill"]
+
+
+def test_users_share_lane_fairly():
+    scheduler = UpstreamScheduler(user_daily_quota=0)
+    order = asyncio.run(_grant_order(scheduler, [
+        (APPLY, 1, "a1"),
+        (APPLY, 1, "a2"),
+        (APPLY, 1, "a3"),
+        (APPLY, 2, "b1"),
+    ]))
+    # Один запрос второго пользователя не ждет всю очередь первого
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_grant_skips_queue_when_idle():
+    scheduler = UpstreamScheduler(rate=1, burst=5, user_daily_quota=0)
+
+    async def acquire_all():
+        for _ in range(5):
+            await scheduler.acquire(INTERACTIVE, 1)
+
+    asyncio.run(acquire_all())
+    assert scheduler._dispatcher is None
+    assert scheduler.get_stats()["lanes"][INTERACTIVE]["granted"] == 5
+
+
+def test_weight_shortens_finish_tag():
+    lane = _Lane(APPLY)
+    loop = asyncio.new_event_loop()
+    try:
+        lane.push(0, 1, 1.0, 1.0, loop.create_future())
+        lane.push(1, 2, 1.0, 4.0, loop.create_future())
+        lane.push(2, 2, 1.0, 4.0, loop.create_future())
+        assert [lane.pop().user_id for _ in range(3)] == [2, 2, 1]
+    finally:
+        loop.close()
+
+
+def test_cancelled_tickets_are_dropped():
+    lane = _Lane(APPLY)
+    loop = asyncio.new_event_loop()
+    try:
+        cancelled = loop.create_future()
+        cancelled.cancel()
+        lane.push(0, 1, 1.0, 1.0, cancelled)
+        assert lane.peek() is None
+    finally:
+        loop.close()
+
+
+def test_daily_quota_limits_background_lanes_only():
+    scheduler = UpstreamScheduler(rate=100, burst=100, user_daily_quota=2)
+
+    async def run():
+        await scheduler.acquire(APPLY, 1)
+        await scheduler.acquire(MONITORING, 1)
+        with pytest.raises(QuotaExceeded):
+            await scheduler.acquire(BACKFILL, 1)
+        # Интерактивные вызовы и другой пользователь квотой не ограничены
+        await scheduler.acquire(INTERACTIVE, 1)
+        await scheduler.acquire(APPLY, 2)
+
+    asyncio.run(run())
+    top = scheduler.ledger.top_users()
+    assert top[0] == {"user_id": 1, "total": 3.0, "lanes": {APPLY: 1.0, MONITORING: 1.0, INTERACTIVE: 1.0}}